@@ -5,6 +5,29 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 import numpy as np
+import pyarrow as pa
+
+import cProfile
+import hashlib
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import unicodedata
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # 页面配置
 st.set_page_config(page_title="保利物业拓展分析", layout="wide")
@@ -18,67 +41,2473 @@ st.sidebar.header("📁 数据文件上传")
 file_2024 = st.sidebar.file_uploader("上传2024年数据", type=['csv'])
 file_2025 = st.sidebar.file_uploader("上传2025年数据", type=['csv'])
 
-def load_data(file, year):
-    """加载并处理数据"""
-    if file is not None:
+# 侧边栏 - 增量修正上传（年中补录或修正的项目，合并进已上传的年度数据）
+with st.sidebar.expander("📝 增量修正上传"):
+    delta_year = st.selectbox("修正数据所属年份", [2024, 2025], key='delta_year')
+    delta_file = st.file_uploader("上传增量修正数据", type=['csv'], key='delta_file')
+    apply_delta_clicked = st.button("应用增量修正", key='apply_delta', disabled=delta_file is None)
+
+# 服务器端数据集库：清洗后的年度数据以列式文件保存，刷新页面或新开会话时可直接选用，不必重新上传解析
+DATASET_LIBRARY_DIR = os.environ.get(
+    'DASHBOARD_LIBRARY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset_library')
+)
+
+
+def list_library_datasets():
+    """列出数据集库中各数据集的元信息，按保存时间从新到旧排列"""
+    metas = []
+    if os.path.isdir(DATASET_LIBRARY_DIR):
+        for dataset_id in os.listdir(DATASET_LIBRARY_DIR):
+            if dataset_id.startswith('.'):
+                continue  # 正在写入的临时目录
+            try:
+                with open(os.path.join(DATASET_LIBRARY_DIR, dataset_id, 'meta.json'), encoding='utf-8') as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # 损坏的条目
+    return sorted(metas, key=lambda meta: meta['保存时间'], reverse=True)
+
+
+# 侧边栏 - 数据集库（选用库中数据集时优先于上传文件）
+library_metas = list_library_datasets()
+with st.sidebar.expander("📚 数据集库"):
+    library_sources = {}
+    for year in (2024, 2025):
+        year_metas = {meta['名称']: meta for meta in library_metas if meta['年份'] == year}
+        source_name = st.selectbox(f"{year}年数据来源", ['上传文件'] + list(year_metas), key=f'library_source_{year}')
+        library_sources[year] = year_metas.get(source_name)
+
+    library_save_name = st.text_input("保存名称（如“2025H1 集团”）", key='library_save_name').strip()
+    library_save_year = st.selectbox("保存年份", [2024, 2025], key='library_save_year')
+    library_save_clicked = st.button("保存当前数据到库", key='library_save', disabled=not library_save_name)
+
+    library_delete_options = {f"{meta['年份']}年 {meta['名称']}": meta for meta in library_metas}
+    library_delete_label = st.selectbox("删除数据集", [''] + list(library_delete_options), key='library_delete_label')
+    library_delete_clicked = st.button("删除", key='library_delete', disabled=not library_delete_label)
+
+# 侧边栏 - 图表显示设置（高基数图表只保留前N个类别，其余合并为“其他（N项）”）
+CHART_TOP_N_DEFAULTS = {
+    'city_growth_large': ("2.1主要城市图显示城市数", 30),
+    'city_growth_small': ("2.1其他城市图显示城市数", 30),
+    'industry': ("五.行业图显示行业数", 15),
+    'client': ("六.客户排名显示客户数", 10),
+}
+with st.sidebar.expander("📊 图表显示设置"):
+    chart_top_n = {
+        chart_key: st.number_input(label, min_value=1, value=default, step=1, key=f'top_n_{chart_key}')
+        for chart_key, (label, default) in CHART_TOP_N_DEFAULTS.items()
+    }
+
+# tracemalloc的启停和峰值计数是进程级的：只能由管理员通过环境变量在进程启动时开启，会话不再启停；
+# 开启后同一时刻只有一个会话持有记录名额，其余会话只记录墙钟时间和CPU时间
+TRACE_MEMORY = os.environ.get('DASHBOARD_TRACE_MEMORY', '') == '1'
+# 持有名额的运行被中断而未归还时，超过这么多秒后其他会话可以接手
+TRACE_MEMORY_LEASE_SECONDS = 300
+
+
+class MemoryTraceSlot:
+    """进程内唯一的内存峰值记录名额，持有者独占tracemalloc峰值计数，运行结束时归还"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.owner = None
+        self.acquired_at = 0.0
+
+    def acquire(self, owner):
+        with self._lock:
+            if self.owner in (None, owner) or time.time() - self.acquired_at > TRACE_MEMORY_LEASE_SECONDS:
+                self.owner, self.acquired_at = owner, time.time()
+                return True
+            return False
+
+    def release(self, owner):
+        with self._lock:
+            if self.owner == owner:
+                self.owner = None
+
+
+@st.cache_resource
+def get_memory_trace_slot():
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return MemoryTraceSlot()
+
+
+class StageProfiler:
+    """按阶段记录墙钟时间、CPU时间和tracemalloc内存峰值
+
+    内存峰值是进程级计数，包含本次运行后台计算任务的分配；只有持有记录名额时才记录
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+
+    def _push(self, name):
+        frame = {'name': name, 'parent': self._stack[-1]['name'] if self._stack else None,
+                 'wall': time.perf_counter(), 'cpu': time.thread_time(), 'mem_start': 0, 'mem_peak': 0}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # 子阶段会重置峰值计数，先把当前峰值并入父阶段
+            if self._stack:
+                self._stack[-1]['mem_peak'] = max(self._stack[-1]['mem_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['mem_start'] = current
+        self._stack.append(frame)
+
+    def _pop(self):
+        frame = self._stack.pop()
+        wall_ms = (time.perf_counter() - frame['wall']) * 1000
+        cpu_ms = (time.thread_time() - frame['cpu']) * 1000
+        peak_kb = None
+        if self.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame['mem_peak'])
+            peak_kb = (peak - frame['mem_start']) / 1024
+            if self._stack:
+                self._stack[-1]['mem_peak'] = max(self._stack[-1]['mem_peak'], peak)
+
+        # 同一父阶段下重复出现的子阶段（如多次图表序列化）合并为一条记录
+        for record in self.records:
+            if record['阶段'] == frame['name'] and record['所属阶段'] == frame['parent']:
+                record['次数'] += 1
+                record['墙钟时间(ms)'] += wall_ms
+                record['CPU时间(ms)'] += cpu_ms
+                if peak_kb is not None:
+                    record['内存峰值(KB)'] = max(record['内存峰值(KB)'], peak_kb)
+                return
+        self.records.append({
+            '阶段': frame['name'],
+            '所属阶段': frame['parent'],
+            '次数': 1,
+            '墙钟时间(ms)': wall_ms,
+            'CPU时间(ms)': cpu_ms,
+            '内存峰值(KB)': peak_kb,
+        })
+
+    def begin(self, name):
+        """结束当前顶层阶段并开始新的顶层阶段"""
+        self.end()
+        self._push(name)
+
+    def end(self):
+        while self._stack:
+            self._pop()
+
+    @contextmanager
+    def stage(self, name):
+        """嵌套阶段，作为上下文管理器使用"""
+        self._push(name)
+        try:
+            yield
+        finally:
+            self._pop()
+
+    def to_json(self):
+        return json.dumps({
+            '生成时间': datetime.now().isoformat(timespec='seconds'),
+            '记录内存峰值': self.trace_memory,
+            '阶段': self.records,
+        }, ensure_ascii=False, indent=2)
+
+
+# 侧边栏 - 性能诊断
+trace_memory_owner = get_script_run_ctx().session_id if get_script_run_ctx() is not None else None
+with st.sidebar.expander("🔧 性能诊断"):
+    trace_memory = False
+    if TRACE_MEMORY:
+        trace_memory_requested = st.checkbox("记录各阶段内存峰值（tracemalloc，会拖慢运行）", key='profile_trace_memory')
+        trace_memory = trace_memory_requested and get_memory_trace_slot().acquire(trace_memory_owner)
+        if trace_memory_requested and not trace_memory:
+            st.caption("其他会话正在记录内存峰值，本次运行只记录耗时")
+    else:
+        st.caption("内存峰值记录未开启（需由管理员设置环境变量DASHBOARD_TRACE_MEMORY=1后启动）")
+    capture_cprofile = st.button("捕获本次运行的cProfile", key='profile_capture_cprofile')
+
+profiler = StageProfiler(trace_memory=trace_memory)
+run_cprofile = None
+if capture_cprofile:
+    run_cprofile = cProfile.Profile()
+    run_cprofile.enable()
+
+
+def render_chart(fig):
+    """绘制Plotly图表，序列化耗时计入当前阶段下的“图表序列化”"""
+    with profiler.stage('图表序列化'):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+# 数据质量台账中每类剔除原因最多保留的样本行数
+QUALITY_SAMPLE_SIZE = 20
+
+
+def record_dropped_rows(ledger, reason, df, drop_mask, stored_amount=False):
+    """将清洗过程中某一步剔除的行数和少量样本记入质量台账；stored_amount表示业绩金额已转换为存储方式，样本换算回万元"""
+    drop_positions = np.flatnonzero(drop_mask.to_numpy())
+    ledger['剔除行数'][reason] = len(drop_positions)
+    if len(drop_positions) > 0:
+        sample = df.iloc[drop_positions[:QUALITY_SAMPLE_SIZE]]
+        if stored_amount:
+            sample = sample.assign(业绩金额=amount_in_wan(sample['业绩金额']))
+        ledger['剔除样本'][reason] = sample
+
+
+# 看板用到的列及读取类型，其余列在解析阶段直接跳过
+# 业绩金额按文本读取，交由清洗步骤统一转换为数值，转换失败的行记入质量台账
+DATA_SCHEMA = {
+    '业绩金额': 'str',
+    '业绩平台': 'str',
+    '城市': 'str',
+    '一级业态': 'str',
+    '行业': 'str',
+    '客户': 'str',
+}
+
+# 项目编号列：文件中有该列时随明细保留，增量修正按项目编号匹配原有行，编号相同的原有行视为同一项目被替换；
+# 客户、城市等组合不能唯一确定项目，没有项目编号列的数据不能应用增量修正。列名可通过环境变量调整
+PROJECT_ID_COLUMN = os.environ.get('DASHBOARD_PROJECT_ID_COLUMN', '项目编号')
+
+# 业绩金额的存储方式（源数据单位为万元），可通过环境变量调整：
+# float64为默认的浮点存储；yuan、fen按元、分四舍五入为定点整数存储，求和精确且内存占用更少
+AMOUNT_STORAGE_SCALES = {'float64': None, 'yuan': 10_000, 'fen': 1_000_000}
+AMOUNT_STORAGE = os.environ.get('DASHBOARD_AMOUNT_STORAGE', 'float64')
+if AMOUNT_STORAGE not in AMOUNT_STORAGE_SCALES:
+    st.sidebar.warning(f"未知的业绩金额存储方式“{AMOUNT_STORAGE}”，按float64存储")
+    AMOUNT_STORAGE = 'float64'
+AMOUNT_SCALE = AMOUNT_STORAGE_SCALES[AMOUNT_STORAGE]
+
+
+def store_amount(amount):
+    """把以万元为单位的业绩金额转换为当前存储方式：定点存储时按最小单位取整，取值范围允许时降为int32"""
+    if AMOUNT_SCALE is None:
+        return amount
+    units = np.rint(amount.to_numpy(dtype='float64') * AMOUNT_SCALE)
+    int32_range = np.iinfo(np.int32)
+    fits_int32 = len(units) == 0 or (units.min() >= int32_range.min and units.max() <= int32_range.max)
+    return pd.Series(units.astype('int32' if fits_int32 else 'int64'), index=amount.index, name=amount.name)
+
+
+def amount_in_wan(amount, storage=None):
+    """把业绩金额或其汇总结果换算回万元；定点存储时先在整数上精确求和，最后才换算"""
+    scale = AMOUNT_STORAGE_SCALES[storage or AMOUNT_STORAGE]
+    return amount if scale is None else amount / scale
+
+
+def sum_amounts_by_code(codes, amounts, minlength):
+    """按整数编码汇总业绩金额（存储单位）；定点存储时在int64上累加，不经过float64，求和保持精确"""
+    if not np.issubdtype(amounts.dtype, np.integer):
+        return np.bincount(codes, weights=amounts, minlength=minlength)
+    sums = np.zeros(max(minlength, int(codes.max()) + 1 if len(codes) > 0 else 0), dtype='int64')
+    np.add.at(sums, codes, amounts.astype('int64', copy=False))
+    return sums
+
+
+# 城市名称规范化：同一城市的不同写法（如“广州市”与“广州”）在清洗时统一为规范名称
+# 先查别名表，查不到时去掉行政区划后缀；可通过环境变量指定JSON文件（{"写法": "规范名称"}）补充别名
+CITY_SUFFIXES = ['特别行政区', '地区', '市']
+CITY_ALIASES = {'香港特区': '香港', '澳门特区': '澳门'}
+CITY_ALIASES_FILE = os.environ.get('DASHBOARD_CITY_ALIASES', '')
+if CITY_ALIASES_FILE:
+    try:
+        with open(CITY_ALIASES_FILE, encoding='utf-8') as f:
+            CITY_ALIASES.update(json.load(f))
+    except (OSError, ValueError) as e:
+        st.sidebar.warning(f"城市别名表读取失败：{e}")
+# 规范化规则的版本写入快照和共享缓存的键，规则变化后不会复用按旧规则清洗的数据
+CITY_RULES_VERSION = hashlib.blake2b(
+    repr((CITY_SUFFIXES, sorted(CITY_ALIASES.items()))).encode(), digest_size=8
+).hexdigest()
+
+# 重点城市（规范名称），各板块共用
+KEY_CITIES = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+
+
+@st.cache_resource
+def get_city_name_cache(rules_version):
+    """进程级的城市名称规范写法缓存，按规则版本区分；脚本每次重新运行取到的都是同一个字典，各会话和数据集共用"""
+    return {}
+
+
+city_name_cache = get_city_name_cache(CITY_RULES_VERSION)
+
+
+def canonical_city_name(name):
+    """单个城市名称的规范写法"""
+    name = unicodedata.normalize('NFKC', name).strip()
+    if name in CITY_ALIASES:
+        return CITY_ALIASES[name]
+    for suffix in CITY_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            name = name[:-len(suffix)]
+            break
+    return CITY_ALIASES.get(name, name)
+
+
+def canonicalize_cities(city):
+    """城市列规范化：只对去重后的城市名称查表，再按编码映射回每一行，返回以规范名称（按名称排序）为类别的分类列"""
+    codes, names = pd.factorize(city)
+    canonical = []
+    for name in names:
+        if name not in city_name_cache:
+            city_name_cache[name] = canonical_city_name(name)
+        canonical.append(city_name_cache[name])
+    # 不同写法可能规范为同一名称，类别取去重后的规范名称；城市为空的行（编码-1）取末尾追加的-1，仍为空
+    canonical_codes, canonical_unique = pd.factorize(pd.Series(canonical, dtype='str'), sort=True)
+    row_codes = np.append(canonical_codes, -1)[codes]
+    return pd.Series(
+        pd.Categorical.from_codes(row_codes, categories=canonical_unique), index=city.index, name=city.name
+    )
+
+
+def concat_detail_frames(frames):
+    """纵向合并明细表；各表的城市分类列先统一为同一组类别，合并后仍是分类列，不退化为字符串列"""
+    if all(isinstance(frame['城市'].dtype, pd.CategoricalDtype) for frame in frames):
+        categories = frames[0]['城市'].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame['城市'].cat.categories)
+        frames = [frame.assign(城市=frame['城市'].cat.set_categories(categories)) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# 依次尝试的文件编码
+CSV_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']
+
+# 侧边栏 - 去重设置：按键列计算64位行指纹判定重复行；默认按看板使用的列及项目编号列（这些列完全相同才算重复），
+# 只需读取这些列；可指定键列（可包含看板不使用的列），或勾选按整行去重（需按文本读取文件的全部列，较慢）。
+# dedup_columns为None表示按整行，空列表表示按默认键列
+with st.sidebar.expander("🧹 去重设置"):
+    dedup_full_row = st.checkbox("按整行（文件全部列）去重", value=False, key='dedup_full_row')
+    dedup_columns_text = st.text_input(
+        "去重键列（逗号分隔）", value='', key='dedup_columns', placeholder='留空按看板使用的列及项目编号列去重',
+        disabled=dedup_full_row
+    )
+dedup_columns = None if dedup_full_row else [
+    column.strip() for column in dedup_columns_text.split(',') if column.strip()
+]
+
+
+def dedup_key(dedup_columns):
+    """去重设置在内容键、快照目录名中的表示；按整行和按默认键列各用一个标记，不与指定键列的元组混淆"""
+    if dedup_columns is None:
+        return '全部列'
+    return tuple(dedup_columns) or '默认键列'
+
+
+def dedup_description(dedup_columns):
+    if dedup_columns is None:
+        return '全部列'
+    return '、'.join(dedup_columns) or '看板使用的列及项目编号列'
+
+# 客户名称归一：同一客户的全称、简称和带“有限公司”“集团”等后缀的写法合并为同一标准名称
+# 后缀按从长到短依次去除；别名表把归一后的别名强制映射到标准名称；模糊匹配合并相似度达到阈值的名称
+# 默认不启用；启用后默认阈值为1，只合并去除后缀后相同的名称和别名表中的名称，模糊匹配需手动调低阈值
+CLIENT_NAME_SUFFIXES = ['股份有限公司', '有限责任公司', '集团有限公司', '有限公司', '集团', '公司']
+with st.sidebar.expander("🏷️ 客户名称归一"):
+    client_norm_enabled = st.checkbox("启用客户名称归一", value=False, key='client_norm_enabled')
+    client_suffixes_text = st.text_input(
+        "去除的名称后缀（逗号分隔）", value=','.join(CLIENT_NAME_SUFFIXES), key='client_suffixes'
+    )
+    client_aliases_text = st.text_area("别名表（每行：别名=标准名称）", value='', key='client_aliases')
+    client_match_threshold = st.slider(
+        "模糊匹配相似度阈值", min_value=0.6, max_value=1.0, value=1.0, step=0.05, key='client_match_threshold',
+        help="按名称二元字组的Dice系数匹配，1表示只合并归一后完全相同的名称；调低后可能把同一集团的不同子公司合并，需核对合并明细"
+    )
+client_name_settings = None
+if client_norm_enabled:
+    client_suffixes = tuple(sorted(
+        {suffix.strip() for suffix in client_suffixes_text.split(',') if suffix.strip()}, key=len, reverse=True
+    ))
+    client_aliases = tuple(
+        (alias.strip(), canonical.strip())
+        for alias, separator, canonical in (line.partition('=') for line in client_aliases_text.splitlines())
+        if separator and alias.strip() and canonical.strip()
+    )
+    client_name_settings = (client_suffixes, client_aliases, client_match_threshold)
+
+# 城市分群：按一级业态占比、业绩平台占比、业绩规模和增长率对全部城市做k均值聚类，分群可作为重点城市名单
+CITY_SEGMENT_FEATURES = ['一级业态占比', '业绩平台占比', '业绩规模', '增长率']
+with st.sidebar.expander("🧩 城市分群"):
+    city_segment_enabled = st.checkbox("按业态和平台结构对城市分群", value=False, key='city_segment_enabled')
+    city_segment_k = st.slider("分群数", min_value=2, max_value=10, value=4, key='city_segment_k')
+    city_segment_features = st.multiselect(
+        "聚类特征", CITY_SEGMENT_FEATURES, default=CITY_SEGMENT_FEATURES, key='city_segment_features'
+    )
+    # 分群按总业绩从高到低命名为分群1、分群2……，选中分群时以该分群的全部城市作为重点城市
+    key_city_options = ['固定名单', *(f'分群{i}' for i in range(1, city_segment_k + 1))]
+    if st.session_state.get('key_city_source') not in key_city_options:
+        st.session_state['key_city_source'] = '固定名单'
+    key_city_source = st.selectbox(
+        "重点城市名单", key_city_options, key='key_city_source', disabled=not city_segment_enabled
+    )
+city_segment_settings = None
+if city_segment_enabled and city_segment_features:
+    city_segment_settings = (city_segment_k, tuple(city_segment_features))
+
+
+def read_csv_with_schema(file, extra_columns=(), all_columns=False):
+    """按数据模式读取CSV：只解析需要的列并指定类型，缺少必需列时立即报错
+
+    all_columns为True时其余列也按文本读取（只在按整行去重时需要），由清洗步骤计算行指纹后丢弃
+    """
+    # 额外列（如去重键列中不属于数据模式的列）同样必需，按文本读取
+    dtypes = {**DATA_SCHEMA, **{column: 'str' for column in extra_columns if column not in DATA_SCHEMA}}
+    # 项目编号列不是必需列，文件中有时一并读取
+    optional_columns = [] if PROJECT_ID_COLUMN in dtypes else [PROJECT_ID_COLUMN]
+    for encoding in CSV_ENCODINGS:
         try:
-            # 首先尝试UTF-8编码
-            df = pd.read_csv(file, encoding='utf-8')
+            # 先只读表头，检查必需列是否齐全
+            file.seek(0)  # 重置文件指针
+            header = pd.read_csv(file, encoding=encoding, nrows=0).columns
+            missing_columns = [column for column in dtypes if column not in header]
+            if missing_columns:
+                raise ValueError(f"缺少必需列：{', '.join(missing_columns)}")
+
+            file.seek(0)  # 重置文件指针
+            if all_columns:
+                return pd.read_csv(file, encoding=encoding, dtype='str')
+            usecols = list(dtypes) + [column for column in optional_columns if column in header]
+            return pd.read_csv(file, encoding=encoding, usecols=usecols, dtype={**dtypes, PROJECT_ID_COLUMN: 'str'})
         except UnicodeDecodeError:
+            # 编码不匹配，尝试下一种编码
+            continue
+
+
+def row_fingerprint(df, columns):
+    """按指定列向量化计算每行的64位指纹"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def clean_data(df, year, quality_ledger=None, dedup_columns=()):
+    """按统一规则清洗数据（年度文件与增量修正文件共用），quality_ledger不为空时按年份记录各步骤剔除的行
+
+    dedup_columns为None时按读取的全部列去重，为空时按看板使用的列及项目编号列（文件中有时）去重
+    """
+    # 质量台账直接复用各清洗步骤的筛选掩码，不额外扫描数据
+    ledger = {'读取行数': len(df), '剔除行数': {}, '剔除样本': {}}
+
+    # 数据清洗：移除空行和无效行
+    drop_mask = df.isna().all(axis=1)  # 删除完全空白的行
+    record_dropped_rows(ledger, '完全空白行', df, drop_mask)
+    df = df[~drop_mask]
+
+    drop_mask = df['业绩金额'].isna()  # 删除业绩金额为空的行
+    record_dropped_rows(ledger, '业绩金额为空', df, drop_mask)
+    df = df[~drop_mask]
+
+    # 确保业绩金额为数值型
+    amount = pd.to_numeric(df['业绩金额'], errors='coerce')
+
+    # 移除业绩金额转换失败的行
+    drop_mask = amount.isna()
+    record_dropped_rows(ledger, '业绩金额无法转换为数值', df, drop_mask)
+    df = df[~drop_mask].copy()
+    df['业绩金额'] = store_amount(amount[~drop_mask])
+
+    # 城市名称统一为规范写法，在去重和计算项目键之前完成
+    df['城市'] = canonicalize_cities(df['城市'])
+
+    # 移除重复行（如果存在）：按去重键列的行指纹判定，不逐列比较整行
+    if dedup_columns is None:
+        dedup_columns = list(df.columns)
+    elif not dedup_columns:
+        dedup_columns = [column for column in df.columns if column in DATA_SCHEMA or column == PROJECT_ID_COLUMN]
+    else:
+        dedup_columns = list(dedup_columns)
+    fingerprints = row_fingerprint(df, dedup_columns)
+    drop_mask = pd.Series(fingerprints, index=df.index).duplicated()
+    record_dropped_rows(ledger, '重复行', df, drop_mask, stored_amount=True)
+    df = df[~drop_mask].drop(
+        columns=[column for column in dedup_columns if column not in DATA_SCHEMA and column != PROJECT_ID_COLUMN]
+    )
+    df['行指纹'] = fingerprints[~drop_mask.to_numpy()]
+
+    # 重置索引
+    df = df.reset_index(drop=True)
+
+    # 添加年份列
+    df['年份'] = year
+
+    ledger['保留行数'] = len(df)
+    if quality_ledger is not None:
+        quality_ledger[year] = ledger
+
+    return df
+
+
+def load_data(file, year, quality_ledger=None, dedup_columns=()):
+    """加载并处理数据，quality_ledger不为空时按年份记录各清洗步骤剔除的行；只有按整行去重时才读取全部列"""
+    if file is not None:
+        with profiler.stage(f'{year}年数据读取'):
+            try:
+                df = read_csv_with_schema(
+                    file, extra_columns=dedup_columns or (), all_columns=dedup_columns is None
+                )
+            except ValueError as e:
+                st.sidebar.error(f"{year}年数据读取失败：{e}")
+                return None
+
+        with profiler.stage(f'{year}年数据清洗'):
+            return clean_data(df, year, quality_ledger, dedup_columns)
+    return None
+
+
+def fold_long_tail(data, top_n, sort_by=None, by_abs=False):
+    """保留排名前top_n的类别，其余类别合并为一个“其他（N项）”汇总项，控制图表数据量
+
+    汇总项名称带合并的类别数，不会与数据中本来名为“其他”的类别混在一起
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    if len(frame) <= top_n:
+        return data
+
+    # 按指定列（默认第一列）取前top_n个类别，保持原有顺序
+    rank_key = frame[sort_by] if sort_by is not None else frame.iloc[:, 0]
+    if by_abs:
+        rank_key = rank_key.abs()
+    keep_mask = frame.index.isin(rank_key.nlargest(top_n).index)
+
+    # 其余类别的数值列求和，作为“其他（N项）”追加在末尾
+    other_label = f'其他（{int((~keep_mask).sum())}项）'
+    other_row = frame.loc[~keep_mask].sum(numeric_only=True).to_frame(other_label).T
+    folded = pd.concat([frame.loc[keep_mask], other_row])
+    folded.index.name = frame.index.name
+
+    if isinstance(data, pd.Series):
+        return folded.iloc[:, 0].rename(data.name)
+    return folded
+
+
+def project_keys(df):
+    """按项目编号列计算每行的项目键；数据没有项目编号列时返回空数组，此时不能应用增量修正"""
+    if PROJECT_ID_COLUMN not in df.columns:
+        return np.empty(0, dtype='uint64')
+    return row_fingerprint(df, [PROJECT_ID_COLUMN])
+
+
+# 聚合立方体的维度，各分析模块按维度汇总时从立方体取数，不再分组明细数据
+CUBE_DIMENSIONS = ['城市', '一级业态', '业绩平台', '行业']
+
+
+def build_aggregate_cube(df):
+    """按城市、一级业态、业绩平台、行业汇总业绩金额和项目数量"""
+    cube = df.groupby(CUBE_DIMENSIONS, dropna=False)['业绩金额'].agg(业绩金额='sum', 项目数量='count')
+    if AMOUNT_SCALE is not None:
+        # 定点存储时立方体统一按int64累计，增量修正更新单元格时不会溢出
+        cube = cube.astype({'业绩金额': 'int64'})
+    return cube
+
+
+def cube_totals(cube, by):
+    """从聚合立方体汇总指定维度的业绩金额（万元）和项目数量"""
+    totals = cube.groupby(level=by).sum()
+    totals['业绩金额'] = amount_in_wan(totals['业绩金额'])
+    return totals
+
+
+# 分位数草图：业绩金额（万元）按相对误差不超过QUANTILE_SKETCH_ALPHA划入对数桶，按城市×一级业态统计各桶项目数量。
+# 桶计数可以直接相加减，多个数据块、年份、城市的草图合并和增量修正都只需合并计数，不必回到明细
+QUANTILE_SKETCH_ALPHA = 0.01
+QUANTILE_SKETCH_GAMMA = (1 + QUANTILE_SKETCH_ALPHA) / (1 - QUANTILE_SKETCH_ALPHA)
+# 桶号偏移：正金额的桶号为正、负金额为负、0为0，桶号的大小顺序与金额的大小顺序一致
+QUANTILE_SKETCH_OFFSET = 1 << 20
+# 绝对值小于此值（万元）的金额计入0桶
+QUANTILE_SKETCH_MIN = 1e-6
+SKETCH_DIMENSIONS = ['城市', '一级业态']
+
+
+def sketch_buckets(amounts):
+    """业绩金额（万元）所在的分位数草图桶号"""
+    magnitude = np.abs(amounts)
+    nonzero = magnitude >= QUANTILE_SKETCH_MIN
+    log_index = np.ceil(np.log(np.where(nonzero, magnitude, 1)) / np.log(QUANTILE_SKETCH_GAMMA)).astype('int64')
+    return np.where(nonzero, np.sign(amounts).astype('int64') * (log_index + QUANTILE_SKETCH_OFFSET), 0)
+
+
+def sketch_bucket_values(buckets):
+    """分位数草图各桶的代表金额（万元），与桶内任一金额的相对误差不超过QUANTILE_SKETCH_ALPHA"""
+    log_index = np.abs(buckets) - QUANTILE_SKETCH_OFFSET
+    return np.sign(buckets) * 2 * QUANTILE_SKETCH_GAMMA ** log_index.astype('float64') / (QUANTILE_SKETCH_GAMMA + 1)
+
+
+def build_quantile_sketch(df):
+    """按城市、一级业态统计业绩金额落在各分位数草图桶中的项目数量"""
+    amounts = np.asarray(amount_in_wan(df['业绩金额'].to_numpy()), dtype='float64')
+    buckets = pd.Series(sketch_buckets(amounts), index=df.index, name='桶')
+    return df.groupby([*(df[dimension] for dimension in SKETCH_DIMENSIONS), buckets], dropna=False).size().rename('项目数量')
+
+
+def merge_quantile_sketches(sketches):
+    """合并分位数草图：同一(城市, 一级业态, 桶)的项目数量相加，计数减到0的桶不再保留"""
+    merged = pd.concat(sketches).groupby(level=[*SKETCH_DIMENSIONS, '桶'], dropna=False).sum()
+    return merged[merged > 0]
+
+
+def sketch_quantiles(sketch, quantiles, by=()):
+    """由分位数草图估计业绩金额的分位数（万元），by为空时把全部单元格合并成一组
+
+    返回的DataFrame以分组为索引、各分位数（如P50）为列
+    """
+    levels = list(by)
+    counts = sketch.groupby(level=[*levels, '桶'], dropna=False).sum()
+    counts = counts[counts > 0]
+    if levels:
+        group_sizes = counts.groupby(level=levels, dropna=False).sum()
+        index = group_sizes.index
+    else:
+        group_sizes = pd.Series([counts.sum()])
+        index = pd.Index(['全部'])
+
+    # 各组的桶按桶号（即金额）升序相邻排列，全部组共用一条累计计数，每个分位数一次searchsorted
+    cumulative = counts.to_numpy().cumsum()
+    sizes = group_sizes.to_numpy()
+    starts = sizes.cumsum() - sizes
+    values = sketch_bucket_values(counts.index.get_level_values('桶').to_numpy())
+    result = {}
+    for q in quantiles:
+        # 组内第floor(q×(n-1))个项目（从0计）所在桶的代表金额
+        positions = np.searchsorted(cumulative, starts + np.floor(q * (sizes - 1)), side='right')
+        result[f'P{q * 100:g}'] = values[positions] if len(counts) > 0 else np.full(len(index), np.nan)
+    return pd.DataFrame(result, index=index)
+
+
+# 进程级共享数据集缓存的内存预算（MB），可通过环境变量调整
+SHARED_CACHE_BUDGET_MB = int(os.environ.get('DASHBOARD_SHARED_CACHE_MB', '2048'))
+
+
+def dataset_nbytes(dataset):
+    """估算数据集（明细、聚合立方体、分位数草图、项目键哈希）占用的内存字节数"""
+    return int(
+        dataset['df'].memory_usage(deep=True).sum()
+        + dataset['cube'].memory_usage(deep=True).sum()
+        + dataset['sketch'].memory_usage(deep=True)
+        + dataset['row_keys'].nbytes
+    )
+
+
+class SharedDatasetCache:
+    """进程级数据集缓存：各会话按文件内容哈希共享清洗结果和聚合立方体，以及由两年数据派生的合并明细、
+    自助法区间等中间结果，超出内存预算时按最近最少使用淘汰"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_load(self, key, loader, measure=dataset_nbytes):
+        """命中则直接返回共享数据集，否则调用loader加载并用measure估算内存；同一内容并发加载时只计算一次"""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                item = self._items.get(key)
+                if item is not None:
+                    self._items.move_to_end(key)
+                    item['hits'] += 1
+                    return item['dataset']
+
+            try:
+                dataset = loader()
+            except BaseException:
+                self._drop_key_lock(key, key_lock)
+                raise
+            if dataset is None:
+                self._drop_key_lock(key, key_lock)
+                return None
+
+            nbytes = measure(dataset)
+            with self._lock:
+                self._items[key] = {'dataset': dataset, 'nbytes': nbytes, 'hits': 0}
+                self.total_bytes += nbytes
+                self._evict()
+            return dataset
+
+    def _drop_key_lock(self, key, key_lock):
+        # 加载失败的内容没有缓存项，其加载锁不再保留，否则监控目录反复重试失败文件时锁表会不断增长
+        with self._lock:
+            if key not in self._items and self._key_locks.get(key) is key_lock:
+                del self._key_locks[key]
+
+    def _evict(self):
+        # 至少保留刚放入的一项；被淘汰的数据集仍被会话引用时，内存在会话释放后回收
+        while self.total_bytes > self.budget_bytes and len(self._items) > 1:
+            evicted_key, item = self._items.popitem(last=False)
+            self.total_bytes -= item['nbytes']
+            self._key_locks.pop(evicted_key, None)
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    '数据集': f"中间结果：{key[1]}" if key[0] == SHARED_DERIVED_PREFIX else f"{key[1]}年 {key[0][:12]}",
+                    '内存(MB)': item['nbytes'] / 1024 / 1024, '命中次数': item['hits'],
+                }
+                for key, item in self._items.items()
+            ]
+
+
+@st.cache_resource
+def get_shared_dataset_cache():
+    return SharedDatasetCache(SHARED_CACHE_BUDGET_MB * 1024 * 1024)
+
+
+# 共享缓存中派生中间结果的键前缀，与按文件内容哈希的数据集键区分
+SHARED_DERIVED_PREFIX = '派生'
+
+
+def shared_derived_value(name, version, builder):
+    """取由两年数据派生的中间结果：版本（两年数据内容、已应用的修正和影响结果的设置）相同的会话共用同一份，只计算一次"""
+    return get_shared_dataset_cache().get_or_load((SHARED_DERIVED_PREFIX, name, version), builder, estimate_nbytes)
+
+
+# 单个会话、全部会话的内存预算（MB）以及会话视为空闲的时长（秒），可通过环境变量调整
+SESSION_BUDGET_MB = int(os.environ.get('DASHBOARD_SESSION_BUDGET_MB', '1024'))
+ALL_SESSIONS_BUDGET_MB = int(os.environ.get('DASHBOARD_ALL_SESSIONS_BUDGET_MB', '4096'))
+SESSION_IDLE_SECONDS = int(os.environ.get('DASHBOARD_SESSION_IDLE_SECONDS', '600'))
+# 各会话内存占用明细包含其他用户的会话标识，只有管理员设置环境变量DASHBOARD_ADMIN_DIAGNOSTICS=1后才显示
+ADMIN_DIAGNOSTICS = os.environ.get('DASHBOARD_ADMIN_DIAGNOSTICS', '') == '1'
+
+
+def estimate_nbytes(value):
+    """估算DataFrame、Series、numpy数组（或它们组成的元组、字典）占用的内存字节数"""
+    if isinstance(value, tuple):
+        return sum(estimate_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(item) for item in value.values())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return int(getattr(value, 'nbytes', 0))
+
+
+class SessionStore:
+    """单个会话持有的年度数据集和只与本会话设置有关的中间结果，分别记录内存占用，供内存预算淘汰使用；
+    只由数据决定的中间结果放在共享缓存中，不在会话中另存一份"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.datasets = {}
+        self.derived = {}
+        self.last_active = time.time()
+        self.evicted_notice = False
+        self._lock = threading.Lock()
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def derived_value(self, name, version, builder):
+        """取本会话的中间结果；版本（数据内容、已应用的修正和本会话设置）不变时复用，被淘汰或版本变化后重新计算"""
+        with self._lock:
+            item = self.derived.get(name)
+        if item is not None and item['version'] == version:
+            return item['value']
+
+        value = builder()
+        with self._lock:
+            self.derived[name] = {'version': version, 'value': value, 'nbytes': estimate_nbytes(value)}
+        return value
+
+    def get_dataset(self, year):
+        with self._lock:
+            return self.datasets.get(year)
+
+    def set_dataset(self, year, entry):
+        with self._lock:
+            self.datasets[year] = entry
+
+    def pop_dataset(self, year):
+        with self._lock:
+            return self.datasets.pop(year, None)
+
+    def dataset_bytes(self):
+        """返回(共享数据集字节数, 本会话独享数据集字节数)"""
+        shared_bytes = private_bytes = 0
+        with self._lock:
+            for entry in self.datasets.values():
+                if entry['shared']:
+                    shared_bytes += entry['nbytes']
+                else:
+                    private_bytes += entry['nbytes']
+        return shared_bytes, private_bytes
+
+    def derived_bytes(self):
+        with self._lock:
+            return sum(item['nbytes'] for item in self.derived.values())
+
+    def footprint_bytes(self):
+        """本会话自己持有的内存：独享数据集和中间结果；共享数据集由共享缓存按其预算管理，不计入"""
+        return self.dataset_bytes()[1] + self.derived_bytes()
+
+    def clear_derived(self):
+        with self._lock:
+            self.derived.clear()
+
+    def drop_datasets(self):
+        """释放本会话独享的数据集（已应用增量修正的副本）；会话下次运行时重新引用共享数据，修正需重新上传。
+        共享数据集仍被共享缓存持有，丢掉引用释放不了内存，因此保留"""
+        self.clear_derived()
+        with self._lock:
+            private_years = [year for year, entry in self.datasets.items() if not entry['shared']]
+            for year in private_years:
+                del self.datasets[year]
+            if private_years:
+                self.evicted_notice = True
+
+
+class SessionRegistry:
+    """进程内所有会话的登记表：汇总各会话独享的内存占用，超出预算时先淘汰中间结果，再淘汰空闲会话独享的数据集"""
+
+    def __init__(self, session_budget_bytes, total_budget_bytes, idle_seconds):
+        self.session_budget_bytes = session_budget_bytes
+        self.total_budget_bytes = total_budget_bytes
+        self.idle_seconds = idle_seconds
+        # 会话结束、session_state被回收后，登记项自动消失
+        self._stores = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, store):
+        with self._lock:
+            self._stores[store.session_id] = store
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._stores.values())
+
+    @staticmethod
+    def _total_bytes(stores):
+        # 只统计各会话独享的数据集和中间结果；共享数据集的内存由共享缓存自己的预算约束
+        return sum(store.footprint_bytes() for store in stores)
+
+    def total_bytes(self):
+        return self._total_bytes(self._snapshot())
+
+    def enforce_budgets(self, current):
+        """在当前会话一次运行结束时检查预算，返回当前会话是否仍超出单会话预算"""
+        if current.footprint_bytes() > self.session_budget_bytes:
+            current.clear_derived()
+
+        stores = self._snapshot()
+        if self._total_bytes(stores) > self.total_budget_bytes:
+            # 其他会话按空闲时长从长到短淘汰：先丢中间结果，仍超预算再丢空闲会话的数据集
+            others = sorted((store for store in stores if store is not current), key=lambda store: store.last_active)
+            for store in others:
+                store.clear_derived()
+                if self._total_bytes(stores) <= self.total_budget_bytes:
+                    break
+            else:
+                now = time.time()
+                for store in others:
+                    if now - store.last_active < self.idle_seconds:
+                        break
+                    store.drop_datasets()
+                    if self._total_bytes(stores) <= self.total_budget_bytes:
+                        break
+
+        return current.footprint_bytes() > self.session_budget_bytes
+
+    def stats(self, current):
+        now = time.time()
+        rows = []
+        for store in sorted(self._snapshot(), key=lambda store: store.last_active, reverse=True):
+            shared_bytes, private_bytes = store.dataset_bytes()
+            derived_bytes = store.derived_bytes()
+            rows.append({
+                '会话': store.session_id[:8] + ('（当前）' if store is current else ''),
+                '空闲(秒)': round(now - store.last_active),
+                '共享数据集(MB)': shared_bytes / 1024 / 1024,
+                '独享数据集(MB)': private_bytes / 1024 / 1024,
+                '中间结果(MB)': derived_bytes / 1024 / 1024,
+                '合计(MB)': (shared_bytes + private_bytes + derived_bytes) / 1024 / 1024,
+            })
+        return rows
+
+
+@st.cache_resource
+def get_session_registry():
+    return SessionRegistry(
+        SESSION_BUDGET_MB * 1024 * 1024,
+        ALL_SESSIONS_BUDGET_MB * 1024 * 1024,
+        SESSION_IDLE_SECONDS,
+    )
+
+
+def get_session_store():
+    """取当前会话的数据存储，首次访问时创建并登记到进程级会话表"""
+    store = st.session_state.get('store')
+    if store is None:
+        ctx = get_script_run_ctx()
+        store = SessionStore(ctx.session_id if ctx is not None else uuid.uuid4().hex)
+        st.session_state['store'] = store
+        get_session_registry().register(store)
+    store.touch()
+    return store
+
+
+def build_shared_dataset(df, quality):
+    """由清洗后的年度明细生成可在会话间共享的数据集：明细、聚合立方体、分位数草图、项目键哈希和质量台账"""
+    return {
+        'df': df,
+        'cube': build_aggregate_cube(df),
+        'sketch': build_quantile_sketch(df),
+        'row_keys': project_keys(df),
+        'quality': quality,
+    }
+
+
+def new_session_entry(source, file_id, dedup_columns, content_key, shared):
+    """会话条目引用共享数据；增量修正时替换为本会话自己的副本，不修改共享数据"""
+    return {
+        'source': source,
+        'file_id': file_id,
+        'dedup_columns': dedup_columns,
+        'content_key': content_key,
+        **shared,
+        'applied_deltas': [],
+        # 已应用修正的内容摘要（依次链式哈希），不同会话应用了相同修正时派生结果可共享
+        'delta_key': '',
+        'shared': True,
+        'nbytes': dataset_nbytes(shared),
+    }
+
+
+# 年度数据集的Arrow IPC快照目录：服务重启后或其他工作进程可直接内存映射打开，跳过CSV解析、清洗和聚合
+SNAPSHOT_DIR = os.environ.get(
+    'DASHBOARD_SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset_snapshots')
+)
+# 上传文件快照最多保留的份数，超出时删除最久未打开的快照
+SNAPSHOT_KEEP = int(os.environ.get('DASHBOARD_SNAPSHOT_KEEP', '20'))
+
+
+def write_arrow_file(path, table):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow_file(path):
+    """内存映射打开Arrow IPC文件，数据直接引用映射页，多个会话和进程共享同一份物理内存"""
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def write_snapshot(directory, dataset, meta=None):
+    """把数据集的明细、聚合立方体、分位数草图、项目键哈希和质量台账写成快照目录，meta不为空时一并写入元信息"""
+    # 先写入临时目录再改名，其他会话和进程不会读到写了一半的快照
+    tmp_dir = os.path.join(os.path.dirname(directory), f'.{uuid.uuid4().hex}.tmp')
+    os.makedirs(tmp_dir)
+    try:
+        write_arrow_file(os.path.join(tmp_dir, 'df.arrow'), pa.Table.from_pandas(dataset['df'], preserve_index=False))
+        write_arrow_file(os.path.join(tmp_dir, 'cube.arrow'), pa.Table.from_pandas(dataset['cube']))
+        write_arrow_file(os.path.join(tmp_dir, 'sketch.arrow'), pa.Table.from_pandas(dataset['sketch'].to_frame()))
+        write_arrow_file(os.path.join(tmp_dir, 'row_keys.arrow'), pa.table({'row_keys': dataset['row_keys']}))
+
+        quality = dataset['quality']
+        quality = {
+            **quality,
+            '剔除样本': {reason: sample.to_dict(orient='split') for reason, sample in quality['剔除样本'].items()},
+        }
+        with open(os.path.join(tmp_dir, 'quality.json'), 'w', encoding='utf-8') as f:
+            json.dump(quality, f, ensure_ascii=False, default=str)
+        if meta is not None:
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # 其他进程已写好同一份快照时改名失败，保留已有快照即可
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+
+
+def open_snapshot(directory):
+    """内存映射打开快照目录，返回与build_shared_dataset结构相同的数据集"""
+    # split_blocks避免把同类型的列合并成一个二维块，数值列和字符串列都不复制
+    df = read_arrow_file(os.path.join(directory, 'df.arrow')).to_pandas(split_blocks=True)
+    cube = read_arrow_file(os.path.join(directory, 'cube.arrow')).to_pandas()
+    # 加入分位数草图之前写的快照没有草图文件，打开时由明细重建
+    sketch_path = os.path.join(directory, 'sketch.arrow')
+    if os.path.exists(sketch_path):
+        sketch = read_arrow_file(sketch_path).to_pandas()['项目数量']
+    else:
+        sketch = build_quantile_sketch(df)
+    row_keys = read_arrow_file(os.path.join(directory, 'row_keys.arrow')).column('row_keys').to_numpy()
+
+    with open(os.path.join(directory, 'quality.json'), encoding='utf-8') as f:
+        quality = json.load(f)
+    quality['剔除样本'] = {reason: pd.DataFrame(**sample) for reason, sample in quality['剔除样本'].items()}
+    return {'df': df, 'cube': cube, 'sketch': sketch, 'row_keys': row_keys, 'quality': quality}
+
+
+def prune_snapshots():
+    """上传文件快照超过保留份数时，按最近打开时间删除最旧的快照"""
+    snapshot_dirs = [
+        os.path.join(SNAPSHOT_DIR, name) for name in os.listdir(SNAPSHOT_DIR) if not name.startswith('.')
+    ]
+    snapshot_dirs.sort(key=os.path.getmtime, reverse=True)
+    for directory in snapshot_dirs[SNAPSHOT_KEEP:]:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def snapshot_dir_for(content_key):
+    return os.path.join(SNAPSHOT_DIR, hashlib.blake2b(repr(content_key).encode(), digest_size=16).hexdigest())
+
+
+def persist_snapshot(snapshot_dir, dataset):
+    """写入快照后改用内存映射的数据，释放进程内的副本"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    write_snapshot(snapshot_dir, dataset)
+    prune_snapshots()
+    return open_snapshot(snapshot_dir)
+
+
+def get_year_dataset(store, file, year, dedup_columns):
+    """取某年份的数据集；同一上传文件只解析一次，相同内容的文件在所有会话间共享同一份清洗结果和聚合"""
+    if file is None:
+        store.pop_dataset(year)
+        return None
+
+    # 上传文件或去重键列变化时重新加载
+    entry = store.get_dataset(year)
+    if entry is None or entry['file_id'] != file.file_id or entry['dedup_columns'] != dedup_columns:
+        content_key = (
+            hashlib.blake2b(file.getvalue(), digest_size=16).hexdigest(), year, dedup_key(dedup_columns), AMOUNT_STORAGE,
+            CITY_RULES_VERSION, PROJECT_ID_COLUMN,
+        )
+        snapshot_dir = snapshot_dir_for(content_key)
+
+        def load_shared_dataset():
+            # 已有快照（服务重启前或其他进程解析过同一内容）时直接内存映射打开
+            if os.path.isdir(snapshot_dir):
+                try:
+                    with profiler.stage(f'{year}年快照读取'):
+                        os.utime(snapshot_dir)
+                        return open_snapshot(snapshot_dir)
+                except (OSError, ValueError):
+                    # 损坏的快照删除后重新解析
+                    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+            quality_ledger = {}
+            df = load_data(file, year, quality_ledger, dedup_columns)
+            if df is None:
+                return None
+            dataset = build_shared_dataset(df, quality_ledger[year])
             try:
-                # 如果UTF-8失败，尝试GBK编码
-                file.seek(0)  # 重置文件指针
-                df = pd.read_csv(file, encoding='gbk')
-            except UnicodeDecodeError:
+                with profiler.stage(f'{year}年快照写入'):
+                    return persist_snapshot(snapshot_dir, dataset)
+            except OSError as e:
+                st.sidebar.warning(f"{year}年数据快照写入失败，本次仅使用内存中的数据：{e}")
+                return dataset
+
+        shared = get_shared_dataset_cache().get_or_load(content_key, load_shared_dataset)
+        if shared is None:
+            store.pop_dataset(year)
+            return None
+
+        entry = new_session_entry(file.name, file.file_id, dedup_columns, content_key, shared)
+        store.set_dataset(year, entry)
+    return entry
+
+
+def save_library_dataset(name, year, entry):
+    """把会话中的年度数据（含已应用的增量修正）保存到数据集库，同名同年份的旧数据集被替换"""
+    dataset_id = uuid.uuid4().hex
+    meta = {
+        '数据集ID': dataset_id,
+        '名称': name,
+        '年份': year,
+        '保存时间': datetime.now().isoformat(timespec='seconds'),
+        '来源': entry['source'],
+        '行数': len(entry['df']),
+        '去重键列': None if entry['dedup_columns'] is None else list(entry['dedup_columns']),
+        '已应用增量修正': len(entry['applied_deltas']),
+        '金额存储': AMOUNT_STORAGE,
+        '城市规则': CITY_RULES_VERSION,
+        '项目编号列': PROJECT_ID_COLUMN,
+    }
+    # 与上传文件快照格式相同，明细和聚合立方体都可直接内存映射读取
+    os.makedirs(DATASET_LIBRARY_DIR, exist_ok=True)
+    write_snapshot(os.path.join(DATASET_LIBRARY_DIR, dataset_id), entry, meta)
+
+    for old_meta in list_library_datasets():
+        if old_meta['名称'] == name and old_meta['年份'] == year and old_meta['数据集ID'] != dataset_id:
+            delete_library_dataset(old_meta)
+    return meta
+
+
+def delete_library_dataset(meta):
+    # 已打开该数据集的会话持有内存映射，删除目录不影响它们继续使用
+    shutil.rmtree(os.path.join(DATASET_LIBRARY_DIR, meta['数据集ID']), ignore_errors=True)
+
+
+def get_library_dataset(store, meta):
+    """取数据集库中的年度数据集：内存映射打开快照，跳过CSV解析、清洗和聚合"""
+    year = meta['年份']
+    entry = store.get_dataset(year)
+    if entry is None or entry['file_id'] != meta['数据集ID']:
+        content_key = (meta['数据集ID'], year, dedup_key(meta['去重键列']), AMOUNT_STORAGE, CITY_RULES_VERSION, PROJECT_ID_COLUMN)
+
+        def load_shared_dataset():
+            with profiler.stage(f'{year}年数据集库读取'):
                 try:
-                    # 如果GBK也失败，尝试GB2312编码
-                    file.seek(0)  # 重置文件指针
-                    df = pd.read_csv(file, encoding='gb2312')
-                except UnicodeDecodeError:
-                    # 最后尝试ISO-8859-1编码
-                    file.seek(0)  # 重置文件指针
-                    df = pd.read_csv(file, encoding='iso-8859-1')
-        
-        # 数据清洗：移除空行和无效行
-        df = df.dropna(how='all')  # 删除完全空白的行
-        df = df.dropna(subset=['业绩金额'])  # 删除业绩金额为空的行
-        
-        # 确保业绩金额为数值型
-        df['业绩金额'] = pd.to_numeric(df['业绩金额'], errors='coerce')
-        
-        # 移除业绩金额转换失败的行
-        df = df.dropna(subset=['业绩金额'])
-        
-        # 移除重复行（如果存在）
-        df = df.drop_duplicates()
-        
-        # 重置索引
-        df = df.reset_index(drop=True)
-        
-        # 添加年份列
-        df['年份'] = year
-        
-        return df
+                    dataset = open_snapshot(os.path.join(DATASET_LIBRARY_DIR, meta['数据集ID']))
+                except (OSError, ValueError) as e:
+                    st.sidebar.error(f"数据集“{meta['名称']}”读取失败：{e}")
+                    return None
+            # 保存时的金额存储方式与当前设置不同时，转换金额并重建聚合立方体
+            saved_storage = meta.get('金额存储', 'float64')
+            if saved_storage != AMOUNT_STORAGE:
+                df = dataset['df'].assign(业绩金额=store_amount(amount_in_wan(dataset['df']['业绩金额'], saved_storage)))
+                dataset = {**dataset, 'df': df, 'cube': build_aggregate_cube(df)}
+            # 保存时的城市规范化规则与当前不同时，按当前规则重新规范化
+            if meta.get('城市规则') != CITY_RULES_VERSION:
+                df = dataset['df'].assign(城市=canonicalize_cities(dataset['df']['城市']))
+                dataset = {**dataset, 'df': df, 'cube': build_aggregate_cube(df), 'sketch': build_quantile_sketch(df)}
+            # 保存时的项目编号列与当前设置不同时，按当前设置重算项目键
+            if meta.get('项目编号列') != PROJECT_ID_COLUMN:
+                dataset = {**dataset, 'row_keys': project_keys(dataset['df'])}
+            return dataset
+
+        shared = get_shared_dataset_cache().get_or_load(content_key, load_shared_dataset)
+        if shared is None:
+            store.pop_dataset(year)
+            return None
+
+        entry = new_session_entry(
+            f"数据集库：{meta['名称']}", meta['数据集ID'], meta['去重键列'], content_key, shared
+        )
+        store.set_dataset(year, entry)
+    return entry
+
+
+# 监控目录：ETL每晚导出的CSV放入该目录后，由后台线程按相同清洗规则预处理、聚合并写入快照（为空时不启用）
+WATCH_DIR = os.environ.get('DASHBOARD_WATCH_DIR', '')
+WATCH_INTERVAL_SECONDS = int(os.environ.get('DASHBOARD_WATCH_INTERVAL_SECONDS', '60'))
+WATCH_YEARS = (2024, 2025)
+
+
+def watched_file_year(file_name):
+    """从文件名中识别数据年份（如“项目导出_2025-06-30.csv”），识别不出时返回None"""
+    if not file_name.lower().endswith('.csv'):
+        return None
+    for match in re.findall(r'20\d{2}', file_name):
+        if int(match) in WATCH_YEARS:
+            return int(match)
     return None
 
+
+class WatchedFile(io.BytesIO):
+    """监控目录中的文件，接口与上传文件相同（name、file_id、getvalue、seek），内容在首次读取时才载入"""
+
+    def __init__(self, path, mtime_ns):
+        super().__init__()
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file_id = f'{path}@{mtime_ns}'
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with open(self.path, 'rb') as f:
+                self.write(f.read())
+            self._loaded = True
+
+    def getvalue(self):
+        self._ensure_loaded()
+        return super().getvalue()
+
+    def seek(self, *args):
+        self._ensure_loaded()
+        return super().seek(*args)
+
+
+class DirectoryWatcher:
+    """后台线程定时扫描监控目录，新出现或更新的导出文件写入稳定后立即预处理，放入共享缓存并写入快照"""
+
+    def __init__(self, directory, interval_seconds, shared_cache):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.shared_cache = shared_cache
+        self.files = {}
+        self._lock = threading.Lock()
+        # 先同步登记一次目录中的文件，首个会话即可选用；预处理都在后台线程中进行
+        self.scan()
+        self._thread = threading.Thread(target=self._run, name='dashboard-directory-watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            # 目录暂时不可访问（如网络盘断开）或扫描中出现任何异常都只跳过本周期，避免后台线程退出后不再监控
+            try:
+                for record in self.scan():
+                    self._ingest(record)
+            except Exception:
+                pass
+            time.sleep(self.interval_seconds)
+
+    def _set_status(self, record, status):
+        with self._lock:
+            record['状态'] = status
+
+    def scan(self):
+        """登记目录中可识别年份的CSV文件，返回已写入稳定、需要预处理的文件记录"""
+        now = time.time()
+        seen_paths = set()
+        ready_records = []
+        for dir_entry in os.scandir(self.directory):
+            year = watched_file_year(dir_entry.name)
+            if year is None or not dir_entry.is_file():
+                continue
+            stat = dir_entry.stat()
+            seen_paths.add(dir_entry.path)
+
+            with self._lock:
+                record = self.files.get(dir_entry.path)
+                if record is None or record['mtime_ns'] != stat.st_mtime_ns:
+                    record = {
+                        'path': dir_entry.path,
+                        'mtime_ns': stat.st_mtime_ns,
+                        '文件': dir_entry.name,
+                        '年份': year,
+                        '修改时间': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                        '状态': '待预处理',
+                    }
+                    self.files[dir_entry.path] = record
+                elif record['状态'] != '待预处理':
+                    continue
+
+            # 超过一个扫描周期没有再写入，认为ETL已导出完毕
+            if now - stat.st_mtime >= self.interval_seconds:
+                ready_records.append(record)
+
+        with self._lock:
+            for path in set(self.files) - seen_paths:
+                del self.files[path]
+        return ready_records
+
+    def _ingest(self, record):
+        self._set_status(record, '预处理中')
+        year = record['年份']
+        file = WatchedFile(record['path'], record['mtime_ns'])
+
+        def load_watched_dataset():
+            if os.path.isdir(snapshot_dir):
+                return open_snapshot(snapshot_dir)
+            df = read_csv_with_schema(file)
+            if df is None:
+                raise ValueError("无法识别文件编码")
+            quality_ledger = {}
+            df = clean_data(df, year, quality_ledger)
+            return persist_snapshot(snapshot_dir, build_shared_dataset(df, quality_ledger[year]))
+
+        # 单个文件的任何异常（读取、解析、清洗、写快照）都只把该文件标记为失败，不影响其他文件和后续扫描
+        try:
+            # 按默认键列去重预处理（只读取看板使用的列），与未修改去重设置的会话使用同一份快照和缓存
+            content_key = (
+                hashlib.blake2b(file.getvalue(), digest_size=16).hexdigest(), year, dedup_key(()), AMOUNT_STORAGE,
+                CITY_RULES_VERSION, PROJECT_ID_COLUMN,
+            )
+            snapshot_dir = snapshot_dir_for(content_key)
+            self.shared_cache.get_or_load(content_key, load_watched_dataset)
+        except Exception as e:
+            self._set_status(record, f'失败：{e}')
+        else:
+            self._set_status(record, '就绪')
+
+    def _is_stable(self, record, now):
+        # 已就绪，或超过一个扫描周期没有再写入（与后台预处理的判定相同），可能仍在写入的文件不交给会话
+        return record['状态'] == '就绪' or (
+            record['状态'] in ('预处理中', '待预处理') and now - record['mtime_ns'] / 1e9 >= self.interval_seconds
+        )
+
+    def latest_file(self, year):
+        """取某年份最新的已就绪文件；尚无就绪文件时取最新的已写入稳定、正在预处理的文件（会话等待同一次预处理完成）"""
+        now = time.time()
+        with self._lock:
+            records = [record for record in self.files.values() if record['年份'] == year]
+        for stable_statuses in (('就绪',), ('预处理中', '待预处理')):
+            candidates = [
+                record for record in records if record['状态'] in stable_statuses and self._is_stable(record, now)
+            ]
+            if candidates:
+                latest = max(candidates, key=lambda record: record['mtime_ns'])
+                return WatchedFile(latest['path'], latest['mtime_ns'])
+        return None
+
+    def exporting_files(self, year):
+        """某年份仍在写入（未超过一个扫描周期）的导出文件名"""
+        now = time.time()
+        with self._lock:
+            return [
+                record['文件'] for record in self.files.values()
+                if record['年份'] == year and record['状态'] == '待预处理' and not self._is_stable(record, now)
+            ]
+
+    def stats(self):
+        with self._lock:
+            return [
+                {key: record[key] for key in ('文件', '年份', '修改时间', '状态')}
+                for record in sorted(self.files.values(), key=lambda record: record['mtime_ns'], reverse=True)
+            ]
+
+
+@st.cache_resource
+def get_directory_watcher(directory):
+    return DirectoryWatcher(directory, WATCH_INTERVAL_SECONDS, get_shared_dataset_cache())
+
+
+def apply_delta(entry, delta_df):
+    """把增量修正行合并进年度数据并只更新受影响的立方体单元格，返回被替换的原有行数
+
+    明细和项目键哈希生成新对象，立方体先复制再原地更新，不会改动各会话共享的数据集；
+    原有数据或修正数据无法按项目编号匹配时抛出ValueError，不做任何修改
+    """
+    if PROJECT_ID_COLUMN not in entry['df'].columns:
+        raise ValueError(f"原有数据没有“{PROJECT_ID_COLUMN}”列，无法确定修正行对应的项目")
+    if PROJECT_ID_COLUMN not in delta_df.columns or delta_df[PROJECT_ID_COLUMN].isna().any():
+        raise ValueError(f"修正数据的每一行都必须填写“{PROJECT_ID_COLUMN}”")
+
+    # 与修正行项目编号相同的原有行被替换，其余修正行为新增项目
+    delta_keys = project_keys(delta_df)
+    replaced_mask = pd.Series(entry['row_keys'], copy=False).isin(delta_keys).to_numpy()
+    replaced_rows = entry['df'].take(np.flatnonzero(replaced_mask))
+
+    # 只有确实替换了原有行时才需要筛选整张年度明细，纯新增时直接追加
+    kept_df, kept_keys = entry['df'], entry['row_keys']
+    if len(replaced_rows) > 0:
+        kept_df, kept_keys = kept_df[~replaced_mask], kept_keys[~replaced_mask]
+    entry['df'] = concat_detail_frames([kept_df, delta_df])
+    entry['row_keys'] = np.concatenate([kept_keys, delta_keys])
+
+    # 立方体变化量 = 修正行的贡献 - 被替换行的贡献
+    cube_change = build_aggregate_cube(delta_df).sub(build_aggregate_cube(replaced_rows), fill_value=0)
+    cube_change = cube_change.astype(entry['cube'].dtypes.to_dict())
+
+    cube = entry['cube'].copy()
+    existing_cells = cube_change.index.intersection(cube.index)
+    cube.loc[existing_cells] += cube_change.loc[existing_cells]
+    new_cells = cube_change.index.difference(cube.index)
+    if len(new_cells) > 0:
+        cube = pd.concat([cube, cube_change.loc[new_cells]])
+
+    # 项目全部被替换掉的单元格不再保留
+    empty_cells = existing_cells[cube.loc[existing_cells, '项目数量'].to_numpy() <= 0]
+    if len(empty_cells) > 0:
+        cube = cube.drop(empty_cells)
+    entry['cube'] = cube
+
+    # 分位数草图同样加上修正行、减去被替换行的桶计数
+    entry['sketch'] = merge_quantile_sketches(
+        [entry['sketch'], build_quantile_sketch(delta_df), -build_quantile_sketch(replaced_rows)]
+    )
+
+    # 合并后条目成为本会话独享的数据，按独享内存计入会话预算
+    entry['shared'] = False
+    entry['nbytes'] = dataset_nbytes(entry)
+
+    return len(replaced_rows)
+
+
+# 出现在超过这么多客户名称中的二元字组视为常见词（如“中国”“科技”），不用于分块
+CLIENT_MATCH_COMMON_GRAM = 200
+
+# 名称中不参与比较的空白和标点（全角符号已由NFKC规范化为半角）
+CLIENT_NAME_PUNCTUATION = re.compile(r'[\s()\[\]【】<>《》"\'“”‘’·.,，。、:;\-—_/&]')
+
+# 简称规则中较长名称多出的部分只能由这些泛称和地区名组成（如“万科”与“万科企业股份”“万科北京分公司”），
+# 多出“设计发展”“第八工程局”等实际内容时是不同客户
+CLIENT_NAME_QUALIFIERS = ['控股', '股份', '实业', '企业', '总公司', '分公司', '分部', '区域', '分', '中国']
+CLIENT_REGION_TAGS = [
+    '北京', '天津', '上海', '重庆', '河北', '山西', '辽宁', '吉林', '黑龙江', '江苏', '浙江', '安徽', '福建', '江西',
+    '山东', '河南', '湖北', '湖南', '广东', '海南', '四川', '贵州', '云南', '陕西', '甘肃', '青海', '台湾', '内蒙古',
+    '广西', '西藏', '宁夏', '新疆', '香港', '澳门', '华北', '华东', '华南', '华中', '西南', '西北', '东北',
+]
+CLIENT_REGION_PATTERN = re.compile(r'[\u4e00-\u9fff]{2,3}(?:省|市|自治区|特别行政区)')
+
+# 名称中的数字（含中文数字）不同时不合并，如“第三工程局”与“第八工程局”
+CLIENT_NAME_NON_NUMERAL = re.compile(r'[^\d零〇一二三四五六七八九十百千]')
+
+
+def client_name_key(name, suffixes):
+    """客户名称归一键：全角转半角，去掉空白和标点，再反复去除后缀"""
+    key = CLIENT_NAME_PUNCTUATION.sub('', unicodedata.normalize('NFKC', name))
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in suffixes:
+            if key.endswith(suffix) and len(key) > len(suffix):
+                key = key[:-len(suffix)]
+                stripped = True
+                break
+    return key
+
+
+def is_client_name_tag(remainder, suffixes):
+    """较长名称去掉简称开头后剩下的部分是否只由公司后缀、泛称和地区名组成"""
+    tags = sorted({*suffixes, *CLIENT_NAME_QUALIFIERS, *CLIENT_REGION_TAGS}, key=len, reverse=True)
+    while remainder:
+        region = CLIENT_REGION_PATTERN.match(remainder)
+        if region is not None:
+            remainder = remainder[region.end():]
+            continue
+        tag = next((tag for tag in tags if remainder.startswith(tag)), None)
+        if tag is None:
+            return False
+        remainder = remainder[len(tag):]
+    return True
+
+
+def cluster_similar_client_keys(keys, threshold, suffixes):
+    """按二元字组分块做模糊匹配，返回每个归一键所属簇的编号
+
+    只比较至少共有一个非常见二元字组的名称，避免两两比较；相似度为全部二元字组的Dice系数，
+    较短名称（至少4个字）是较长名称的开头（简称）时也视为同一客户，但多出的部分只能是后缀、泛称或地区名；
+    名称中的数字（含中文数字）不同时不合并
+    """
+    n_keys = len(keys)
+    key_grams = [{key[i:i + 2] for i in range(len(key) - 1)} for key in keys]
+    total_counts = np.array([len(grams) for grams in key_grams])
+    gram_ids = {}
+    posting_keys, posting_grams = [], []
+    for key_id, grams in enumerate(key_grams):
+        for gram in grams:
+            posting_keys.append(key_id)
+            posting_grams.append(gram_ids.setdefault(gram, len(gram_ids)))
+    posting_keys = np.asarray(posting_keys, dtype='int64')
+    posting_grams = np.asarray(posting_grams, dtype='int64')
+
+    # 只保留非常见二元字组，按字组排序后同一字组的名称相邻，组成一个分块
+    informative = np.bincount(posting_grams, minlength=len(gram_ids))[posting_grams] <= CLIENT_MATCH_COMMON_GRAM
+    posting_keys, posting_grams = posting_keys[informative], posting_grams[informative]
+    order = np.lexsort((posting_keys, posting_grams))
+    posting_keys, posting_grams = posting_keys[order], posting_grams[order]
+    gram_counts = np.bincount(posting_keys, minlength=n_keys)
+
+    # 分块内两两配对：每个位置与同一分块中排在它后面的各个位置组成一对
+    block_starts = np.flatnonzero(np.diff(posting_grams, prepend=-1) != 0)
+    block_ends = np.append(block_starts[1:], len(posting_grams))
+    later = np.repeat(block_ends, block_ends - block_starts) - np.arange(len(posting_grams)) - 1
+    left_positions = np.repeat(np.arange(len(posting_grams)), later)
+    pair_offsets = np.arange(len(left_positions)) - np.repeat(np.cumsum(later) - later, later) + 1
+    pairs = np.sort(posting_keys[left_positions] * n_keys + posting_keys[left_positions + pair_offsets])
+
+    # 同一对名称在几个分块中出现，就共有几个非常见二元字组
+    pair_starts = np.flatnonzero(np.diff(pairs, prepend=-1) != 0)
+    shared = np.diff(np.append(pair_starts, len(pairs)))
+    left, right = np.divmod(pairs[pair_starts], n_keys)
+
+    # 共有的常见字组最多为两者常见字组数的较小值，据此得到Dice系数上界，只对上界达到阈值的配对精确计算
+    common_counts = total_counts - gram_counts
+    total_sums = total_counts[left] + total_counts[right]
+    upper = 2 * (shared + np.minimum(common_counts[left], common_counts[right])) / total_sums
+    matched = np.zeros(len(left), dtype=bool)
+    for pair in np.flatnonzero(upper >= threshold):
+        matched[pair] = 2 * len(key_grams[left[pair]] & key_grams[right[pair]]) / total_sums[pair] >= threshold
+
+    # 简称：较短名称的非常见字组全部共有时再核对是否为较长名称的开头
+    shorter = np.where(total_counts[left] <= total_counts[right], left, right)
+    for pair in np.flatnonzero(~matched & (shared == gram_counts[shorter]) & (total_counts[shorter] >= 3)):
+        short_key, long_key = sorted((keys[left[pair]], keys[right[pair]]), key=len)
+        matched[pair] = long_key.startswith(short_key)
+
+    # 一个名称是另一个的开头时（无论按相似度还是简称匹配），多出的部分必须只是后缀、泛称或地区名，
+    # 否则是同一集团下的不同单位（如“北京城建”与“北京城建设计发展”）
+    for pair in np.flatnonzero(matched):
+        short_key, long_key = sorted((keys[left[pair]], keys[right[pair]]), key=len)
+        if long_key.startswith(short_key):
+            matched[pair] = is_client_name_tag(long_key[len(short_key):], suffixes)
+    digit_codes, _ = pd.factorize(pd.Series(keys, dtype='str').str.replace(CLIENT_NAME_NON_NUMERAL, '', regex=True))
+    matched &= digit_codes[left] == digit_codes[right]
+    left, right = left[matched], right[matched]
+
+    # 连通分量：每轮把配对两端的簇编号取小并做指针跳跃，直到不再变化
+    labels = np.arange(n_keys)
+    while True:
+        smaller = np.minimum(labels[left], labels[right])
+        merged = labels.copy()
+        np.minimum.at(merged, left, smaller)
+        np.minimum.at(merged, right, smaller)
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+
+def build_client_canonical(client_column, settings):
+    """客户名称归一：返回(按标准名称重新编码的客户列, 被合并的名称明细)
+
+    只对去重后的名称计算，结果再按编码映射回每一行；簇内出现行数最多的原始名称作为标准名称，
+    别名表中的标准名称优先
+    """
+    suffixes, aliases, threshold = settings
+    client_codes, names = pd.factorize(client_column)
+    row_counts = np.bincount(client_codes[client_codes >= 0], minlength=len(names))
+
+    alias_keys = {client_name_key(alias, suffixes): canonical for alias, canonical in aliases}
+    alias_keys.update({client_name_key(canonical, suffixes): canonical for _, canonical in aliases})
+    keys = [client_name_key(name, suffixes) for name in names]
+    keys = [client_name_key(alias_keys[key], suffixes) if key in alias_keys else key for key in keys]
+    key_codes, unique_keys = pd.factorize(pd.Series(keys, dtype='str'))
+
+    key_labels = np.arange(len(unique_keys))
+    if threshold < 1 and len(unique_keys) > 1:
+        key_labels = cluster_similar_client_keys(list(unique_keys), threshold, suffixes)
+    clusters = key_labels[key_codes]
+
+    # 每个簇取出现行数最多的原始名称
+    representative_order = np.lexsort((-row_counts, clusters))
+    first_in_cluster = np.diff(clusters[representative_order], prepend=-1) != 0
+    canonical_names = pd.Series(np.asarray(names, dtype=object)[representative_order[first_in_cluster]],
+                                index=clusters[representative_order[first_in_cluster]])
+    alias_targets = {client_name_key(canonical, suffixes): canonical for _, canonical in aliases}
+    for key, canonical in alias_targets.items():
+        key_positions = np.flatnonzero(unique_keys == key)
+        if len(key_positions) > 0:
+            canonical_names[key_labels[key_positions[0]]] = canonical
+
+    name_mapping = pd.Series(canonical_names.reindex(clusters).to_numpy(), index=names)
+    canonical_column = pd.Series(
+        pd.array(name_mapping.to_numpy(), dtype='str').take(client_codes, allow_fill=True),
+        index=client_column.index, name=client_column.name
+    )
+
+    merged = name_mapping[name_mapping.index != name_mapping.to_numpy()]
+    merged_names = pd.DataFrame({
+        '原始名称': merged.index, '标准名称': merged.to_numpy(), '行数': row_counts[names.get_indexer(merged.index)]
+    }).sort_values(['标准名称', '行数'], ascending=[True, False])
+    return canonical_column, merged_names
+
+
+@st.cache_data(show_spinner=False)
+def compute_city_growth(cube_2024, cube_2025):
+    """计算各城市业绩增长，并按增长绝对值预排序，便于按阈值二分切分"""
+    city_2024 = cube_totals(cube_2024, '城市')['业绩金额']
+    city_2025 = cube_totals(cube_2025, '城市')['业绩金额']
+
+    # 获取所有城市（包括只在一年出现的），缺失值填充为0
+    all_cities = city_2024.index.union(city_2025.index)
+    city_2024_full = city_2024.reindex(all_cities, fill_value=0)
+    city_2025_full = city_2025.reindex(all_cities, fill_value=0)
+
+    # 计算增长值
+    city_growth = (city_2025_full - city_2024_full).sort_values(ascending=False)
+
+    # 按增长绝对值升序排列，阈值对应的分割点可用二分查找得到
+    abs_order = np.argsort(city_growth.abs().values, kind='stable')
+    growth_by_abs = city_growth.iloc[abs_order]
+    growth_abs_sorted = np.abs(growth_by_abs.values)
+
+    return city_2024_full, city_2025_full, city_growth, growth_by_abs, growth_abs_sorted
+
+
+# 板块计算的后台线程数：数据就绪后立即提交，概览和核心分析先渲染，各板块渲染到时再取结果
+SECTION_WORKERS = int(os.environ.get('DASHBOARD_SECTION_WORKERS', '4'))
+
+
+@st.cache_resource
+def get_section_executor():
+    return ThreadPoolExecutor(max_workers=SECTION_WORKERS, thread_name_prefix='dashboard-section')
+
+
+class SectionTaskGraph:
+    """板块计算任务图：任务的依赖全部完成后才提交到线程池，互不依赖的任务并行计算，并记录各任务在工作线程上的耗时
+
+    所有任务只读共享的年度明细和聚合立方体，不调用streamlit，渲染在脚本线程中按各板块所需任务完成的先后进行
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.futures = {}
+        self.records = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, func, *args, deps=()):
+        """添加任务，deps中各任务的结果按顺序追加在args之后传给func"""
+        future = Future()
+        self.futures[name] = future
+        dep_futures = [self.futures[dep] for dep in deps]
+
+        def run():
+            try:
+                dep_results = [dep_future.result() for dep_future in dep_futures]
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                result = func(*args, *dep_results)
+                self._record(name, deps, wall_start, cpu_start)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        # 依赖完成后由回调提交，工作线程不会因等待排队中的依赖而互相阻塞
+        remaining = [len(dep_futures)]
+
+        def on_dep_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self.executor.submit(run)
+
+        if not dep_futures:
+            self.executor.submit(run)
+        for dep_future in dep_futures:
+            dep_future.add_done_callback(on_dep_done)
+
+    def _record(self, name, deps, wall_start, cpu_start):
+        wall_end = time.perf_counter()
+        with self._lock:
+            self.records.append({
+                '任务': name,
+                '依赖': '、'.join(deps),
+                '线程': threading.current_thread().name,
+                '开始(ms)': (wall_start - self._start) * 1000,
+                '墙钟时间(ms)': (wall_end - wall_start) * 1000,
+                'CPU时间(ms)': (time.thread_time() - cpu_start) * 1000,
+            })
+
+    def result(self, name):
+        return self.futures[name].result()
+
+    def as_completed(self, sections):
+        """sections为{板块: 所需任务名}，按所需任务全部完成的先后依次产出板块；同时就绪的板块按传入顺序产出"""
+        remaining = {section: set(tasks) for section, tasks in sections.items()}
+        task_names = {self.futures[task]: task for tasks in remaining.values() for task in tasks}
+
+        def take_ready():
+            ready = [section for section, tasks in remaining.items() if not tasks]
+            for section in ready:
+                del remaining[section]
+            return ready
+
+        yield from take_ready()
+        for future in as_completed(task_names):
+            for tasks in remaining.values():
+                tasks.discard(task_names[future])
+            yield from take_ready()
+
+    def summary(self):
+        """返回(各任务记录, 各任务墙钟时间之和, 整个任务图的墙钟跨度)"""
+        with self._lock:
+            records = list(self.records)
+        task_sum = sum(record['墙钟时间(ms)'] for record in records)
+        span = max((record['开始(ms)'] + record['墙钟时间(ms)'] for record in records), default=0)
+        return records, task_sum, span
+
+
+def cube_segment_totals(cube, city_segments):
+    """从聚合立方体按城市汇总后，再按各城市所属分群汇总业绩金额（万元）和项目数量"""
+    city_totals = cube.groupby(level='城市').sum()
+    totals = city_totals.groupby(city_segments.reindex(city_totals.index), observed=False).sum()
+    totals['业绩金额'] = amount_in_wan(totals['业绩金额'])
+    return totals
+
+
+def compute_year_totals(cube_2024, cube_2025, by, city_segments=None):
+    """两个年度在指定维度上的业绩金额和项目数量汇总；维度为“城市分群”时按city_segments把城市归入分群"""
+    if by == '城市分群':
+        return {2024: cube_segment_totals(cube_2024, city_segments), 2025: cube_segment_totals(cube_2025, city_segments)}
+    return {2024: cube_totals(cube_2024, by), 2025: cube_totals(cube_2025, by)}
+
+
+def compute_project_quality(city_totals):
+    """三.项目质量下降分析：各城市每年的项目数量、总业绩、平均项目业绩，以及平均项目业绩变化率"""
+    # 计算每个城市每年的项目数量和总业绩（由城市汇总拼接）
+    city_year_totals = pd.concat(city_totals, names=['年份', '城市']).reset_index()
+
+    # 筛选出在24年有业绩的城市
+    cities_with_2024_data = city_totals[2024].index
+    city_year_totals = city_year_totals[city_year_totals['城市'].isin(cities_with_2024_data)]
+
+    city_stats = pd.DataFrame({
+        '城市': city_year_totals['城市'],
+        '年份': city_year_totals['年份'],
+        '总业绩': city_year_totals['业绩金额'],
+        '项目数量': city_year_totals['项目数量'],
+        '平均项目业绩': city_year_totals['业绩金额'] / city_year_totals['项目数量'],
+    }).sort_values(['城市', '年份']).reset_index(drop=True)
+
+    # 计算每个城市的总业绩（用于排序）
+    city_total_performance = city_stats.groupby('城市')['总业绩'].sum().reset_index()
+    city_total_performance = city_total_performance.sort_values('总业绩', ascending=False)
+
+    # 重新排序城市数据
+    city_stats['城市'] = pd.Categorical(city_stats['城市'], categories=city_total_performance['城市'], ordered=True)
+    city_stats = city_stats.sort_values(['城市', '年份'])
+
+    # 计算平均项目业绩下降率（按城市向量化计算，避免逐城市筛选）
+    avg_2024 = city_totals[2024]['业绩金额'] / city_totals[2024]['项目数量']
+    avg_2025 = (city_totals[2025]['业绩金额'] / city_totals[2025]['项目数量']).reindex(cities_with_2024_data)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.where(
+            avg_2025.notna(),
+            (avg_2025.to_numpy() - avg_2024.to_numpy()) / avg_2024.to_numpy() * 100,
+            -100  # 2025年无数据，视为完全下降
+        )
+    decline_rates = dict(zip(cities_with_2024_data, rates))
+
+    return city_stats, city_total_performance, decline_rates
+
+
+# 自助法置信区间的重抽样次数和置信水平
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+# 每批重抽样权重矩阵（项目数×重抽样次数）的元素数上限，控制内存占用
+BOOTSTRAP_BATCH_CELLS = 1 << 22
+# 任一年项目数少于此值的城市不估计置信区间：只有一两个项目时该年的重抽样均值几乎不变，区间会显得过窄
+BOOTSTRAP_MIN_PROJECTS = 5
+# 项目数超过此值的城市×年份不逐项目重抽样，按正态近似抽取加权业绩和项目数
+BOOTSTRAP_EXACT_MAX_PROJECTS = 2000
+# 泊松(1)权重查表：16位均匀随机整数按泊松(1)的累计概率映射为权重，比逐个生成泊松随机数快得多
+BOOTSTRAP_POISSON_TABLE = np.searchsorted(
+    np.cumsum(np.exp(-1) / np.cumprod([1, *range(1, 16)])) * 65536, np.arange(65536), side='right'
+).astype('float32')
+
+
+def bootstrap_interval(samples):
+    """各行重抽样结果的置信区间，忽略无穷和空值（如重抽样后2024年没有项目），有效结果不足一半时为空"""
+    finite = np.isfinite(samples)
+    n_finite = finite.sum(axis=1)
+    # 空值排在每行末尾，有效结果在前n_finite个位置内取分位
+    ordered = np.sort(np.where(finite, samples, np.nan), axis=1)
+    tail = (1 - BOOTSTRAP_CONFIDENCE) / 2
+    bounds = []
+    for q in (tail, 1 - tail):
+        positions = np.floor(q * np.maximum(n_finite - 1, 0)).astype('int64')
+        bound = np.take_along_axis(ordered, positions[:, None], axis=1)[:, 0]
+        bounds.append(np.where(n_finite * 2 >= samples.shape[1], bound, np.nan))
+    return bounds
+
+
+def compute_city_bootstrap(df_all, n_resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """各城市业绩增长率和平均项目业绩变化率的自助法置信区间（%），置信区间不含0的变化为显著；
+    任一年项目数少于BOOTSTRAP_MIN_PROJECTS的城市区间为空、不标为显著
+
+    泊松自助法：每次重抽样给每个项目一个泊松(1)权重；项目按城市×年份排序后，一批重抽样的权重组成矩阵，
+    全部城市的加权业绩和项目数各一次reduceat得到。项目很多的城市×年份按重抽样结果的均值、方差和协方差直接抽样
+    """
+    codes, cities = pd.factorize(df_all['城市'])
+    groups = codes * 2 + (df_all['年份'].to_numpy() == 2025)
+    order = np.argsort(groups, kind='stable')
+    order = order[groups[order] >= 0]
+    sorted_groups = groups[order]
+    amounts = np.asarray(amount_in_wan(df_all['业绩金额'].to_numpy()), dtype='float64')[order]
+
+    n_groups = len(cities) * 2
+    point_sums = np.bincount(sorted_groups, weights=amounts, minlength=n_groups)
+    point_counts = np.bincount(sorted_groups, minlength=n_groups)
+    sums = np.zeros((n_groups, n_resamples))
+    counts = np.zeros((n_groups, n_resamples))
+    rng = np.random.default_rng(seed)
+
+    # 项目数不超过上限的城市×年份逐项目加权重抽样
+    exact_rows = point_counts[sorted_groups] <= BOOTSTRAP_EXACT_MAX_PROJECTS
+    exact_groups, exact_amounts = sorted_groups[exact_rows], amounts[exact_rows]
+    starts = np.flatnonzero(np.diff(exact_groups, prepend=-1) != 0)
+    present = exact_groups[starts]
+    batch = max(1, min(n_resamples, BOOTSTRAP_BATCH_CELLS // max(len(exact_amounts), 1)))
+    for begin in range(0, n_resamples if len(starts) > 0 else 0, batch):
+        end = min(begin + batch, n_resamples)
+        # 权重矩阵每行是一次重抽样，按行连续的项目段求和
+        weights = BOOTSTRAP_POISSON_TABLE[rng.integers(0, 65536, size=(end - begin, len(exact_amounts)), dtype=np.uint16)]
+        counts[present, begin:end] = np.add.reduceat(weights, starts, axis=1).T
+        sums[present, begin:end] = np.add.reduceat(weights * exact_amounts, starts, axis=1).T
+
+    # 项目很多时加权业绩和项目数近似服从二元正态：均值为原值，方差为Σ金额²和项目数，协方差为Σ金额
+    large = np.flatnonzero(point_counts > BOOTSTRAP_EXACT_MAX_PROJECTS)
+    if len(large) > 0:
+        square_sums = np.bincount(sorted_groups, weights=amounts ** 2, minlength=n_groups)[large]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rho = np.nan_to_num(point_sums[large] / np.sqrt(point_counts[large] * square_sums))
+        z = rng.standard_normal((2, len(large), n_resamples))
+        sums[large] = point_sums[large, None] + np.sqrt(square_sums)[:, None] * z[0]
+        counts[large] = point_counts[large, None] + np.sqrt(point_counts[large])[:, None] * (
+            rho[:, None] * z[0] + np.sqrt(1 - rho ** 2)[:, None] * z[1]
+        )
+
+    def changes(sums, counts):
+        # 偶数行为2024年、奇数行为2025年
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (sums[1::2] / sums[0::2] - 1) * 100
+            avg_change = ((sums[1::2] / counts[1::2]) / (sums[0::2] / counts[0::2]) - 1) * 100
+        return growth, avg_change
+
+    growth, avg_change = changes(point_sums[:, None], point_counts[:, None])
+    growth_samples, avg_change_samples = changes(sums, counts)
+    too_few = np.minimum(point_counts[0::2], point_counts[1::2]) < BOOTSTRAP_MIN_PROJECTS
+    growth_low, growth_high = (np.where(too_few, np.nan, bound) for bound in bootstrap_interval(growth_samples))
+    avg_low, avg_high = (np.where(too_few, np.nan, bound) for bound in bootstrap_interval(avg_change_samples))
+    return pd.DataFrame({
+        '2024年项目数': point_counts[0::2],
+        '2025年项目数': point_counts[1::2],
+        '项目过少': too_few,
+        '增长率(%)': growth[:, 0],
+        '增长率下限(%)': growth_low,
+        '增长率上限(%)': growth_high,
+        '增长率显著': (growth_low > 0) | (growth_high < 0),
+        '平均业绩变化率(%)': avg_change[:, 0],
+        '平均业绩变化率下限(%)': avg_low,
+        '平均业绩变化率上限(%)': avg_high,
+        '平均业绩变化显著': (avg_low > 0) | (avg_high < 0),
+    }, index=pd.Index(cities, name='城市'))
+
+
+# 项目规模分档：默认边界（万元）及三个边界时各档的名称，边界可在三.项目质量下降分析中调整
+PROJECT_BAND_EDGES = [50, 200, 1000]
+PROJECT_BAND_NAMES = ['小', '中', '大', '超大']
+
+
+def parse_project_band_edges(text):
+    """解析逗号分隔的分档边界，去重并升序；无法解析时返回None"""
+    try:
+        edges = sorted({float(value) for value in text.replace('，', ',').split(',') if value.strip()})
+    except ValueError:
+        return None
+    return tuple(edges) if edges and edges[0] > 0 else None
+
+
+def project_band_labels(edges):
+    """各档名称：三个边界时用小/中/大/超大，否则用金额区间"""
+    ranges = [f'<{edges[0]:g}万'] + [f'{low:g}-{high:g}万' for low, high in zip(edges, edges[1:])] + [f'≥{edges[-1]:g}万']
+    if len(edges) == len(PROJECT_BAND_NAMES) - 1:
+        return [f'{name}（{band_range}）' for name, band_range in zip(PROJECT_BAND_NAMES, ranges)]
+    return ranges
+
+
+def compute_project_bands(df_all, edges):
+    """项目规模分档：按业绩金额分档，一次分组汇总各年份×城市（一级业态）×档位的项目数量和业绩金额
+
+    返回{'城市': 汇总, '一级业态': 汇总, '全部': 汇总}，汇总的索引为维度值，列为(指标, 年份, 档位)
+    """
+    # 边界换算为存储单位后直接与业绩金额列比较，不换算整列
+    stored_edges = np.asarray(edges, dtype='float64') * (AMOUNT_SCALE or 1)
+    bands = np.searchsorted(stored_edges, df_all['业绩金额'].to_numpy(), side='right')
+    n_bands = len(edges) + 1
+    year_index = (df_all['年份'].to_numpy() == 2025).astype('int64')
+    amounts = df_all['业绩金额'].to_numpy()
+
+    labels = project_band_labels(edges)
+    band_columns = pd.MultiIndex.from_product([[2024, 2025], labels], names=['年份', '档位'])
+    summaries = {}
+    for dimension in ('城市', '一级业态', None):
+        if dimension is None:
+            codes, values = np.zeros(len(df_all), dtype='int64'), pd.Index(['全部'])
+        else:
+            codes, values = pd.factorize(df_all[dimension], use_na_sentinel=False)
+        # 每行落在(维度值, 年份, 档位)单元格中，项目数量和业绩金额各一次bincount
+        cells = (codes * 2 + year_index) * n_bands + bands
+        n_cells = len(values) * 2 * n_bands
+        counts = np.bincount(cells, minlength=n_cells).reshape(len(values), -1)
+        band_amounts = amount_in_wan(np.bincount(cells, weights=amounts, minlength=n_cells)).reshape(len(values), -1)
+        summaries[dimension or '全部'] = pd.concat({
+            '项目数量': pd.DataFrame(counts, index=values, columns=band_columns),
+            '业绩金额': pd.DataFrame(band_amounts, index=values, columns=band_columns),
+        }, axis=1)
+    return summaries
+
+
+def project_band_mix_shift(summary, measure='项目数量'):
+    """各档位占比（%）及2025年相对2024年的变化（百分点）"""
+    values = summary[measure]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = {year: values[year].div(values[year].sum(axis=1), axis=0) * 100 for year in (2024, 2025)}
+    return shares[2024], shares[2025], shares[2025] - shares[2024]
+
+
+# 项目业绩分布展示的分位数
+SKETCH_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def compute_city_value_quantiles(sketches):
+    """各城市各年份的项目业绩分位数（万元），由各年的分位数草图估计，列为(年份, 分位数)"""
+    return pd.concat(
+        {year: sketch_quantiles(sketch, SKETCH_QUANTILES, by=['城市']) for year, sketch in sketches.items()}, axis=1
+    )
+
+
+def city_grade_thresholds(total_cities):
+    """S/A/B级的排名上限：前25%、前50%、前75%，其余为C级"""
+    return max(1, total_cities // 4), max(2, total_cities // 2), max(3, total_cities * 3 // 4)
+
+
+def compute_city_ranking(city_totals):
+    """城市业绩排名变化：各年城市汇总的密集排名、排名变化、等级迁移，按排名变化降序（上升最多的在前）
+
+    当年无业绩的城市排名和等级为空，排名变化也为空，排在最后；等级分区按当年有业绩城市的排名数分别计算，
+    返回(排名表, {年份: S/A/B级排名上限})
+    """
+    amounts = pd.DataFrame({year: totals['业绩金额'] for year, totals in city_totals.items()})
+    ranks = amounts.rank(method='dense', ascending=False)
+    thresholds = {
+        year: city_grade_thresholds(int(ranks[year].max()) if ranks[year].notna().any() else 0) for year in (2024, 2025)
+    }
+
+    # 等级按排名落在哪个分区一次性选出，无排名的城市记为N/A
+    grades = {
+        year: np.select(
+            [ranks[year] <= thresholds[year][0], ranks[year] <= thresholds[year][1], ranks[year] <= thresholds[year][2],
+             ranks[year].notna()],
+            ['S', 'A', 'B', 'C'], default='N/A'
+        )
+        for year in (2024, 2025)
+    }
+
+    ranking = pd.DataFrame({
+        '城市': amounts.index,
+        '2024年排名': ranks[2024].astype('Int64'),
+        '2025年排名': ranks[2025].astype('Int64'),
+        '2024年业绩': amounts[2024].fillna(0),
+        '2025年业绩': amounts[2025].fillna(0),
+        '2024年等级': grades[2024],
+        '2025年等级': grades[2025],
+    }).reset_index(drop=True)
+    ranking['总业绩'] = ranking['2024年业绩'] + ranking['2025年业绩']
+    ranking['排名变化'] = ranking['2024年排名'] - ranking['2025年排名']  # 正数表示排名上升
+    # 当前等级以2025年为准，2025年无业绩时沿用2024年
+    ranking['等级'] = np.where(ranking['2025年排名'].notna(), grades[2025], grades[2024])
+    ranking['等级迁移'] = ranking['2024年等级'] + '→' + ranking['2025年等级']
+
+    # 一次排序得到升降榜：上升最多的在前、下降最多的在后，排名变化相同时总业绩高的在前
+    ranking = ranking.sort_values(['排名变化', '总业绩'], ascending=[False, False], na_position='last')
+    return ranking.reset_index(drop=True), thresholds
+
+
+# 全部城市排名哑铃图只画总业绩最高的若干城市，等级分布和升降榜仍覆盖全部城市
+RANKING_CHART_TOP_CITIES = 30
+
+
+def build_ranking_dumbbell(ranking_df, thresholds, title):
+    """城市排名哑铃图：连线表示两年排名变化，排名未变的城市加金色标记，x轴反转使第1名在右侧"""
+    ranking_df = ranking_df.sort_values('总业绩')  # 从下到上总业绩递增
+    cities = ranking_df['城市'].to_numpy()
+    rank_2024 = ranking_df['2024年排名'].to_numpy(dtype=float, na_value=np.nan)
+    rank_2025 = ranking_df['2025年排名'].to_numpy(dtype=float, na_value=np.nan)
+    both_years = ~np.isnan(rank_2024) & ~np.isnan(rank_2025)
+    unchanged = both_years & (rank_2024 == rank_2025)
+
+    fig = go.Figure()
+
+    # 所有城市的连线合并为一条折线，城市之间用None断开
+    gaps = [None] * int(both_years.sum())
+    line_x = np.column_stack([rank_2024[both_years], rank_2025[both_years], gaps]).ravel()
+    line_y = np.column_stack([cities[both_years], cities[both_years], gaps]).ravel()
+    fig.add_trace(go.Scatter(
+        x=line_x.tolist(), y=line_y.tolist(),
+        mode='lines',
+        line=dict(color='rgba(128, 128, 128, 0.5)', width=2),
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+
+    if unchanged.any():
+        fig.add_trace(go.Scatter(
+            x=rank_2024[unchanged], y=cities[unchanged],
+            mode='markers',
+            marker=dict(color='rgba(255, 215, 0, 0.3)', size=24, symbol='circle', line=dict(width=3, color='gold')),
+            name='排名未变',
+            hoverinfo='skip'
+        ))
+
+    for year, ranks, color in ((2024, rank_2024, '#3498db'), (2025, rank_2025, '#e74c3c')):
+        fig.add_trace(go.Scatter(
+            x=ranks, y=cities,
+            mode='markers',
+            marker=dict(color=color, size=12, symbol='circle', line=dict(width=2, color='white')),
+            name=f'{year}年排名',
+            customdata=ranking_df[f'{year}年业绩'],
+            hovertemplate=f'%{{y}}<br>{year}年排名: %{{x}}<br>业绩: %{{customdata:,.0f}}<extra></extra>'
+        ))
+
+    # 等级分区线
+    s_threshold, a_threshold, b_threshold = thresholds
+    fig.add_vline(x=s_threshold + 0.5, line_dash="dash", line_color="gold", line_width=2,
+                  annotation_text="S级", annotation_position="top")
+    fig.add_vline(x=a_threshold + 0.5, line_dash="dash", line_color="silver", line_width=2,
+                  annotation_text="A级", annotation_position="top")
+    fig.add_vline(x=b_threshold + 0.5, line_dash="dash", line_color="#cd7f32", line_width=2,
+                  annotation_text="B级", annotation_position="top")
+
+    fig.update_layout(
+        title=title,
+        title_font=dict(color='#1B4965', size=16),
+        xaxis_title='排名（数字越小排名越高）',
+        yaxis_title='城市',
+        xaxis=dict(
+            title_font=dict(color='#1B4965'),
+            tickfont=dict(color='#1B4965'),
+            autorange='reversed',  # 反转x轴，使排名1在右侧
+            showgrid=True,
+            gridcolor='#F6F8FA'
+        ),
+        yaxis=dict(
+            title_font=dict(color='#1B4965'),
+            tickfont=dict(color='#1B4965'),
+            showgrid=True,
+            gridcolor='#F6F8FA'
+        ),
+        height=max(400, len(ranking_df) * 30),  # 根据城市数量调整高度
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color='#1B4965')),
+        font=dict(size=12, color='#1B4965'),
+        plot_bgcolor='#E3EAF3',
+        paper_bgcolor='#E3EAF3'
+    )
+    return fig
+
+
+def compute_industry_pivot(dimension, industry_totals):
+    """五.行业业绩分析：各行业（或所选维度如城市分群）两年业绩透视表，按两年总业绩降序"""
+    # 计算每年每个行业的业绩总和
+    industry_performance = pd.concat(
+        {year: totals['业绩金额'] for year, totals in industry_totals.items()},
+        names=['年份', dimension]
+    ).reset_index()
+
+    # 透视表，便于计算
+    industry_pivot = industry_performance.pivot(index=dimension, columns='年份', values='业绩金额').fillna(0)
+
+    # 计算总业绩并排序
+    industry_pivot['总业绩'] = industry_pivot[2024] + industry_pivot[2025]
+    return industry_pivot.sort_values('总业绩', ascending=False)
+
+
+def compute_format_share_matrix(cube_2024, cube_2025):
+    """各城市一级业态业绩占比矩阵（城市×一级业态），分2024年、2025年和两年合计，另存按行单位化的矩阵供余弦相似度查询"""
+    amounts = {
+        year: cube_totals(cube, ['城市', '一级业态'])['业绩金额'].clip(lower=0).unstack(fill_value=0)
+        for year, cube in ((2024, cube_2024), (2025, cube_2025))
+    }
+    formats = amounts[2024].columns.union(amounts[2025].columns)
+    amounts = {year: matrix.reindex(columns=formats, fill_value=0) for year, matrix in amounts.items()}
+    amounts['两年合计'] = amounts[2024].add(amounts[2025], fill_value=0)
+
+    share_matrices = {}
+    for key, matrix in amounts.items():
+        matrix = matrix[matrix.sum(axis=1) > 0]
+        shares = matrix.div(matrix.sum(axis=1), axis=0)
+        values = shares.to_numpy(dtype='float64')
+        share_matrices[key] = {'shares': shares, 'unit': values / np.linalg.norm(values, axis=1, keepdims=True)}
+    return share_matrices
+
+
+def similar_cities(share_matrix, city, k):
+    """与指定城市一级业态结构最相似的k个城市及余弦相似度：一次矩阵乘得到与全部城市的相似度，argpartition取前k个"""
+    shares, unit = share_matrix['shares'], share_matrix['unit']
+    position = shares.index.get_loc(city)
+    similarity = unit @ unit[position]
+    similarity[position] = -np.inf
+    k = min(k, len(similarity) - 1)
+    if k <= 0:
+        return pd.Series(dtype='float64', name='相似度')
+    top = np.argpartition(-similarity, k - 1)[:k]
+    top = top[np.argsort(-similarity[top])]
+    return pd.Series(similarity[top], index=shares.index[top], name='相似度')
+
+
+# k均值聚类的初始化次数和最大迭代次数
+CITY_SEGMENT_INITS = 10
+CITY_SEGMENT_MAX_ITER = 100
+
+
+def compute_city_features(cube_2024, cube_2025):
+    """城市分群的特征矩阵：两年合计的一级业态占比、业绩平台占比，业绩规模（对数）和增长率（对数比）
+
+    每组特征中心化后缩放到总方差为1，选中的各组特征在距离中的权重相同
+    """
+    city_amounts = {year: cube_totals(cube, '城市')['业绩金额'] for year, cube in ((2024, cube_2024), (2025, cube_2025))}
+    total = city_amounts[2024].add(city_amounts[2025], fill_value=0)
+    cities = total.index
+    amount_2024 = city_amounts[2024].reindex(cities, fill_value=0).clip(lower=0).to_numpy()
+    amount_2025 = city_amounts[2025].reindex(cities, fill_value=0).clip(lower=0).to_numpy()
+
+    shares = {}
+    for name, dimension in (('一级业态占比', '一级业态'), ('业绩平台占比', '业绩平台')):
+        amounts = sum(
+            cube_totals(cube, ['城市', dimension])['业绩金额'].clip(lower=0).unstack(fill_value=0)
+            for cube in (cube_2024, cube_2025)
+        ).fillna(0).reindex(cities, fill_value=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares[name] = amounts.div(amounts.sum(axis=1), axis=0).fillna(0)
+
+    blocks = {
+        **{name: share.to_numpy(dtype='float64') for name, share in shares.items()},
+        '业绩规模': np.log1p(amount_2024 + amount_2025)[:, None],
+        '增长率': (np.log1p(amount_2025) - np.log1p(amount_2024))[:, None],
+    }
+    for name, block in blocks.items():
+        centered = block - block.mean(axis=0)
+        scale = np.sqrt(centered.var(axis=0).sum())
+        blocks[name] = centered / scale if scale > 0 else centered
+    return {'城市': cities, '总业绩': total.clip(lower=0).to_numpy(), '特征': blocks, '占比': shares}
+
+
+def kmeans_labels(features, k, seed=0):
+    """k-means++初始化的k均值聚类，返回各行所属簇的编号
+
+    点到各中心的平方距离用‖x‖²-2x·c+‖c‖²一次矩阵乘得到，新中心由独热矩阵乘特征矩阵得到；多次初始化取簇内平方和最小的结果
+    """
+    rng = np.random.default_rng(seed)
+    n = len(features)
+    k = min(k, n)
+    squared_norms = (features ** 2).sum(axis=1)
+    best_labels, best_inertia = np.zeros(n, dtype='int64'), np.inf
+    for _ in range(CITY_SEGMENT_INITS):
+        # k-means++：按到最近已选中心的平方距离成比例抽取下一个中心
+        centers = features[[rng.integers(n)]]
+        closest = ((features - centers[0]) ** 2).sum(axis=1)
+        for _ in range(1, k):
+            next_center = rng.choice(n, p=closest / closest.sum()) if closest.sum() > 0 else rng.integers(n)
+            centers = np.vstack([centers, features[next_center]])
+            closest = np.minimum(closest, ((features - features[next_center]) ** 2).sum(axis=1))
+
+        for _ in range(CITY_SEGMENT_MAX_ITER):
+            distances = squared_norms[:, None] - 2 * features @ centers.T + (centers ** 2).sum(axis=1)
+            labels = distances.argmin(axis=1)
+            counts = np.bincount(labels, minlength=k)
+            sums = np.eye(k)[labels].T @ features
+            # 空簇保留原中心
+            new_centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+            if np.allclose(new_centers, centers):
+                break
+            centers = new_centers
+
+        inertia = distances[np.arange(n), labels].sum()
+        if inertia < best_inertia:
+            best_labels, best_inertia = labels, inertia
+    return best_labels
+
+
+def segment_cities(city_features, k, feature_names):
+    """按选中的特征组对城市分群，分群按总业绩从高到低命名为分群1、分群2……，返回以城市为索引的分群Series"""
+    features = np.hstack([city_features['特征'][name] for name in feature_names])
+    names = [f'分群{i}' for i in range(1, k + 1)]
+    if len(features) == 0:
+        return pd.Series(pd.Categorical([], categories=names), index=city_features['城市'], name='城市分群')
+    labels = kmeans_labels(features, k)
+    order = np.argsort(-np.bincount(labels, weights=city_features['总业绩'], minlength=k), kind='stable')
+    rank = np.empty(k, dtype='int64')
+    rank[order] = np.arange(k)
+    return pd.Series(
+        pd.Categorical.from_codes(rank[labels], categories=names), index=city_features['城市'], name='城市分群'
+    )
+
+
+def compute_key_city_business(df_all, key_cities):
+    """重点城市一级业态结构变化：有2024年业绩的重点城市，以及按城市、年份、一级业态汇总的业绩金额"""
+    # 筛选重点城市且有业绩数据的记录（年份列在清洗时已写入）
+    df_key_cities = df_all[
+        (df_all['城市'].isin(key_cities)) &
+        (df_all['业绩金额'] > 0)
+    ]
+
+    # 筛选有2024年业绩数据的城市
+    cities_with_2024 = df_key_cities[df_key_cities['年份'] == 2024]['城市'].unique()
+
+    # 按城市、年份、一级业态分组，计算业绩金额总和
+    city_year_business = df_key_cities.groupby(['城市', '年份', '一级业态'])['业绩金额'].sum().reset_index()
+    city_year_business['业绩金额'] = amount_in_wan(city_year_business['业绩金额'])
+    return cities_with_2024, city_year_business
+
+
+def compute_client_summary(df):
+    """六.重点客户分析：客户业绩排名、客户与行业的对应关系、最重要客户及其行业、客户数"""
+    client_amounts = amount_in_wan(df.groupby('客户')['业绩金额'].sum())
+    top_client = client_amounts.idxmax()
+    return {
+        'client_totals': client_amounts.sort_values(ascending=False),
+        'industry_mapping': df.groupby('客户')['行业'].first().to_dict(),
+        'top_client': top_client,
+        'top_client_industry': df[df['客户'] == top_client]['行业'].iloc[0],
+        'client_count': len(df['客户'].unique()),
+    }
+
+
+# 客户留存状态，顺序即状态编码
+RETENTION_STATUSES = ['留存', '流失', '新增']
+
+
+def compute_client_retention(df_all):
+    """客户留存与流失：客户一次编码为整数，按两年的出现标记划分留存、流失、新增客户，并汇总业绩及行业、城市分布"""
+    client_codes, clients = pd.factorize(df_all['客户'])
+    valid = client_codes >= 0  # 客户为空的行不参与
+    client_codes = client_codes[valid]
+    is_2025 = (df_all['年份'].to_numpy() == 2025)[valid]
+    amounts = df_all['业绩金额'].to_numpy()[valid]
+    n_clients = len(clients)
+
+    # 每年的客户出现标记（位图）和客户业绩，均按客户编码直接索引
+    year_rows = {2024: ~is_2025, 2025: is_2025}
+    present = {year: np.bincount(client_codes[rows], minlength=n_clients) > 0 for year, rows in year_rows.items()}
+    client_sums = {
+        year: sum_amounts_by_code(client_codes[rows], amounts[rows], n_clients) for year, rows in year_rows.items()
+    }
+    client_amounts = {year: amount_in_wan(sums) for year, sums in client_sums.items()}
+    status = np.select([present[2024] & present[2025], present[2024]], [0, 1], default=2)
+
+    client_df = pd.DataFrame({
+        '客户': clients,
+        '状态': np.array(RETENTION_STATUSES)[status],
+        '2024年业绩': client_amounts[2024],
+        '2025年业绩': client_amounts[2025],
+    })
+    status_counts = np.bincount(status, minlength=len(RETENTION_STATUSES))
+    summary = pd.DataFrame({
+        '客户数': status_counts,
+        '2024年业绩': amount_in_wan(sum_amounts_by_code(status, client_sums[2024], len(RETENTION_STATUSES))),
+        '2025年业绩': amount_in_wan(sum_amounts_by_code(status, client_sums[2025], len(RETENTION_STATUSES))),
+    }, index=RETENTION_STATUSES)
+
+    breakdowns = {
+        dimension: retention_breakdown(
+            df_all[dimension], valid, client_codes, n_clients, year_rows, amounts
+        )
+        for dimension in ('行业', '城市')
+    }
+    return {'summary': summary, 'clients': client_df, 'breakdowns': breakdowns}
+
+
+def retention_breakdown(dimension_values, valid, client_codes, n_clients, year_rows, amounts):
+    """按维度拆分客户留存：维度值与客户编码组合成整数键，每个(维度, 客户)按其在两年中是否出现单独判定状态，
+    客户在某城市新增而在另一城市流失时分别计入；业绩按(维度, 状态)在整数上汇总"""
+    dimension_codes, dimension_labels = pd.factorize(dimension_values, use_na_sentinel=False)
+    dimension_codes = dimension_codes[valid]
+    n_cells = len(dimension_labels) * len(RETENTION_STATUSES)
+
+    # 同一维度下的客户只计一次：组合键去重，每行映射到所属组合
+    pairs, pair_index = np.unique(dimension_codes.astype('int64') * n_clients + client_codes, return_inverse=True)
+    present = {year: np.bincount(pair_index[rows], minlength=len(pairs)) > 0 for year, rows in year_rows.items()}
+    pair_status = np.select([present[2024] & present[2025], present[2024]], [0, 1], default=2)
+    pair_cells = (pairs // n_clients) * len(RETENTION_STATUSES) + pair_status
+    cells = pair_cells[pair_index]
+
+    counts = np.bincount(pair_cells, minlength=n_cells).reshape(-1, len(RETENTION_STATUSES))
+    year_amounts = {
+        year: amount_in_wan(sum_amounts_by_code(cells[rows], amounts[rows], n_cells)).reshape(-1, len(RETENTION_STATUSES))
+        for year, rows in year_rows.items()
+    }
+
+    breakdown = pd.DataFrame({
+        '留存客户数': counts[:, 0],
+        '流失客户数': counts[:, 1],
+        '新增客户数': counts[:, 2],
+        '留存客户2024年业绩': year_amounts[2024][:, 0],
+        '留存客户2025年业绩': year_amounts[2025][:, 0],
+        '流失业绩': year_amounts[2024][:, 1],
+        '新增业绩': year_amounts[2025][:, 2],
+    }, index=dimension_labels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        breakdown['客户留存率(%)'] = counts[:, 0] / (counts[:, 0] + counts[:, 1]) * 100
+    return breakdown.sort_values('流失业绩', ascending=False)
+
+
+def compute_client_pareto(client_retention):
+    """客户集中度：各年客户业绩降序排列一次并累计求和，之后任意占比查询都只在累计数组上二分查找"""
+    clients = client_retention['clients']
+    pareto = {}
+    for year, absent_status in ((2024, '新增'), (2025, '流失')):
+        amounts = clients.loc[clients['状态'] != absent_status, f'{year}年业绩'].to_numpy()
+        sorted_amounts = -np.sort(-amounts)
+        pareto[year] = {
+            'cumulative': np.cumsum(sorted_amounts),
+            # 冲减形成的负业绩排在最后，正业绩部分的累计值单调递增，可直接二分
+            'n_positive': int(np.count_nonzero(sorted_amounts > 0)),
+        }
+    return pareto
+
+
+def pareto_clients_for_share(year_pareto, share):
+    """贡献指定占比业绩所需的头部客户数"""
+    cumulative = year_pareto['cumulative']
+    if len(cumulative) == 0 or cumulative[-1] <= 0:
+        return 0
+    target = cumulative[-1] * share
+    return int(np.searchsorted(cumulative[:year_pareto['n_positive']], target, side='left')) + 1
+
+
+def pareto_top_share(year_pareto, client_fraction):
+    """头部指定比例客户的数量、业绩及其占全部业绩的比例"""
+    cumulative = year_pareto['cumulative']
+    if len(cumulative) == 0:
+        return 0, 0.0, 0.0
+    top_count = max(1, int(np.ceil(len(cumulative) * client_fraction)))
+    top_amount = float(cumulative[top_count - 1])
+    return top_count, top_amount, top_amount / cumulative[-1] if cumulative[-1] > 0 else 0.0
+
 # 加载数据
-df_2024 = load_data(file_2024, 2024)
-df_2025 = load_data(file_2025, 2025)
+profiler.begin('数据加载')
+session_store = get_session_store()
+if session_store.evicted_notice:
+    st.sidebar.info("服务器内存紧张，本会话空闲期间缓存的数据已被释放并重新加载，之前应用的增量修正需重新上传")
+    session_store.evicted_notice = False
+
+# 未上传文件的年份使用监控目录中最新的导出文件
+year_files = {2024: file_2024, 2025: file_2025}
+if WATCH_DIR and os.path.isdir(WATCH_DIR):
+    directory_watcher = get_directory_watcher(WATCH_DIR)
+    for year in year_files:
+        if year_files[year] is None:
+            year_files[year] = directory_watcher.latest_file(year)
+            exporting_files = directory_watcher.exporting_files(year)
+            if year_files[year] is None and exporting_files:
+                st.sidebar.info(f"{year}年导出文件“{exporting_files[0]}”正在写入，等待导出完成后刷新页面即可加载")
+    with st.sidebar.expander("📂 监控目录"):
+        st.caption(f"{WATCH_DIR}（每{WATCH_INTERVAL_SECONDS}秒扫描一次）")
+        watched_files = directory_watcher.stats()
+        if watched_files:
+            st.dataframe(pd.DataFrame(watched_files), use_container_width=True, hide_index=True)
+        else:
+            st.write("暂无可识别年份的CSV文件")
+
+dataset_2024, dataset_2025 = (
+    get_library_dataset(session_store, library_sources[year]) if library_sources[year] is not None
+    else get_year_dataset(session_store, file, year, dedup_columns)
+    for year, file in year_files.items()
+)
+
+# 应用增量修正
+if apply_delta_clicked:
+    delta_target = dataset_2024 if delta_year == 2024 else dataset_2025
+    if delta_target is None:
+        st.sidebar.warning(f"请先上传{delta_year}年数据，再应用增量修正")
+    else:
+        delta_df = load_data(delta_file, delta_year, dedup_columns=dedup_columns)
+        if delta_df is not None:
+            try:
+                with profiler.stage(f'{delta_year}年增量合并'):
+                    delta_start = time.perf_counter()
+                    replaced_count = apply_delta(delta_target, delta_df)
+                    delta_elapsed_ms = (time.perf_counter() - delta_start) * 1000
+            except ValueError as e:
+                st.sidebar.error(f"增量修正未应用：{e}")
+            else:
+                delta_target['delta_key'] = hashlib.blake2b(
+                    repr((delta_target['delta_key'], delta_file.getvalue(), dedup_columns)).encode(), digest_size=16
+                ).hexdigest()
+                delta_target['applied_deltas'].append({
+                    '文件': delta_file.name,
+                    '修正行数': len(delta_df),
+                    '替换原有行数': replaced_count,
+                    '合并耗时(ms)': round(delta_elapsed_ms, 1),
+                })
+                st.sidebar.success(f"已合并{len(delta_df)}行修正数据（替换原有{replaced_count}行），耗时{delta_elapsed_ms:.1f}ms")
+
+# 保存到数据集库 / 从数据集库删除
+if library_save_clicked:
+    save_target = dataset_2024 if library_save_year == 2024 else dataset_2025
+    if save_target is None:
+        st.sidebar.warning(f"请先上传{library_save_year}年数据，再保存到数据集库")
+    else:
+        with profiler.stage(f'{library_save_year}年保存到数据集库'):
+            saved_meta = save_library_dataset(library_save_name, library_save_year, save_target)
+        st.sidebar.success(f"已保存“{saved_meta['名称']}”（{saved_meta['行数']}行），下次可在“{library_save_year}年数据来源”中选用")
+if library_delete_clicked:
+    delete_library_dataset(library_delete_options[library_delete_label])
+    st.sidebar.success(f"已删除“{library_delete_label}”")
+
+df_2024 = dataset_2024['df'] if dataset_2024 is not None else None
+df_2025 = dataset_2025['df'] if dataset_2025 is not None else None
+section_graph = None
 
 if df_2024 is not None and df_2025 is not None:
+    cube_2024 = dataset_2024['cube']
+    cube_2025 = dataset_2025['cube']
+    quality_ledger = {2024: dataset_2024['quality'], 2025: dataset_2025['quality']}
+
+    # 派生中间结果随数据内容、已应用的修正和客户名称归一设置变化，放在进程级共享缓存中，
+    # 查看同一对文件的会话共用一份合并明细和自助法区间；内存紧张时可被淘汰后重新计算
+    derived_version = (
+        dataset_2024['content_key'], dataset_2024['delta_key'],
+        dataset_2025['content_key'], dataset_2025['delta_key'],
+        client_name_settings,
+    )
+
+    # 客户名称归一：两年的名称一起归一，保证同一客户在两年中取相同的标准名称
+    client_names = None
+    if client_name_settings is not None:
+        with profiler.stage('客户名称归一'):
+            client_names = shared_derived_value(
+                '客户名称归一', derived_version,
+                lambda: build_client_canonical(
+                    pd.concat([df_2024['客户'], df_2025['客户']], ignore_index=True), client_name_settings
+                )
+            )
+        df_2024 = df_2024.assign(客户=client_names[0].array[:len(df_2024)])
+        df_2025 = df_2025.assign(客户=client_names[0].array[len(df_2024):])
+
     # 合并数据
-    df_all = pd.concat([df_2024, df_2025], ignore_index=True)
+    df_all = shared_derived_value(
+        'df_all', derived_version, lambda: concat_detail_frames([df_2024, df_2025])
+    )
+
+    # 城市分群：特征矩阵随数据版本共享缓存，分群结果取决于本会话的分群设置，缓存在会话中；
+    # 分群作为与城市、行业并列的汇总维度（由立方体按城市汇总再归入分群），不另加明细列
+    city_segments = None
+    key_city_list = list(KEY_CITIES)
+    if city_segment_settings is not None:
+        with profiler.stage('城市分群'):
+            city_features = shared_derived_value(
+                '城市特征矩阵', derived_version, lambda: compute_city_features(cube_2024, cube_2025)
+            )
+            city_segments = session_store.derived_value(
+                '城市分群', (derived_version, city_segment_settings),
+                lambda: segment_cities(city_features, *city_segment_settings)
+            )
+        if key_city_source != '固定名单':
+            segment_cities_total = city_features['总业绩'][(city_segments == key_city_source).to_numpy()]
+            key_city_list = list(city_segments.index[(city_segments == key_city_source).to_numpy()][
+                np.argsort(-segment_cities_total, kind='stable')
+            ])
+
+    # 板块计算组成任务图提交到后台线程池，与概览、核心分析等前面板块的渲染同时计算：
+    # 各维度汇总只依赖聚合立方体，三、五依赖对应维度的汇总，重点城市业态结构和六直接读取明细
+    section_graph = SectionTaskGraph(get_section_executor())
+    for dimension in ('城市', '一级业态', '业绩平台', '行业'):
+        section_graph.add(f'{dimension}汇总', compute_year_totals, cube_2024, cube_2025, dimension)
+    if city_segments is not None:
+        section_graph.add('城市分群汇总', compute_year_totals, cube_2024, cube_2025, '城市分群', city_segments)
+    section_graph.add('三.项目质量下降分析', compute_project_quality, deps=('城市汇总',))
+    section_graph.add('城市业绩排名变化', compute_city_ranking, deps=('城市汇总',))
+    # 自助法重抽样耗时较长，结果随数据版本放在共享缓存中，各会话和筛选等交互重跑时不再重算
+    section_graph.add(
+        '城市变化置信区间', shared_derived_value,
+        '城市变化置信区间', derived_version, lambda: compute_city_bootstrap(df_all)
+    )
+    project_band_edges = parse_project_band_edges(
+        st.session_state.get('project_band_edges', ','.join(f'{edge:g}' for edge in PROJECT_BAND_EDGES))
+    ) or tuple(PROJECT_BAND_EDGES)
+    section_graph.add('项目规模分档', compute_project_bands, df_all, project_band_edges)
+    quantile_sketches = {2024: dataset_2024['sketch'], 2025: dataset_2025['sketch']}
+    section_graph.add('城市项目业绩分位数', compute_city_value_quantiles, quantile_sketches)
+    # 五的分析维度：行业，启用城市分群时可切换为按分群汇总
+    industry_dimension = st.session_state.get('industry_dimension', '行业') if city_segments is not None else '行业'
+    section_graph.add(
+        '五.行业业绩分析', compute_industry_pivot, industry_dimension, deps=(f'{industry_dimension}汇总',)
+    )
+    section_graph.add(
+        '重点城市一级业态结构变化', compute_key_city_business,
+        df_all, key_city_list
+    )
+    section_graph.add('城市业态结构矩阵', compute_format_share_matrix, cube_2024, cube_2025)
+    client_year_filter = st.session_state.get('client_year_filter', 2024)
+    section_graph.add(
+        '六.重点客户分析', compute_client_summary, {2024: df_2024, 2025: df_2025, "全部": df_all}[client_year_filter]
+    )
+    section_graph.add('客户留存与流失', compute_client_retention, df_all)
+    section_graph.add('客户集中度', compute_client_pareto, deps=('客户留存与流失',))
     
+    profiler.begin('数据概览')
     # 数据概览
     st.header("数据概览")
     col1, col2, col3, col4,col5,col6 = st.columns(6)
     
     with col1:
-        total_2024 = df_2024['业绩金额'].sum()
+        total_2024 = amount_in_wan(df_2024['业绩金额'].sum())
         st.metric("2024年总业绩", f"{total_2024:.0f}万元")
     
     with col2:
-        total_2025 = df_2025['业绩金额'].sum()
+        total_2025 = amount_in_wan(df_2025['业绩金额'].sum())
         st.metric("2025年总业绩", f"{total_2025:.0f}万元")   
     with col3:
         growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
@@ -92,7 +2521,50 @@ if df_2024 is not None and df_2025 is not None:
     with col6:
         project_count = len(df_2024) + len(df_2025)
         st.metric("总项目数", f"{project_count}")
+
+    # 数据质量台账：各年份清洗时剔除的行数及样本
+    with st.expander("🧾 数据质量台账", expanded=False):
+        ledger_summary = pd.DataFrame({
+            f"{year}年": {
+                '读取行数': ledger['读取行数'],
+                **ledger['剔除行数'],
+                '保留行数': ledger['保留行数'],
+            }
+            for year, ledger in quality_ledger.items()
+        })
+        st.dataframe(ledger_summary, use_container_width=True)
+
+        for year, ledger in quality_ledger.items():
+            for reason, sample in ledger['剔除样本'].items():
+                st.write(f"**{year}年 - {reason}（共{ledger['剔除行数'][reason]}行，展示前{len(sample)}行）:**")
+                st.dataframe(sample, use_container_width=True, hide_index=True)
+
+        # 跨年度重复：两个年度文件中行指纹相同的项目
+        cross_year_mask = shared_derived_value(
+            'cross_year_mask', derived_version, lambda: df_2025['行指纹'].isin(df_2024['行指纹'])
+        )
+        cross_year_count = int(cross_year_mask.sum())
+        if cross_year_count > 0:
+            cross_year_rows = df_2025[cross_year_mask]
+            st.warning(
+                f"发现{cross_year_count}个项目同时出现在2024年和2025年数据中"
+                f"（去重键列：{dedup_description(dedup_columns)}），涉及2025年业绩{amount_in_wan(cross_year_rows['业绩金额'].sum()):,.0f}万元"
+            )
+            st.dataframe(
+                cross_year_rows.drop(columns=['行指纹']).head(QUALITY_SAMPLE_SIZE)
+                .assign(业绩金额=lambda rows: amount_in_wan(rows['业绩金额'])),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.write("未发现跨年度重复项目")
+
+        for year, dataset in ((2024, dataset_2024), (2025, dataset_2025)):
+            if dataset['applied_deltas']:
+                st.write(f"**{year}年已应用的增量修正:**")
+                st.dataframe(pd.DataFrame(dataset['applied_deltas']), use_container_width=True, hide_index=True)
     
+    profiler.begin('核心分析')
     # 主要分析
     st.header("核心分析")
     # 1. 年度业绩对比
@@ -102,8 +2574,8 @@ if df_2024 is not None and df_2025 is not None:
         st.subheader("年度业绩对比")
         # 重新计算年度数据，确保准确性
         yearly_performance = []
-        yearly_performance.append({'年份': 2024, '总业绩': df_2024['业绩金额'].sum(), '项目数量': len(df_2024)})
-        yearly_performance.append({'年份': 2025, '总业绩': df_2025['业绩金额'].sum(), '项目数量': len(df_2025)})
+        yearly_performance.append({'年份': 2024, '总业绩': amount_in_wan(df_2024['业绩金额'].sum()), '项目数量': len(df_2024)})
+        yearly_performance.append({'年份': 2025, '总业绩': amount_in_wan(df_2025['业绩金额'].sum()), '项目数量': len(df_2025)})
         yearly_data = pd.DataFrame(yearly_performance)
         yearly_data['年份'] = yearly_data['年份'].astype(str)
         fig1 = px.bar(yearly_data, x='年份', y='总业绩', 
@@ -139,7 +2611,7 @@ if df_2024 is not None and df_2025 is not None:
         )
         # fig1.update_layout(yaxis=dict(tickfont=dict(color='#1B4965', size=12)))
         
-        st.plotly_chart(fig1, use_container_width=True)
+        render_chart(fig1)
         
         # 分析结果
         st.info(f"**业绩分析**：{'增长' if growth_rate > 0 else '下降'}{abs(growth_rate):.1f}%，总业绩差额{abs(total_2025-total_2024):.0f}万元")
@@ -175,3163 +2647,3448 @@ if df_2024 is not None and df_2025 is not None:
         
         font=dict(color='#1B4965', size=12)  # 深色图例文字
         ))
-        st.plotly_chart(fig2, use_container_width=True)
+        render_chart(fig2)
         
         # 分析结果
         project_change = len(df_2025) - len(df_2024)
         st.info(f"**项目分析**：项目数量{'增加' if project_change > 0 else '减少'}{abs(project_change)}个，平均项目业绩2024年{total_2024/len(df_2024):.1f}万元，2025年{total_2025/len(df_2025):.1f}万元")
     
-    # 主要内容布局
-    st.header("一.什么主要推动了总业绩的上升？")
+    def render_platform_section():
+        """一.业绩平台分析"""
+        profiler.begin('一.业绩平台分析')
+        # 主要内容布局
+        st.header("一.什么主要推动了总业绩的上升？")
     
 
-    col1, col2 = st.columns([3, 2])
+        col1, col2 = st.columns([3, 2])
 
-    with col1:
-        st.subheader("1.业绩平台年度对比")
-        
-        # 准备绘图数据
-        pivot_data = df_all.pivot_table(
-            values='业绩金额', 
-            index='年份', 
-            columns='业绩平台', 
-            aggfunc='sum',
-            fill_value=0
-        )
+        with col1:
+            st.subheader("1.业绩平台年度对比")
         
-        # 计算百分比
-        pivot_percentage = pivot_data.div(pivot_data.sum(axis=1), axis=0) * 100
+            # 准备绘图数据
+            platform_totals = section_graph.result('业绩平台汇总')
+            pivot_data = pd.DataFrame({
+                2024: platform_totals[2024]['业绩金额'],
+                2025: platform_totals[2025]['业绩金额'],
+            }).fillna(0).T
+            pivot_data.index.name = '年份'
+            pivot_data.columns.name = '业绩平台'
         
-        # 创建堆叠柱状图
-        fig = go.Figure()
+            # 计算百分比
+            pivot_percentage = pivot_data.div(pivot_data.sum(axis=1), axis=0) * 100
         
-        # 定义简洁的颜色方案（与城市集中度分析保持一致）
-        colors = ['#8B2635','#2E5984','#1E7E34','#7B68A6']
+            # 创建堆叠柱状图
+            fig = go.Figure()
         
-        # 为每个业绩平台添加数据
-        for i, platform in enumerate(pivot_data.columns):
-            fig.add_trace(go.Bar(
-                name=platform,
-                x=pivot_data.index,
-                y=pivot_data[platform],
-                marker_color=colors[i % len(colors)],
+            # 定义简洁的颜色方案（与城市集中度分析保持一致）
+            colors = ['#8B2635','#2E5984','#1E7E34','#7B68A6']
+        
+            # 为每个业绩平台添加数据
+            for i, platform in enumerate(pivot_data.columns):
+                fig.add_trace(go.Bar(
+                    name=platform,
+                    x=pivot_data.index,
+                    y=pivot_data[platform],
+                    marker_color=colors[i % len(colors)],
                 
-                customdata=[pivot_percentage.loc[year, platform] 
-                        for year in pivot_data.index]
-            ))
+                    customdata=[pivot_percentage.loc[year, platform] 
+                            for year in pivot_data.index]
+                ))
         
-        # 更新图表布局
-        fig.update_layout(
-            barmode='stack',
-            title='业绩平台年度业绩对比',
-            xaxis_title='年份',
-            yaxis_title='业绩金额 (万元)',
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                font=dict(color='#1B4965', size=12)  # 图例字体颜色
-            ),
-            height=635,
-            showlegend=True,
-            # 设置背景颜色和字体样式（参考代码的样式）
-            plot_bgcolor='#E3EAF3',  # 图表背景色
-            paper_bgcolor='#E3EAF3',  # 整体背景色
-            font=dict(color='#1B4965', size=12),  # 全局字体颜色
-            title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
-            # 设置x轴样式，确保只显示2024和2025
-            xaxis=dict(
-                tickmode='array', 
-                tickvals=[2024, 2025],  # 明确指定x轴刻度值
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14)
-            ),
-            # 设置y轴样式
-            yaxis=dict(
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14),
-                gridcolor='#F6F8FA',  # 浅白色网格线
-                zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+            # 更新图表布局
+            fig.update_layout(
+                barmode='stack',
+                title='业绩平台年度业绩对比',
+                xaxis_title='年份',
+                yaxis_title='业绩金额 (万元)',
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=1.02,
+                    xanchor="right",
+                    x=1,
+                    font=dict(color='#1B4965', size=12)  # 图例字体颜色
+                ),
+                height=635,
+                showlegend=True,
+                # 设置背景颜色和字体样式（参考代码的样式）
+                plot_bgcolor='#E3EAF3',  # 图表背景色
+                paper_bgcolor='#E3EAF3',  # 整体背景色
+                font=dict(color='#1B4965', size=12),  # 全局字体颜色
+                title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
+                # 设置x轴样式，确保只显示2024和2025
+                xaxis=dict(
+                    tickmode='array', 
+                    tickvals=[2024, 2025],  # 明确指定x轴刻度值
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14)
+                ),
+                # 设置y轴样式
+                yaxis=dict(
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14),
+                    gridcolor='#F6F8FA',  # 浅白色网格线
+                    zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+                )
             )
-        )
         
-        # 添加总计标签
-        total_2024 = pivot_data.loc[2024].sum()
-        total_2025 = pivot_data.loc[2025].sum()
+            # 添加总计标签
+            total_2024 = pivot_data.loc[2024].sum()
+            total_2025 = pivot_data.loc[2025].sum()
         
-        fig.add_annotation(
-            x=2024, y=total_2024,
-            text=f"总计: {total_2024:.1f}万",
-            showarrow=False,
-            yshift=20,
-            font=dict(size=12, color='#1B4965')  # 标注字体颜色
-        )
+            fig.add_annotation(
+                x=2024, y=total_2024,
+                text=f"总计: {total_2024:.1f}万",
+                showarrow=False,
+                yshift=20,
+                font=dict(size=12, color='#1B4965')  # 标注字体颜色
+            )
         
-        fig.add_annotation(
-            x=2025, y=total_2025,
-            text=f"总计: {total_2025:.1f}万",
-            showarrow=False,
-            yshift=20,
-            font=dict(size=12, color='#1B4965')  # 标注字体颜色
-        )
+            fig.add_annotation(
+                x=2025, y=total_2025,
+                text=f"总计: {total_2025:.1f}万",
+                showarrow=False,
+                yshift=20,
+                font=dict(size=12, color='#1B4965')  # 标注字体颜色
+            )
         
-        st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig)
 
-    with col2:
-        st.subheader("数据分析报告")
-        
-        # 计算增长数据
-        growth_data = []
-        for platform in pivot_data.columns:
-            value_2024 = pivot_data.loc[2024, platform]
-            value_2025 = pivot_data.loc[2025, platform]
-            growth = value_2025 - value_2024
-            growth_rate = (growth / value_2024 * 100) if value_2024 > 0 else 0
+        with col2:
+            st.subheader("数据分析报告")
+        
+            # 计算增长数据
+            growth_data = []
+            for platform in pivot_data.columns:
+                value_2024 = pivot_data.loc[2024, platform]
+                value_2025 = pivot_data.loc[2025, platform]
+                growth = value_2025 - value_2024
+                growth_rate = (growth / value_2024 * 100) if value_2024 > 0 else 0
             
-            growth_data.append({
-                '业绩平台': platform,
-                '2024年业绩': value_2024,
-                '2025年业绩': value_2025,
-                '增长量': growth,
-                '增长率': growth_rate
-            })
+                growth_data.append({
+                    '业绩平台': platform,
+                    '2024年业绩': value_2024,
+                    '2025年业绩': value_2025,
+                    '增长量': growth,
+                    '增长率': growth_rate
+                })
         
-        growth_df = pd.DataFrame(growth_data)
-        growth_df = growth_df.sort_values('增长量', ascending=False)
+            growth_df = pd.DataFrame(growth_data)
+            growth_df = growth_df.sort_values('增长量', ascending=False)
         
-        # 总体增长分析
-        total_growth = total_2025 - total_2024
-        total_growth_rate = (total_growth / total_2024) * 100
+            # 总体增长分析
+            total_growth = total_2025 - total_2024
+            total_growth_rate = (total_growth / total_2024) * 100
         
         
-        # 重点发现
-        best_performer = growth_df.iloc[0]
-        st.markdown("#### 重点发现")
-        st.success(f"""
-        **最大贡献平台：{best_performer['业绩平台']}**
-        - 贡献了 {(best_performer['增长量']/total_growth)*100:.1f}% 的总增长
-        - 增长量达到 {best_performer['增长量']:.1f}万元
-        - 增长率为 {best_performer['增长率']:.1f}%
-        """)
-        # 各平台增长分析
-        st.markdown("#### 各平台增长分析")
+            # 重点发现
+            best_performer = growth_df.iloc[0]
+            st.markdown("#### 重点发现")
+            st.success(f"""
+            **最大贡献平台：{best_performer['业绩平台']}**
+            - 贡献了 {(best_performer['增长量']/total_growth)*100:.1f}% 的总增长
+            - 增长量达到 {best_performer['增长量']:.1f}万元
+            - 增长率为 {best_performer['增长率']:.1f}%
+            """)
+            # 各平台增长分析
+            st.markdown("#### 各平台增长分析")
     
-        # 创建2x2网格布局
-        col1, col2 = st.columns(2)
+            # 创建2x2网格布局
+            col1, col2 = st.columns(2)
         
-        for i, row in growth_df.iterrows():
-            contribution = (row['增长量'] / total_growth) * 100 if total_growth > 0 else 0
-            
-            if row['增长率'] > 0:
-                growth_emoji = "📈"
-                growth_color = "green"
-            else:
-                growth_emoji = "📉"
-                growth_color = "red"
+            for i, row in growth_df.iterrows():
+                contribution = (row['增长量'] / total_growth) * 100 if total_growth > 0 else 0
             
-            # 根据索引决定显示在哪一列
-            if i % 2 == 0:
-                with col1:
-                    st.markdown(f"""
-                    **{growth_emoji} {row['业绩平台']}**
-                    - 增长量: {row['增长量']:.1f}万元
-                    - 增长率: {row['增长率']:.1f}%
-                    - 贡献度: {contribution:.1f}%
-                    """)
-            else:
-                with col2:
-                    st.markdown(f"""
-                    **{growth_emoji} {row['业绩平台']}**
-                    - 增长量: {row['增长量']:.1f}万元
-                    - 增长率: {row['增长率']:.1f}%
-                    - 贡献度: {contribution:.1f}%
-                    """)
+                if row['增长率'] > 0:
+                    growth_emoji = "📈"
+                    growth_color = "green"
+                else:
+                    growth_emoji = "📉"
+                    growth_color = "red"
+            
+                # 根据索引决定显示在哪一列
+                if i % 2 == 0:
+                    with col1:
+                        st.markdown(f"""
+                        **{growth_emoji} {row['业绩平台']}**
+                        - 增长量: {row['增长量']:.1f}万元
+                        - 增长率: {row['增长率']:.1f}%
+                        - 贡献度: {contribution:.1f}%
+                        """)
+                else:
+                    with col2:
+                        st.markdown(f"""
+                        **{growth_emoji} {row['业绩平台']}**
+                        - 增长量: {row['增长量']:.1f}万元
+                        - 增长率: {row['增长率']:.1f}%
+                        - 贡献度: {contribution:.1f}%
+                        """)
     
     
     
-    df_all = pd.concat([df_2024, df_2025], ignore_index=True)
-    # 城市业绩增长分析
-
-
-    # 城市业绩增长分析
-    # 城市业绩增长分析
-    st.subheader("2.1城市业绩增长分析")
-
-    # 计算各城市24年和25年的业绩
-    city_2024 = df_2024.groupby('城市')['业绩金额'].sum()
-    city_2025 = df_2025.groupby('城市')['业绩金额'].sum()
-
-    # 获取所有城市（包括只在一年出现的）
-    all_cities = city_2024.index.union(city_2025.index)
-
-    # 创建完整的数据框，缺失值填充为0
-    city_2024_full = city_2024.reindex(all_cities, fill_value=0)
-    city_2025_full = city_2025.reindex(all_cities, fill_value=0)
-
-    # 计算增长值
-    city_growth = city_2025_full - city_2024_full
-    city_growth = city_growth.sort_values(ascending=False)
-
-    # 设置阈值，使用绝对值的中位数或固定值
-    threshold = max(city_growth.abs().median(), 500)  # 至少50000的阈值
-    large_growth = city_growth[city_growth.abs() >= threshold]
-    small_growth = city_growth[city_growth.abs() < threshold]
-
-    # 图表1：较大的增长值
-    if len(large_growth) > 0:
-        fig1 = px.bar(
-            x=large_growth.index.tolist(),
-            y=large_growth.values.tolist(),
-            title="主要城市业绩增长情况(业绩增长/减少绝对值>=500万元)",
-            labels={'x': '城市', 'y': '增长金额'},
-            color=large_growth.values.tolist(),
-            color_continuous_scale='RdYlGn'
-        )
-        fig1.update_layout(height=400, showlegend=False)
-        st.plotly_chart(fig1, use_container_width=True)
-
-    # 图表2：较小的增长值
-    if len(small_growth) > 0:
-        fig2 = px.bar(
-            x=small_growth.index.tolist(),
-            y=small_growth.values.tolist(),
-            title="其他城市业绩增长情况(业绩增长/减少绝对值<500万元)",
-            labels={'x': '城市', 'y': '增长金额'},
-            color=small_growth.values.tolist(),
-            color_continuous_scale='RdYlGn'
-        )
-        fig2.update_layout(height=400, showlegend=False)
-        st.plotly_chart(fig2, use_container_width=True)
+        # 城市业绩增长分析
+
+
+    def render_city_growth_section():
+        """二.城市业绩增长分析（2.1、2.2）"""
+        # 城市业绩增长分析
+        # 城市业绩增长分析
+        profiler.begin('2.1城市业绩增长分析')
+        st.subheader("2.1城市业绩增长分析")
+
+        # 计算各城市24年和25年的业绩及增长值（结果缓存，拖动阈值滑块时不重新分组原始数据）
+        city_2024_full, city_2025_full, city_growth, growth_by_abs, growth_abs_sorted = compute_city_growth(cube_2024, cube_2025)
+
+        # 默认阈值：绝对值的中位数或固定值
+        default_threshold = float(max(city_growth.abs().median(), 500)) if len(city_growth) > 0 else 500.0  # 至少500万元的阈值
+        max_threshold = float(max(growth_abs_sorted[-1], default_threshold)) if len(growth_abs_sorted) > 0 else default_threshold
+
+        @st.fragment
+        def render_city_growth_charts():
+            # 阈值滑块只触发本片段重跑：二分查找分割点后重新切片并绘制两张图
+            threshold = st.slider(
+                "主要城市增长阈值（万元）",
+                min_value=0.0,
+                max_value=max_threshold,
+                value=default_threshold,
+                step=10.0,
+                key='city_growth_threshold'
+            )
+            split = int(np.searchsorted(growth_abs_sorted, threshold, side='left'))
+            large_growth = growth_by_abs.iloc[split:].sort_values(ascending=False)
+            small_growth = growth_by_abs.iloc[:split].sort_values(ascending=False)
+
+            # 城市过多时只绘制增长绝对值最大的前N个城市，其余合并为“其他（N项）”
+            large_growth_display = fold_long_tail(large_growth, chart_top_n['city_growth_large'], by_abs=True)
+            small_growth_display = fold_long_tail(small_growth, chart_top_n['city_growth_small'], by_abs=True)
+
+            # 图表1：较大的增长值
+            if len(large_growth) > 0:
+                fig1 = px.bar(
+                    x=large_growth_display.index.tolist(),
+                    y=large_growth_display.values.tolist(),
+                    title=f"主要城市业绩增长情况(业绩增长/减少绝对值>={threshold:,.0f}万元)",
+                    labels={'x': '城市', 'y': '增长金额'},
+                    color=large_growth_display.values.tolist(),
+                    color_continuous_scale='RdYlGn'
+                )
+                fig1.update_layout(height=400, showlegend=False)
+                render_chart(fig1)
+
+            # 图表2：较小的增长值
+            if len(small_growth) > 0:
+                fig2 = px.bar(
+                    x=small_growth_display.index.tolist(),
+                    y=small_growth_display.values.tolist(),
+                    title=f"其他城市业绩增长情况(业绩增长/减少绝对值<{threshold:,.0f}万元)",
+                    labels={'x': '城市', 'y': '增长金额'},
+                    color=small_growth_display.values.tolist(),
+                    color_continuous_scale='RdYlGn'
+                )
+                fig2.update_layout(height=400, showlegend=False)
+                render_chart(fig2)
+
+            # 完整城市列表按需加载
+            if st.checkbox("显示全部城市增长明细", key='show_full_city_growth'):
+                st.dataframe(
+                    city_growth.rename('增长金额').reset_index(),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
-    # 显示数据表
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.write("**增长最多的城市:**")
-        top_growth = city_growth.head(5)
-        for city, growth in top_growth.items():
-            st.write(f"{city}: {growth:,.0f}")
+        render_city_growth_charts()
 
-    with col2:
-        st.write("**新增业绩城市:**")
-        new_cities = city_growth[(city_2024_full == 0) & (city_2025_full > 0)]
-        for city, growth in new_cities.head(5).items():
-            st.write(f"{city}: {growth:,.0f}")
+        # 显示数据表
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.write("**增长最多的城市:**")
+            top_growth = city_growth.head(5)
+            for city, growth in top_growth.items():
+                st.write(f"{city}: {growth:,.0f}")
 
-    with col3:
-        st.write("**业绩归零城市:**")
-        zero_cities = city_growth[(city_2024_full > 0) & (city_2025_full == 0)]
-        for city, growth in zero_cities.tail(5).items():
-            st.write(f"{city}: {growth:,.0f}")
+        with col2:
+            st.write("**新增业绩城市:**")
+            new_cities = city_growth[(city_2024_full == 0) & (city_2025_full > 0)]
+            for city, growth in new_cities.head(5).items():
+                st.write(f"{city}: {growth:,.0f}")
+
+        with col3:
+            st.write("**业绩归零城市:**")
+            zero_cities = city_growth[(city_2024_full > 0) & (city_2025_full == 0)]
+            for city, growth in zero_cities.tail(5).items():
+                st.write(f"{city}: {growth:,.0f}")
+
+        # 启用城市分群时，按分群汇总城市的业绩增长
+        if city_segments is not None:
+            with profiler.stage('等待后台计算'):
+                segment_totals = section_graph.result('城市分群汇总')
+            segment_growth = segment_totals[2025]['业绩金额'].sub(segment_totals[2024]['业绩金额'], fill_value=0)
+            fig_segment_growth = go.Figure(go.Bar(
+                x=segment_growth.index.astype(str),
+                y=segment_growth.to_numpy(),
+                marker_color=['#8B2635' if value >= 0 else '#1E7E34' for value in segment_growth],
+                text=[f'{value:,.0f}' for value in segment_growth],
+                textposition='outside',
+                showlegend=False
+            ))
+            fig_segment_growth.update_layout(
+                title="各城市分群业绩增长情况",
+                xaxis_title="城市分群",
+                yaxis_title="增长金额",
+                height=400,
+                plot_bgcolor='#E3EAF3',
+                paper_bgcolor='#E3EAF3',
+                font=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=16),
+                yaxis=dict(gridcolor='#F6F8FA', zerolinecolor='#F6F8FA')
+            )
+            render_chart(fig_segment_growth)
     
 
-    # 重点城市业绩增长分析
-    st.subheader("2.2重点城市业绩增长分析")
+        profiler.begin('2.2重点城市业绩增长分析')
+        # 重点城市业绩增长分析
+        st.subheader("2.2重点城市业绩增长分析")
 
-    # 重点城市列表
-    key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+        # 重点城市列表
+        key_cities = key_city_list
 
-    # 筛选重点城市数据
-    key_cities_data = []
-    no_data_cities = []
+        # 筛选重点城市数据
+        key_cities_data = []
+        no_data_cities = []
 
-    for city in key_cities:
-        if city in city_growth.index:
-            key_cities_data.append({'城市': city, '增长额': city_growth[city]})
-        else:
-            no_data_cities.append(city)
+        for city in key_cities:
+            if city in city_growth.index:
+                key_cities_data.append({'城市': city, '增长额': city_growth[city]})
+            else:
+                no_data_cities.append(city)
 
-    # 显示无数据的城市
-    if no_data_cities:
-        st.write(f"**上半年无业绩数据的重点城市:** {', '.join(no_data_cities)}")
+        # 显示无数据的城市
+        if no_data_cities:
+            st.write(f"**上半年无业绩数据的重点城市:** {', '.join(no_data_cities)}")
 
-    # 创建重点城市图表
-    if key_cities_data:
-        key_cities_df = pd.DataFrame(key_cities_data)
-        key_cities_df = key_cities_df.sort_values('增长额', ascending=False)
+        # 创建重点城市图表
+        if key_cities_data:
+            key_cities_df = pd.DataFrame(key_cities_data)
+            key_cities_df = key_cities_df.sort_values('增长额', ascending=False)
         
-        # 计算平均增长额
-        avg_growth = key_cities_df['增长额'].mean()
+            # 计算平均增长额
+            avg_growth = key_cities_df['增长额'].mean()
         
-        # 根据增长额正负设置颜色
-        colors = []
-        for value in key_cities_df['增长额']:
-            if value >= 0:
-                colors.append('#8B2635')  # 正增长用红色（与背景色搭配的深红色）
-            else:
-                colors.append('#1E7E34')  # 负增长用绿色（与背景色搭配的深绿色）
+            # 根据增长额正负设置颜色
+            colors = []
+            for value in key_cities_df['增长额']:
+                if value >= 0:
+                    colors.append('#8B2635')  # 正增长用红色（与背景色搭配的深红色）
+                else:
+                    colors.append('#1E7E34')  # 负增长用绿色（与背景色搭配的深绿色）
         
-        # 创建图表
-        fig3 = go.Figure()
+            # 创建图表
+            fig3 = go.Figure()
         
-        # 添加柱状图
-        fig3.add_trace(go.Bar(
-            x=key_cities_df['城市'].tolist(),
-            y=key_cities_df['增长额'].tolist(),
-            marker_color=colors,
-            showlegend=False
-        ))
+            # 添加柱状图
+            fig3.add_trace(go.Bar(
+                x=key_cities_df['城市'].tolist(),
+                y=key_cities_df['增长额'].tolist(),
+                marker_color=colors,
+                showlegend=False
+            ))
         
-        # 添加平均线
-        fig3.add_hline(
-            y=avg_growth, 
-            line_dash="dash", 
-            line_color="rgba(0,0,0,0.6)",  # 与背景色搭配的棕色线条
-            line_width=2,
-            annotation_text=f"平均增长额: {avg_growth:,.0f}",
-            annotation_position="top left",
-            annotation_font=dict(color='#1B4965', size=12)
-        )
+            # 添加平均线
+            fig3.add_hline(
+                y=avg_growth, 
+                line_dash="dash", 
+                line_color="rgba(0,0,0,0.6)",  # 与背景色搭配的棕色线条
+                line_width=2,
+                annotation_text=f"平均增长额: {avg_growth:,.0f}",
+                annotation_position="top left",
+                annotation_font=dict(color='#1B4965', size=12)
+            )
         
-        # 更新图表布局（延续参考代码的配色）
-        fig3.update_layout(
-            title="重点城市业绩增长情况",
-            xaxis_title="城市",
-            yaxis_title="增长金额",
-            height=400,
-            showlegend=False,
-            # 使用参考代码的背景和字体配色
-            plot_bgcolor='#E3EAF3',  # 图表背景色
-            paper_bgcolor='#E3EAF3',  # 整体背景色
-            font=dict(color='#1B4965', size=12),  # 全局字体颜色
-            title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
-            xaxis=dict(
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14)
-            ),
-            yaxis=dict(
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14),
-                gridcolor='#F6F8FA',  # 浅白色网格线
-                zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+            # 更新图表布局（延续参考代码的配色）
+            fig3.update_layout(
+                title="重点城市业绩增长情况",
+                xaxis_title="城市",
+                yaxis_title="增长金额",
+                height=400,
+                showlegend=False,
+                # 使用参考代码的背景和字体配色
+                plot_bgcolor='#E3EAF3',  # 图表背景色
+                paper_bgcolor='#E3EAF3',  # 整体背景色
+                font=dict(color='#1B4965', size=12),  # 全局字体颜色
+                title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
+                xaxis=dict(
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14)
+                ),
+                yaxis=dict(
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14),
+                    gridcolor='#F6F8FA',  # 浅白色网格线
+                    zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+                )
             )
-        )
         
-        st.plotly_chart(fig3, use_container_width=True)
+            render_chart(fig3)
         
-    else:
-        st.write("重点城市均无业绩数据")
+        else:
+            st.write("重点城市均无业绩数据")
     
 
-    # 一级业态分析
-    # 一级业态分析
-    st.subheader("3.1一级业态业绩增长分析")
-
-    # 计算各业态24年和25年的业绩
-    format_2024 = df_2024.groupby('一级业态')['业绩金额'].sum()
-    format_2025 = df_2025.groupby('一级业态')['业绩金额'].sum()
-
-    # 获取所有业态
-    all_formats = format_2024.index.union(format_2025.index)
-
-    # 创建完整的数据框
-    format_2024_full = format_2024.reindex(all_formats, fill_value=0)
-    format_2025_full = format_2025.reindex(all_formats, fill_value=0)
+    def render_format_section():
+        """一级业态分析（3.1、3.2和深度分析）"""
+        profiler.begin('3.1一级业态业绩增长分析')
+        # 一级业态分析
+        # 一级业态分析
+        st.subheader("3.1一级业态业绩增长分析")
+
+        # 计算各业态24年和25年的业绩
+        format_totals = section_graph.result('一级业态汇总')
+        format_2024 = format_totals[2024]['业绩金额']
+        format_2025 = format_totals[2025]['业绩金额']
+
+        # 获取所有业态
+        all_formats = format_2024.index.union(format_2025.index)
+
+        # 创建完整的数据框
+        format_2024_full = format_2024.reindex(all_formats, fill_value=0)
+        format_2025_full = format_2025.reindex(all_formats, fill_value=0)
+
+        # 计算增长量和增长率
+        format_growth = format_2025_full - format_2024_full
+
+        # 计算增长率（特别处理24年为0的情况）
+        format_growth_rate = []
+        for format_name in all_formats:
+            if format_2024_full[format_name] == 0:
+                # 24年没有业绩的情况，增长率设为0%
+                format_growth_rate.append(0)
+            else:
+                # 正常计算增长率
+                rate = ((format_2025_full[format_name] - format_2024_full[format_name]) / format_2024_full[format_name]) * 100
+                format_growth_rate.append(rate)
 
-    # 计算增长量和增长率
-    format_growth = format_2025_full - format_2024_full
+        format_growth_rate = pd.Series(format_growth_rate, index=all_formats)
 
-    # 计算增长率（特别处理24年为0的情况）
-    format_growth_rate = []
-    for format_name in all_formats:
-        if format_2024_full[format_name] == 0:
-            # 24年没有业绩的情况，增长率设为0%
-            format_growth_rate.append(0)
-        else:
-            # 正常计算增长率
-            rate = ((format_2025_full[format_name] - format_2024_full[format_name]) / format_2024_full[format_name]) * 100
-            format_growth_rate.append(rate)
+        # 按增长量排序
+        format_growth_sorted = format_growth.sort_values(ascending=False)
+        format_growth_rate_sorted = format_growth_rate.reindex(format_growth_sorted.index)
 
-    format_growth_rate = pd.Series(format_growth_rate, index=all_formats)
+        # 创建组合图表
+        fig4 = go.Figure()
 
-    # 按增长量排序
-    format_growth_sorted = format_growth.sort_values(ascending=False)
-    format_growth_rate_sorted = format_growth_rate.reindex(format_growth_sorted.index)
+        # 添加柱状图（增长量）- 正增长用红色，负增长用绿色
+        colors = []
+        for x in format_growth_sorted.values:
+            if x >= 0:
+                colors.append('#8B2635')  # 正增长用红色（与背景色搭配的深红色）
+            else:
+                colors.append('#1E7E34')  # 负增长用绿色（与背景色搭配的深绿色）
 
-    # 创建组合图表
-    fig4 = go.Figure()
+        fig4.add_trace(go.Bar(
+            x=format_growth_sorted.index.tolist(),
+            y=format_growth_sorted.values.tolist(),
+            name='增长量',
+            marker_color=colors,
+            yaxis='y'
+        ))
 
-    # 添加柱状图（增长量）- 正增长用红色，负增长用绿色
-    colors = []
-    for x in format_growth_sorted.values:
-        if x >= 0:
-            colors.append('#8B2635')  # 正增长用红色（与背景色搭配的深红色）
-        else:
-            colors.append('#1E7E34')  # 负增长用绿色（与背景色搭配的深绿色）
-
-    fig4.add_trace(go.Bar(
-        x=format_growth_sorted.index.tolist(),
-        y=format_growth_sorted.values.tolist(),
-        name='增长量',
-        marker_color=colors,
-        yaxis='y'
-    ))
+        # 分离增长率为0和非0的数据点
+        zero_growth_indices = []
+        zero_growth_values = []
+        non_zero_growth_indices = []
+        non_zero_growth_values = []
+        non_zero_growth_rates = []
+
+        for i, (index, rate) in enumerate(zip(format_growth_sorted.index, format_growth_rate_sorted.values)):
+            if rate == 0:
+                zero_growth_indices.append(index)
+                zero_growth_values.append(rate)
+            else:
+                non_zero_growth_indices.append(index)
+                non_zero_growth_values.append(rate)
+                non_zero_growth_rates.append(rate)
+
+        # 添加折线图（增长率非0的点）
+        if non_zero_growth_indices:
+            fig4.add_trace(go.Scatter(
+                x=non_zero_growth_indices,
+                y=non_zero_growth_values,
+                mode='lines+markers+text',
+                name='增长率(%)',
+                line=dict(color='rgba(0,0,0,0.6)', width=3),
+                marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
+                text=[f'{int(rate)}%' for rate in non_zero_growth_rates],  # 显示整数部分的增长率
+                textposition='top center',
+                textfont=dict(color='#1B4965', size=10),  # 文字颜色与背景搭配
+                yaxis='y2',
+                connectgaps=True  # 连接间隙
+            ))
 
-    # 分离增长率为0和非0的数据点
-    zero_growth_indices = []
-    zero_growth_values = []
-    non_zero_growth_indices = []
-    non_zero_growth_values = []
-    non_zero_growth_rates = []
-
-    for i, (index, rate) in enumerate(zip(format_growth_sorted.index, format_growth_rate_sorted.values)):
-        if rate == 0:
-            zero_growth_indices.append(index)
-            zero_growth_values.append(rate)
-        else:
-            non_zero_growth_indices.append(index)
-            non_zero_growth_values.append(rate)
-            non_zero_growth_rates.append(rate)
-
-    # 添加折线图（增长率非0的点）
-    if non_zero_growth_indices:
-        fig4.add_trace(go.Scatter(
-            x=non_zero_growth_indices,
-            y=non_zero_growth_values,
-            mode='lines+markers+text',
-            name='增长率(%)',
-            line=dict(color='rgba(0,0,0,0.6)', width=3),
-            marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
-            text=[f'{int(rate)}%' for rate in non_zero_growth_rates],  # 显示整数部分的增长率
-            textposition='top center',
-            textfont=dict(color='#1B4965', size=10),  # 文字颜色与背景搭配
-            yaxis='y2',
-            connectgaps=True  # 连接间隙
-        ))
+        # 添加新增业态的特殊标记（增长率为0的点）
+        if zero_growth_indices:
+            fig4.add_trace(go.Scatter(
+                x=zero_growth_indices,
+                y=zero_growth_values,
+                mode='markers',
+                name='新增业态',
+                marker=dict(
+                    size=8, 
+                    color='rgba(0,0,0,0.6)', 
+                    symbol='triangle-up',  # 小三角形
+                    line=dict(width=2, color='rgba(0,0,0,0.6)')
+                ),
+                yaxis='y2',
+                showlegend=True
+            ))
 
-    # 添加新增业态的特殊标记（增长率为0的点）
-    if zero_growth_indices:
-        fig4.add_trace(go.Scatter(
-            x=zero_growth_indices,
-            y=zero_growth_values,
-            mode='markers',
-            name='新增业态',
-            marker=dict(
-                size=8, 
-                color='rgba(0,0,0,0.6)', 
-                symbol='triangle-up',  # 小三角形
-                line=dict(width=2, color='rgba(0,0,0,0.6)')
+        # 设置布局（延续参考代码的配色）
+        fig4.update_layout(
+            title="一级业态业绩增长量与增长率分析",
+            xaxis_title="一级业态",
+            yaxis=dict(
+                title="增长量",
+                side="left",
+                tickfont=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=14),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
             ),
-            yaxis='y2',
-            showlegend=True
-        ))
-
-    # 设置布局（延续参考代码的配色）
-    fig4.update_layout(
-        title="一级业态业绩增长量与增长率分析",
-        xaxis_title="一级业态",
-        yaxis=dict(
-            title="增长量",
-            side="left",
-            tickfont=dict(color='#1B4965', size=12),
-            title_font=dict(color='#1B4965', size=14),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
-        ),
-        yaxis2=dict(
-            title="增长率(%)",
-            side="right",
-            overlaying="y",
-            tickfont=dict(color='#1B4965', size=12),
-            title_font=dict(color='#1B4965', size=14),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
-        ),
-        height=500,
-        legend=dict(
-            x=0.7, 
-            y=1,
-            font=dict(color='#1B4965', size=12)  # 图例字体颜色
-        ),
-        # 使用参考代码的背景和字体配色
-        plot_bgcolor='#E3EAF3',  # 图表背景色
-        paper_bgcolor='#E3EAF3',  # 整体背景色
-        font=dict(color='#1B4965', size=12),  # 全局字体颜色
-        title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
-        xaxis=dict(
-            tickfont=dict(color='#1B4965', size=12),
-            title_font=dict(color='#1B4965', size=14)
+            yaxis2=dict(
+                title="增长率(%)",
+                side="right",
+                overlaying="y",
+                tickfont=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=14),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+            ),
+            height=500,
+            legend=dict(
+                x=0.7, 
+                y=1,
+                font=dict(color='#1B4965', size=12)  # 图例字体颜色
+            ),
+            # 使用参考代码的背景和字体配色
+            plot_bgcolor='#E3EAF3',  # 图表背景色
+            paper_bgcolor='#E3EAF3',  # 整体背景色
+            font=dict(color='#1B4965', size=12),  # 全局字体颜色
+            title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
+            xaxis=dict(
+                tickfont=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=14)
+            )
         )
-    )
-
-    st.plotly_chart(fig4, use_container_width=True)
 
-    # 显示业态详细数据
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.write("**增长最多的业态:**")
-        top_format_growth = format_growth_sorted.head(3)
-        for format_name, growth in top_format_growth.items():
-            rate = format_growth_rate_sorted[format_name]
-            st.write(f"{format_name}: {growth:,.0f} ({rate:.1f}%)")
+        render_chart(fig4)
 
-    with col2:
-        st.write("**新增业态:**")
-        new_formats = format_growth[(format_2024_full == 0) & (format_2025_full > 0)]
-        for format_name, growth in new_formats.items():
-            st.write(f"{format_name}: {growth:,.0f}")
+        # 显示业态详细数据
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.write("**增长最多的业态:**")
+            top_format_growth = format_growth_sorted.head(3)
+            for format_name, growth in top_format_growth.items():
+                rate = format_growth_rate_sorted[format_name]
+                st.write(f"{format_name}: {growth:,.0f} ({rate:.1f}%)")
 
-    with col3:
-        st.write("**业绩归零业态:**")
-        zero_formats = format_growth[(format_2024_full > 0) & (format_2025_full == 0)]
-        for format_name, growth in zero_formats.items():
-            st.write(f"{format_name}: {growth:,.0f}")
+        with col2:
+            st.write("**新增业态:**")
+            new_formats = format_growth[(format_2024_full == 0) & (format_2025_full > 0)]
+            for format_name, growth in new_formats.items():
+                st.write(f"{format_name}: {growth:,.0f}")
+
+        with col3:
+            st.write("**业绩归零业态:**")
+            zero_formats = format_growth[(format_2024_full > 0) & (format_2025_full == 0)]
+            for format_name, growth in zero_formats.items():
+                st.write(f"{format_name}: {growth:,.0f}")
     
 
-    # 一级业态占比分析
-    st.subheader("3.2一级业态占比分析")
+        profiler.begin('3.2一级业态占比分析')
+        # 一级业态占比分析
+        st.subheader("3.2一级业态占比分析")
 
-    # 计算各年度占比
-    format_2024_pct = (format_2024_full / format_2024_full.sum()) * 100
-    format_2025_pct = (format_2025_full / format_2025_full.sum()) * 100
+        # 计算各年度占比
+        format_2024_pct = (format_2024_full / format_2024_full.sum()) * 100
+        format_2025_pct = (format_2025_full / format_2025_full.sum()) * 100
 
-    # 计算占比变化
-    format_pct_change = format_2025_pct - format_2024_pct
+        # 计算占比变化
+        format_pct_change = format_2025_pct - format_2024_pct
 
-    # 按增长量排序（与上一个图表保持一致）
-    format_pct_change_sorted = format_pct_change.reindex(format_growth_sorted.index)
+        # 按增长量排序（与上一个图表保持一致）
+        format_pct_change_sorted = format_pct_change.reindex(format_growth_sorted.index)
 
-    # 创建左右两列布局
-    col1, col2 = st.columns(2)
+        # 创建左右两列布局
+        col1, col2 = st.columns(2)
 
-    with col1:
-        st.write("**堆叠柱状图：24年vs25年占比对比**")
-        
-        # 固定的"其他"业态
-        other_formats = ['城镇景区', '居住物业', '教研物业']
-        
-        # 处理24年数据
-        format_2024_display = format_2024_pct.copy()
-        # 提取"其他"业态并合并
-        other_2024_pct = sum([format_2024_display.get(fmt, 0) for fmt in other_formats])
-        # 移除原始的"其他"业态
-        for fmt in other_formats:
-            if fmt in format_2024_display:
-                format_2024_display.drop(fmt, inplace=True)
-        # 添加合并后的"其他"
-        if other_2024_pct > 0:
-            format_2024_display['其他'] = other_2024_pct
-        
-        # 处理25年数据
-        format_2025_display = format_2025_pct.copy()
-        # 提取"其他"业态并合并
-        other_2025_pct = sum([format_2025_display.get(fmt, 0) for fmt in other_formats])
-        # 移除原始的"其他"业态
-        for fmt in other_formats:
-            if fmt in format_2025_display:
-                format_2025_display.drop(fmt, inplace=True)
-        # 添加合并后的"其他"
-        if other_2025_pct > 0:
-            format_2025_display['其他'] = other_2025_pct
-        
-        # 定义业态顺序和颜色
-        format_order = ['产业园物业', '写字楼物业', '商业物业', '交通物业', '医疗物业', '公共物业', '其他']
-        format_colors = {
-            '产业园物业': '#8B2635',  # 红色
-            '写字楼物业': '#2E5984',  # 蓝色
-            '商业物业': '#1E7E34',    # 绿色
-            '交通物业': '#D4A843',    # 黄色
-            '医疗物业': '#6C757D',    # 紫色
-            '公共物业': '#7B68A6',    # 灰色
-            '其他': '#5F9EA0'         # 粉色
-        }
-        
-        # 获取实际存在的业态（按指定顺序）
-        all_display_formats = list(set(format_2024_display.index) | set(format_2025_display.index))
-        ordered_formats = [fmt for fmt in format_order if fmt in all_display_formats]
+        with col1:
+            st.write("**堆叠柱状图：24年vs25年占比对比**")
+        
+            # 固定的"其他"业态
+            other_formats = ['城镇景区', '居住物业', '教研物业']
+        
+            # 处理24年数据
+            format_2024_display = format_2024_pct.copy()
+            # 提取"其他"业态并合并
+            other_2024_pct = sum([format_2024_display.get(fmt, 0) for fmt in other_formats])
+            # 移除原始的"其他"业态
+            for fmt in other_formats:
+                if fmt in format_2024_display:
+                    format_2024_display.drop(fmt, inplace=True)
+            # 添加合并后的"其他"
+            if other_2024_pct > 0:
+                format_2024_display['其他'] = other_2024_pct
+        
+            # 处理25年数据
+            format_2025_display = format_2025_pct.copy()
+            # 提取"其他"业态并合并
+            other_2025_pct = sum([format_2025_display.get(fmt, 0) for fmt in other_formats])
+            # 移除原始的"其他"业态
+            for fmt in other_formats:
+                if fmt in format_2025_display:
+                    format_2025_display.drop(fmt, inplace=True)
+            # 添加合并后的"其他"
+            if other_2025_pct > 0:
+                format_2025_display['其他'] = other_2025_pct
+        
+            # 定义业态顺序和颜色
+            format_order = ['产业园物业', '写字楼物业', '商业物业', '交通物业', '医疗物业', '公共物业', '其他']
+            format_colors = {
+                '产业园物业': '#8B2635',  # 红色
+                '写字楼物业': '#2E5984',  # 蓝色
+                '商业物业': '#1E7E34',    # 绿色
+                '交通物业': '#D4A843',    # 黄色
+                '医疗物业': '#6C757D',    # 紫色
+                '公共物业': '#7B68A6',    # 灰色
+                '其他': '#5F9EA0'         # 粉色
+            }
+        
+            # 获取实际存在的业态（按指定顺序）
+            all_display_formats = list(set(format_2024_display.index) | set(format_2025_display.index))
+            ordered_formats = [fmt for fmt in format_order if fmt in all_display_formats]
         
-        # 创建堆叠柱状图
-        fig5 = go.Figure()
+            # 创建堆叠柱状图
+            fig5 = go.Figure()
         
-        # 按指定顺序为每个业态添加一个堆叠层
-        for format_name in ordered_formats:
-            pct_2024 = format_2024_display.get(format_name, 0)
-            pct_2025 = format_2025_display.get(format_name, 0)
+            # 按指定顺序为每个业态添加一个堆叠层
+            for format_name in ordered_formats:
+                pct_2024 = format_2024_display.get(format_name, 0)
+                pct_2025 = format_2025_display.get(format_name, 0)
             
-            fig5.add_trace(go.Bar(
-                name=format_name,
-                x=['2024年', '2025年'],
-                y=[pct_2024, pct_2025],
-                marker_color=format_colors.get(format_name, '#000000')
-            ))
+                fig5.add_trace(go.Bar(
+                    name=format_name,
+                    x=['2024年', '2025年'],
+                    y=[pct_2024, pct_2025],
+                    marker_color=format_colors.get(format_name, '#000000')
+                ))
         
-        fig5.update_layout(
-            title="业态占比对比 (堆叠柱状图)",
-            barmode='stack',
-            yaxis_title="占比 (%)",
-            height=500,
-            legend=dict(
-                orientation="v", 
-                x=1.05, 
-                y=1,
-                font=dict(color='#1B4965', size=12)  # 图例字体颜色
-            ),
-            # 使用参考代码的背景和字体配色
-            plot_bgcolor='#E3EAF3',  # 图表背景色
-            paper_bgcolor='#E3EAF3',  # 整体背景色
-            font=dict(color='#1B4965', size=12),  # 全局字体颜色
-            title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
-            xaxis=dict(
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14),
-                tickmode='array',
-                tickvals=[0, 1],  # 确保只显示两个年份
-                ticktext=['2024年', '2025年']
-            ),
-            yaxis=dict(
-                tickfont=dict(color='#1B4965', size=12),
-                title_font=dict(color='#1B4965', size=14),
-                gridcolor='#F6F8FA',  # 浅白色网格线
-                zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+            fig5.update_layout(
+                title="业态占比对比 (堆叠柱状图)",
+                barmode='stack',
+                yaxis_title="占比 (%)",
+                height=500,
+                legend=dict(
+                    orientation="v", 
+                    x=1.05, 
+                    y=1,
+                    font=dict(color='#1B4965', size=12)  # 图例字体颜色
+                ),
+                # 使用参考代码的背景和字体配色
+                plot_bgcolor='#E3EAF3',  # 图表背景色
+                paper_bgcolor='#E3EAF3',  # 整体背景色
+                font=dict(color='#1B4965', size=12),  # 全局字体颜色
+                title_font=dict(color='#1B4965', size=16),  # 标题字体颜色
+                xaxis=dict(
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14),
+                    tickmode='array',
+                    tickvals=[0, 1],  # 确保只显示两个年份
+                    ticktext=['2024年', '2025年']
+                ),
+                yaxis=dict(
+                    tickfont=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=14),
+                    gridcolor='#F6F8FA',  # 浅白色网格线
+                    zerolinecolor='#F6F8FA'  # 零轴线颜色与网格线一致
+                )
             )
-        )
         
-        st.plotly_chart(fig5, use_container_width=True)
+            render_chart(fig5)
         
-        # 计算商业业态的占比和变化率
-        commercial_formats = ['产业园物业', '写字楼物业', '商业物业']
+            # 计算商业业态的占比和变化率
+            commercial_formats = ['产业园物业', '写字楼物业', '商业物业']
         
-        # 计算2024年商业业态总占比
-        commercial_2024_total = sum([format_2024_display.get(fmt, 0) for fmt in commercial_formats])
+            # 计算2024年商业业态总占比
+            commercial_2024_total = sum([format_2024_display.get(fmt, 0) for fmt in commercial_formats])
         
-        # 计算2025年商业业态总占比
-        commercial_2025_total = sum([format_2025_display.get(fmt, 0) for fmt in commercial_formats])
+            # 计算2025年商业业态总占比
+            commercial_2025_total = sum([format_2025_display.get(fmt, 0) for fmt in commercial_formats])
         
-        # 计算变化率
-        if commercial_2024_total > 0:
-            change_rate = ((commercial_2025_total - commercial_2024_total) / commercial_2024_total) * 100
-        else:
-            change_rate = 0
+            # 计算变化率
+            if commercial_2024_total > 0:
+                change_rate = ((commercial_2025_total - commercial_2024_total) / commercial_2024_total) * 100
+            else:
+                change_rate = 0
         
-        # 显示商业业态分析
-        st.write("**商业业态分析:**")
-        st.write(f"• 2024年商业业态总占比: {commercial_2024_total:.1f}%")
-        st.write(f"• 2025年商业业态总占比: {commercial_2025_total:.1f}%")
+            # 显示商业业态分析
+            st.write("**商业业态分析:**")
+            st.write(f"• 2024年商业业态总占比: {commercial_2024_total:.1f}%")
+            st.write(f"• 2025年商业业态总占比: {commercial_2025_total:.1f}%")
         
-        if change_rate > 0:
-            st.write(f"• 商业业态占比增长: +{change_rate:.1f}%")
-        elif change_rate < 0:
-            st.write(f"• 商业业态占比下降: {change_rate:.1f}%")
-        else:
-            st.write(f"• 商业业态占比保持稳定")
+            if change_rate > 0:
+                st.write(f"• 商业业态占比增长: +{change_rate:.1f}%")
+            elif change_rate < 0:
+                st.write(f"• 商业业态占比下降: {change_rate:.1f}%")
+            else:
+                st.write(f"• 商业业态占比保持稳定")
         
         
         
-        # 说明"其他"的内容
-        st.write("**'其他'业态详情:**")
-        other_2024_details = []
-        other_2025_details = []
+            # 说明"其他"的内容
+            st.write("**'其他'业态详情:**")
+            other_2024_details = []
+            other_2025_details = []
         
-        for fmt in other_formats:
-            pct_2024 = format_2024_pct.get(fmt, 0)
-            pct_2025 = format_2025_pct.get(fmt, 0)
-            if pct_2024 > 0:
-                other_2024_details.append(f"{fmt}({pct_2024:.1f}%)")
-            if pct_2025 > 0:
-                other_2025_details.append(f"{fmt}({pct_2025:.1f}%)")
+            for fmt in other_formats:
+                pct_2024 = format_2024_pct.get(fmt, 0)
+                pct_2025 = format_2025_pct.get(fmt, 0)
+                if pct_2024 > 0:
+                    other_2024_details.append(f"{fmt}({pct_2024:.1f}%)")
+                if pct_2025 > 0:
+                    other_2025_details.append(f"{fmt}({pct_2025:.1f}%)")
         
-        if other_2024_details:
-            st.write(f"2024年 - 其他业态({other_2024_pct:.1f}%)：{', '.join(other_2024_details)}")
-        if other_2025_details:
-            st.write(f"2025年 - 其他业态({other_2025_pct:.1f}%)：{', '.join(other_2025_details)}")
-    with col2:
-        st.write("**折线图：占比变化趋势**")
-        
-        # 创建折线图
-        fig6 = go.Figure()
-        
-        fig6.add_trace(go.Scatter(
-            x=list(range(len(format_pct_change_sorted))),
-            y=format_pct_change_sorted.values.tolist(),
-            mode='lines+markers',
-            name='占比变化',
-            line=dict(color='blue', width=3),
-            marker=dict(size=8, color=['green' if x >= 0 else 'red' for x in format_pct_change_sorted.values])
-        ))
+            if other_2024_details:
+                st.write(f"2024年 - 其他业态({other_2024_pct:.1f}%)：{', '.join(other_2024_details)}")
+            if other_2025_details:
+                st.write(f"2025年 - 其他业态({other_2025_pct:.1f}%)：{', '.join(other_2025_details)}")
+        with col2:
+            st.write("**折线图：占比变化趋势**")
         
-        # 添加零线
-        fig6.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.7)
+            # 创建折线图
+            fig6 = go.Figure()
         
-        fig6.update_layout(
-            title="业态占比变化 (按增长量排序)",
-            xaxis_title="业态 (按增长量排序)",
-            yaxis_title="占比变化 (%)",
-            height=500,
-            xaxis=dict(
-                tickmode='array',
-                tickvals=list(range(len(format_pct_change_sorted))),
-                ticktext=format_pct_change_sorted.index.tolist(),
-                tickangle=45
+            fig6.add_trace(go.Scatter(
+                x=list(range(len(format_pct_change_sorted))),
+                y=format_pct_change_sorted.values.tolist(),
+                mode='lines+markers',
+                name='占比变化',
+                line=dict(color='blue', width=3),
+                marker=dict(size=8, color=['green' if x >= 0 else 'red' for x in format_pct_change_sorted.values])
+            ))
+        
+            # 添加零线
+            fig6.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.7)
+        
+            fig6.update_layout(
+                title="业态占比变化 (按增长量排序)",
+                xaxis_title="业态 (按增长量排序)",
+                yaxis_title="占比变化 (%)",
+                height=500,
+                xaxis=dict(
+                    tickmode='array',
+                    tickvals=list(range(len(format_pct_change_sorted))),
+                    ticktext=format_pct_change_sorted.index.tolist(),
+                    tickangle=45
+                )
             )
-        )
         
-        st.plotly_chart(fig6, use_container_width=True)
-
-    # 显示占比变化详细数据
-    # st.write("**占比变化详细数据:**")
-    # change_data = []
-    # for format_name in format_pct_change_sorted.index:
-    #     pct_24 = format_2024_pct[format_name]
-    #     pct_25 = format_2025_pct[format_name]
-    #     change = format_pct_change_sorted[format_name]
-    #     change_data.append(f"{format_name}: {pct_24:.1f}% → {pct_25:.1f}% (变化: {change:+.1f}%)")
-
-    # for data in change_data:
-    #     st.write(data)
-    # 一级业态深度分析
-    st.subheader("一级业态深度分析")
-
-    # 基于四个维度的分析结果
-    analysis_results = []
-
-    for format_name in all_formats:
-        growth_amount = format_growth[format_name]
-        growth_rate = format_growth_rate[format_name]
-        pct_2024 = format_2024_pct[format_name]
-        pct_2025 = format_2025_pct[format_name]
-        pct_change = format_pct_change[format_name]
-        
-        # 分析逻辑
-        if growth_amount > 0 and pct_change > 0:
-            if growth_rate > 20:
-                status = "🚀 高速增长"
-                analysis = "业绩增长强劲，市场份额扩大，发展势头良好"
-            elif growth_rate > 0:
-                status = "📈 稳健增长"
-                analysis = "业绩稳步增长，市场地位稳固"
-            elif growth_rate == 0 and pct_2024 == 0:
+            render_chart(fig6)
+
+        # 显示占比变化详细数据
+        # st.write("**占比变化详细数据:**")
+        # change_data = []
+        # for format_name in format_pct_change_sorted.index:
+        #     pct_24 = format_2024_pct[format_name]
+        #     pct_25 = format_2025_pct[format_name]
+        #     change = format_pct_change_sorted[format_name]
+        #     change_data.append(f"{format_name}: {pct_24:.1f}% → {pct_25:.1f}% (变化: {change:+.1f}%)")
+
+        # for data in change_data:
+        #     st.write(data)
+        profiler.begin('一级业态深度分析')
+        # 一级业态深度分析
+        st.subheader("一级业态深度分析")
+
+        # 基于四个维度的分析结果
+        analysis_results = []
+
+        for format_name in all_formats:
+            growth_amount = format_growth[format_name]
+            growth_rate = format_growth_rate[format_name]
+            pct_2024 = format_2024_pct[format_name]
+            pct_2025 = format_2025_pct[format_name]
+            pct_change = format_pct_change[format_name]
+        
+            # 分析逻辑
+            if growth_amount > 0 and pct_change > 0:
+                if growth_rate > 20:
+                    status = "🚀 高速增长"
+                    analysis = "业绩增长强劲，市场份额扩大，发展势头良好"
+                elif growth_rate > 0:
+                    status = "📈 稳健增长"
+                    analysis = "业绩稳步增长，市场地位稳固"
+                elif growth_rate == 0 and pct_2024 == 0:
+                    status = "🆕 新兴业态"
+                    analysis = "2024年无业绩，2025年开始产生业绩，属于新兴业态"
+                else:
+                    status = "⚠️ 虚假繁荣"
+                    analysis = "占比提升但增长率较低，可能是其他业态下滑导致的相对优势"
+            elif growth_amount > 0 and pct_change < 0:
+                status = "🔄 增长但占比下降"
+                analysis = "业绩有所增长，但增长速度低于市场平均水平"
+            elif growth_amount < 0 and pct_change > 0:
+                status = "🤔 异常情况"
+                analysis = "业绩下降但占比提升，可能存在数据异常或其他业态大幅下滑"
+            elif growth_amount < 0 and pct_change < 0:
+                status = "📉 双重下滑"
+                analysis = "业绩和市场份额均下降，需要关注业态发展趋势"
+            elif growth_amount == 0 and pct_2024 == 0:
                 status = "🆕 新兴业态"
-                analysis = "2024年无业绩，2025年开始产生业绩，属于新兴业态"
+                analysis = "2025年新增业态，发展潜力待观察"
+            elif growth_amount == 0 and pct_2025 == 0:
+                status = "❌ 退出业态"
+                analysis = "2025年业绩归零，业态可能面临退出"
             else:
-                status = "⚠️ 虚假繁荣"
-                analysis = "占比提升但增长率较低，可能是其他业态下滑导致的相对优势"
-        elif growth_amount > 0 and pct_change < 0:
-            status = "🔄 增长但占比下降"
-            analysis = "业绩有所增长，但增长速度低于市场平均水平"
-        elif growth_amount < 0 and pct_change > 0:
-            status = "🤔 异常情况"
-            analysis = "业绩下降但占比提升，可能存在数据异常或其他业态大幅下滑"
-        elif growth_amount < 0 and pct_change < 0:
-            status = "📉 双重下滑"
-            analysis = "业绩和市场份额均下降，需要关注业态发展趋势"
-        elif growth_amount == 0 and pct_2024 == 0:
-            status = "🆕 新兴业态"
-            analysis = "2025年新增业态，发展潜力待观察"
-        elif growth_amount == 0 and pct_2025 == 0:
-            status = "❌ 退出业态"
-            analysis = "2025年业绩归零，业态可能面临退出"
-        else:
-            status = "➖ 无变化"
-            analysis = "业绩和占比基本无变化，保持稳定"
-        
-        analysis_results.append({
-            '业态': format_name,
-            '状态': status,
-            '分析': analysis,
-            '增长量': growth_amount,
-            '增长率': growth_rate,
-            '占比变化': pct_change
-        })
+                status = "➖ 无变化"
+                analysis = "业绩和占比基本无变化，保持稳定"
+        
+            analysis_results.append({
+                '业态': format_name,
+                '状态': status,
+                '分析': analysis,
+                '增长量': growth_amount,
+                '增长率': growth_rate,
+                '占比变化': pct_change
+            })
 
-    # 按增长量排序展示分析结果
-    analysis_df = pd.DataFrame(analysis_results)
-    analysis_df = analysis_df.sort_values('增长量', ascending=False)
-
-    # 使用左右两列布局
-    col_left, col_right = st.columns(2)
-
-    # 左列：业态发展态势分析
-    with col_left:
-        st.write("### 🎯 业态发展态势分析")
-        
-        # 优秀表现业态
-        excellent_formats = analysis_df[analysis_df['状态'].str.contains('高速增长|稳健增长|新兴业态')]
-        if len(excellent_formats) > 0:
-            st.write("**🌟 表现优秀的业态:**")
-            for _, row in excellent_formats.iterrows():
-                with st.expander(f"**{row['业态']}** {row['状态']}", expanded=True):
-                    st.write(f"📝 {row['分析']}")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("增长量", f"{row['增长量']:,.0f}")
-                    with col2:
-                        if row['增长率'] == 0 and row['增长量'] > 0:
-                            st.metric("增长率", "新兴业态")
-                        else:
+        # 按增长量排序展示分析结果
+        analysis_df = pd.DataFrame(analysis_results)
+        analysis_df = analysis_df.sort_values('增长量', ascending=False)
+
+        # 使用左右两列布局
+        col_left, col_right = st.columns(2)
+
+        # 左列：业态发展态势分析
+        with col_left:
+            st.write("### 🎯 业态发展态势分析")
+        
+            # 优秀表现业态
+            excellent_formats = analysis_df[analysis_df['状态'].str.contains('高速增长|稳健增长|新兴业态')]
+            if len(excellent_formats) > 0:
+                st.write("**🌟 表现优秀的业态:**")
+                for _, row in excellent_formats.iterrows():
+                    with st.expander(f"**{row['业态']}** {row['状态']}", expanded=True):
+                        st.write(f"📝 {row['分析']}")
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("增长量", f"{row['增长量']:,.0f}")
+                        with col2:
+                            if row['增长率'] == 0 and row['增长量'] > 0:
+                                st.metric("增长率", "新兴业态")
+                            else:
+                                st.metric("增长率", f"{row['增长率']:.1f}%")
+                        with col3:
+                            st.metric("占比变化", f"{row['占比变化']:+.1f}%")
+        
+            # 需要关注的业态
+            concern_formats = analysis_df[analysis_df['状态'].str.contains('虚假繁荣|异常情况|双重下滑')]
+            if len(concern_formats) > 0:
+                st.write("**⚠️ 需要关注的业态:**")
+                for _, row in concern_formats.iterrows():
+                    with st.expander(f"**{row['业态']}** {row['状态']}", expanded=False):
+                        st.write(f"📝 {row['分析']}")
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("增长量", f"{row['增长量']:,.0f}")
+                        with col2:
                             st.metric("增长率", f"{row['增长率']:.1f}%")
-                    with col3:
-                        st.metric("占比变化", f"{row['占比变化']:+.1f}%")
-        
-        # 需要关注的业态
-        concern_formats = analysis_df[analysis_df['状态'].str.contains('虚假繁荣|异常情况|双重下滑')]
-        if len(concern_formats) > 0:
-            st.write("**⚠️ 需要关注的业态:**")
-            for _, row in concern_formats.iterrows():
-                with st.expander(f"**{row['业态']}** {row['状态']}", expanded=False):
-                    st.write(f"📝 {row['分析']}")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("增长量", f"{row['增长量']:,.0f}")
-                    with col2:
-                        st.metric("增长率", f"{row['增长率']:.1f}%")
-                    with col3:
-                        st.metric("占比变化", f"{row['占比变化']:+.1f}%")
+                        with col3:
+                            st.metric("占比变化", f"{row['占比变化']:+.1f}%")
+
+        # 右列：整体市场分析和风险提示
+        with col_right:
+            st.write("### 📈 整体市场分析")
+        
+            total_growth = format_growth.sum()
+            positive_growth_count = len(format_growth[format_growth > 0])
+            negative_growth_count = len(format_growth[format_growth < 0])
+            total_formats = len(all_formats)
+
+            # 关键指标卡片
+            st.write("**核心指标:**")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("总体增长量", f"{total_growth:,.0f}")
+                st.metric("增长业态数", f"{positive_growth_count}/{total_formats}")
+            with col2:
+                st.metric("下降业态数", f"{negative_growth_count}/{total_formats}")
+                growth_ratio = (positive_growth_count / total_formats * 100) if total_formats > 0 else 0
+                st.metric("增长业态占比", f"{growth_ratio:.1f}%")
+
+            # 市场集中度分析
+            st.write("**市场集中度分析:**")
+            top3_formats = analysis_df.head(3)
+            top3_growth_sum = top3_formats['增长量'].sum()
+            top3_contribution = (top3_growth_sum / total_growth * 100) if total_growth > 0 else 0
+        
+            st.info(f"前3大业态贡献了 **{top3_contribution:.1f}%** 的增长量")
+            st.write("**主要增长驱动力:**")
+            for i, (_, row) in enumerate(top3_formats.iterrows(), 1):
+                st.write(f"{i}. {row['业态']} ({row['状态']})")
+        
+            # 风险提示
+            risk_formats = analysis_df[analysis_df['状态'].str.contains('虚假繁荣|异常情况|双重下滑')]
+            if len(risk_formats) > 0:
+                st.write("**⚠️ 风险提示:**")
+                st.error(f"共有 **{len(risk_formats)}** 个业态存在潜在风险")
+                st.write("**建议重点关注:**")
+                for _, row in risk_formats.iterrows():
+                    st.write(f"• {row['业态']} - {row['状态']}")
+        
+            # 新兴和退出业态（从需要关注的业态中移除新兴业态）
+            new_exit_formats = analysis_df[analysis_df['状态'].str.contains('退出业态')]
+            if len(new_exit_formats) > 0:
+                st.write("**🔄 业态变化:**")
+                for _, row in new_exit_formats.iterrows():
+                    st.warning(f"**{row['业态']}** {row['状态']} - {row['分析']}")
+
+        # 底部：业态排名总览表格
+        st.write("### 📋 业态排名总览")
+        # 创建简洁的总览表格
+        display_df = analysis_df[['业态', '状态', '增长量', '增长率', '占比变化']].copy()
+        display_df['增长量'] = display_df['增长量'].apply(lambda x: f"{x:,.0f}")
+        # 对于新兴业态，显示"新兴业态"而不是"0.0%"
+        display_df['增长率_显示'] = display_df.apply(lambda row: "新兴业态" if row['增长率'] == 0 and "🆕 新兴业态" in row['状态'] else f"{row['增长率']:.1f}%", axis=1)
+        display_df['占比变化'] = display_df['占比变化'].apply(lambda x: f"{x:+.1f}%")
+
+        # 重新排列列顺序，用新的增长率显示列
+        display_df = display_df[['业态', '状态', '增长量', '增长率_显示', '占比变化']].copy()
+        display_df.rename(columns={'增长率_显示': '增长率'}, inplace=True)
+
+        st.dataframe(
+            display_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "业态": st.column_config.TextColumn("业态", width="medium"),
+                "状态": st.column_config.TextColumn("发展状态", width="medium"),
+                "增长量": st.column_config.TextColumn("增长量", width="small"),
+                "增长率": st.column_config.TextColumn("增长率", width="small"),
+                "占比变化": st.column_config.TextColumn("占比变化", width="small"),
+            }
+        )
+
+
+
 
-    # 右列：整体市场分析和风险提示
-    with col_right:
-        st.write("### 📈 整体市场分析")
+    def render_project_quality_section():
+        """三.项目质量下降分析"""
+        profiler.begin('三.项目质量下降分析')
+        # 项目质量下降分析
+        st.markdown("---")
+        st.subheader("三.项目质量下降分析")
+
+        # 各城市项目数量、总业绩、平均项目业绩及变化率已提交后台计算
+        with profiler.stage('等待后台计算'):
+            city_stats, city_total_performance, decline_rates = section_graph.result('三.项目质量下降分析')
+            city_intervals = section_graph.result('城市变化置信区间')
+
+        # 创建两列布局
+        col_chart, col_analysis = st.columns([2, 1])
+
+        with col_chart:
+            # 创建分组柱状图加折线图
+            fig_quality = make_subplots(
+                specs=[[{"secondary_y": True}]],
+                # subplot_titles=("城市项目质量对比分析",）
+            )
+        
+            # 添加分组柱状图
+            cities_ordered = city_total_performance['城市'].tolist()
+        
+            # 2024年数据
+            data_2024 = city_stats[city_stats['年份'] == 2024].set_index('城市').reindex(cities_ordered)
+            fig_quality.add_trace(
+                go.Bar(
+                    name='2024年平均项目业绩',
+                    x=cities_ordered,
+                    y=data_2024['平均项目业绩'].fillna(0),
+                    marker_color='#4ECDC4',
+                    text=[f'{val:.1f}万' for val in data_2024['平均项目业绩'].fillna(0)],
+                    textposition='outside',
+                    yaxis='y1'
+                ),
+                secondary_y=False
+            )
+        
+            # 2025年数据
+            data_2025 = city_stats[city_stats['年份'] == 2025].set_index('城市').reindex(cities_ordered)
+            fig_quality.add_trace(
+                go.Bar(
+                    name='2025年平均项目业绩',
+                    x=cities_ordered,
+                    y=data_2025['平均项目业绩'].fillna(0),
+                    marker_color='#FF8C94',
+                    text=[f'{val:.1f}万' for val in data_2025['平均项目业绩'].fillna(0)],
+                    textposition='outside',
+                    yaxis='y1'
+                ),
+                secondary_y=False
+            )
+        
+            # 添加折线图（下降率），误差线为自助法置信区间，空心点为不显著的变化
+            decline_values = [decline_rates.get(city, 0) for city in cities_ordered]
+            decline_intervals = city_intervals.reindex(cities_ordered)
+            decline_low = decline_intervals['平均业绩变化率下限(%)'].to_numpy()
+            decline_high = decline_intervals['平均业绩变化率上限(%)'].to_numpy()
+            decline_significant = decline_intervals['平均业绩变化显著'].fillna(False).to_numpy(dtype=bool)
+            fig_quality.add_trace(
+                go.Scatter(
+                    name='平均项目业绩变化率',
+                    x=cities_ordered,
+                    y=decline_values,
+                    mode='lines+markers',
+                    line=dict(color='red', width=3),
+                    marker=dict(
+                        size=8, color='red',
+                        symbol=np.where(decline_significant, 'circle', 'circle-open'),
+                        line=dict(width=2, color='red')
+                    ),
+                    error_y=dict(
+                        type='data', symmetric=False,
+                        array=np.nan_to_num(decline_high - decline_values),
+                        arrayminus=np.nan_to_num(decline_values - decline_low),
+                        color='rgba(255,0,0,0.4)', thickness=1.5
+                    ),
+                    text=[
+                        f'{val:.1f}%（{BOOTSTRAP_CONFIDENCE:.0%}置信区间 {low:.1f}% ~ {high:.1f}%{"" if significant else "，不显著"}）'
+                        if not np.isnan(low) else f'{val:.1f}%（项目过少，未估计置信区间）'
+                        for val, low, high, significant in zip(decline_values, decline_low, decline_high, decline_significant)
+                    ],
+                    hovertemplate='%{x}<br>平均项目业绩变化率: %{text}<extra></extra>',
+                    textposition='top center',
+                    yaxis='y2'
+                ),
+                secondary_y=True
+            )
+        
+            # 更新图表布局
+            fig_quality.update_layout(
+            
+                xaxis_title='城市（按总业绩排序）',
+                barmode='group',
+                height=680,
+                template='plotly_white',
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=1.02,
+                    xanchor="right",
+                    x=1
+                )
+            )
+        
+            # 设置Y轴标签
+            fig_quality.update_yaxes(title_text="平均项目业绩 (万元)", secondary_y=False)
+            fig_quality.update_yaxes(title_text="变化率 (%)", secondary_y=True)
         
-        total_growth = format_growth.sum()
-        positive_growth_count = len(format_growth[format_growth > 0])
-        negative_growth_count = len(format_growth[format_growth < 0])
-        total_formats = len(all_formats)
+            render_chart(fig_quality)
+            st.caption(
+                f"误差线为平均项目业绩变化率的{BOOTSTRAP_CONFIDENCE:.0%}自助法置信区间（{BOOTSTRAP_RESAMPLES}次重抽样），"
+                "空心点表示置信区间包含0，变化可能只是少数项目带来的波动"
+            )
 
-        # 关键指标卡片
-        st.write("**核心指标:**")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("总体增长量", f"{total_growth:,.0f}")
-            st.metric("增长业态数", f"{positive_growth_count}/{total_formats}")
-        with col2:
-            st.metric("下降业态数", f"{negative_growth_count}/{total_formats}")
-            growth_ratio = (positive_growth_count / total_formats * 100) if total_formats > 0 else 0
-            st.metric("增长业态占比", f"{growth_ratio:.1f}%")
-
-        # 市场集中度分析
-        st.write("**市场集中度分析:**")
-        top3_formats = analysis_df.head(3)
-        top3_growth_sum = top3_formats['增长量'].sum()
-        top3_contribution = (top3_growth_sum / total_growth * 100) if total_growth > 0 else 0
-        
-        st.info(f"前3大业态贡献了 **{top3_contribution:.1f}%** 的增长量")
-        st.write("**主要增长驱动力:**")
-        for i, (_, row) in enumerate(top3_formats.iterrows(), 1):
-            st.write(f"{i}. {row['业态']} ({row['状态']})")
-        
-        # 风险提示
-        risk_formats = analysis_df[analysis_df['状态'].str.contains('虚假繁荣|异常情况|双重下滑')]
-        if len(risk_formats) > 0:
-            st.write("**⚠️ 风险提示:**")
-            st.error(f"共有 **{len(risk_formats)}** 个业态存在潜在风险")
-            st.write("**建议重点关注:**")
-            for _, row in risk_formats.iterrows():
-                st.write(f"• {row['业态']} - {row['状态']}")
-        
-        # 新兴和退出业态（从需要关注的业态中移除新兴业态）
-        new_exit_formats = analysis_df[analysis_df['状态'].str.contains('退出业态')]
-        if len(new_exit_formats) > 0:
-            st.write("**🔄 业态变化:**")
-            for _, row in new_exit_formats.iterrows():
-                st.warning(f"**{row['业态']}** {row['状态']} - {row['分析']}")
-
-    # 底部：业态排名总览表格
-    st.write("### 📋 业态排名总览")
-    # 创建简洁的总览表格
-    display_df = analysis_df[['业态', '状态', '增长量', '增长率', '占比变化']].copy()
-    display_df['增长量'] = display_df['增长量'].apply(lambda x: f"{x:,.0f}")
-    # 对于新兴业态，显示"新兴业态"而不是"0.0%"
-    display_df['增长率_显示'] = display_df.apply(lambda row: "新兴业态" if row['增长率'] == 0 and "🆕 新兴业态" in row['状态'] else f"{row['增长率']:.1f}%", axis=1)
-    display_df['占比变化'] = display_df['占比变化'].apply(lambda x: f"{x:+.1f}%")
-
-    # 重新排列列顺序，用新的增长率显示列
-    display_df = display_df[['业态', '状态', '增长量', '增长率_显示', '占比变化']].copy()
-    display_df.rename(columns={'增长率_显示': '增长率'}, inplace=True)
-
-    st.dataframe(
-        display_df,
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "业态": st.column_config.TextColumn("业态", width="medium"),
-            "状态": st.column_config.TextColumn("发展状态", width="medium"),
-            "增长量": st.column_config.TextColumn("增长量", width="small"),
-            "增长率": st.column_config.TextColumn("增长率", width="small"),
-            "占比变化": st.column_config.TextColumn("占比变化", width="small"),
-        }
-    )
+        with col_analysis:
+            st.markdown("#### 📊 项目质量分析")
+        
+            # 计算总体平均项目业绩
+            total_avg_2024 = city_stats[city_stats['年份'] == 2024]['平均项目业绩'].mean()
+            total_avg_2025 = city_stats[city_stats['年份'] == 2025]['平均项目业绩'].mean()
+            overall_avg = city_stats['平均项目业绩'].mean()
+            overall_decline = ((total_avg_2025 - total_avg_2024) / total_avg_2024) * 100 if total_avg_2024 > 0 else 0
+        
+            # st.markdown("**总体平均项目业绩对比：**")
+            # st.info(f"""
+            # - 总体平均: {overall_avg:.1f}万元
+            # - 2024年平均: {total_avg_2024:.1f}万元  
+            # - 2025年平均: {total_avg_2025:.1f}万元
+            # - 总体变化率: {overall_decline:.1f}%
+            # """)
+        
+            # 找出下降率最大的三个城市（排除-100%的城市）
+            filtered_decline_rates = {city: rate for city, rate in decline_rates.items() if rate != -100 and rate < 0}
+            decline_sorted = sorted(filtered_decline_rates.items(), key=lambda x: x[1])[:3]
+        
+            st.markdown("**平均项目业绩下降率最大的城市：**")
+            for i, (city, decline_rate) in enumerate(decline_sorted, 1):
+                city_2024_avg = city_stats[(city_stats['城市'] == city) & (city_stats['年份'] == 2024)]['平均项目业绩'].values
+                city_2025_avg = city_stats[(city_stats['城市'] == city) & (city_stats['年份'] == 2025)]['平均项目业绩'].values
+            
+                avg_2024_str = f"{city_2024_avg[0]:.1f}万" if len(city_2024_avg) > 0 else "无数据"
+                avg_2025_str = f"{city_2025_avg[0]:.1f}万" if len(city_2025_avg) > 0 else "无数据"
+            
+                interval = city_intervals.loc[city] if city in city_intervals.index else None
+                if interval is not None and not np.isnan(interval['平均业绩变化率下限(%)']):
+                    interval_str = (
+                        f"{interval['平均业绩变化率下限(%)']:.1f}% ~ {interval['平均业绩变化率上限(%)']:.1f}%"
+                        + ("" if interval['平均业绩变化显著'] else "（不显著）")
+                    )
+                else:
+                    interval_str = "项目过少，无法估计"
+
+                st.markdown(f"""
+                **{i}. {city}**
+                - 下降率: {decline_rate:.1f}%
+                - {BOOTSTRAP_CONFIDENCE:.0%}置信区间: {interval_str}
+                - 2024年: {avg_2024_str}
+                - 2025年: {avg_2025_str}
+                """)
+
+        # 项目规模分档：平均值容易被少数超大项目拉动，按档位看项目结构的变化
+        st.markdown("#### 📦 项目规模分档")
+        band_edges_text = st.text_input(
+            "分档边界（万元，逗号分隔）", value=','.join(f'{edge:g}' for edge in PROJECT_BAND_EDGES), key='project_band_edges'
+        )
+        if parse_project_band_edges(band_edges_text) is None:
+            st.warning(f"分档边界“{band_edges_text}”无法解析，按默认边界{PROJECT_BAND_EDGES}分档")
+
+        with profiler.stage('等待后台计算'):
+            project_bands = section_graph.result('项目规模分档')
+
+        # 全部项目的档位结构
+        overall_bands = project_bands['全部']
+        overall_count_2024, overall_count_2025, overall_count_shift = project_band_mix_shift(overall_bands)
+        overall_amount_2024, overall_amount_2025, _ = project_band_mix_shift(overall_bands, '业绩金额')
+        band_labels = list(overall_bands['项目数量'][2024].columns)
+        band_overview = pd.DataFrame({
+            '2024年项目数': overall_bands['项目数量'][2024].iloc[0],
+            '2025年项目数': overall_bands['项目数量'][2025].iloc[0],
+            '2024年项目数占比(%)': overall_count_2024.iloc[0],
+            '2025年项目数占比(%)': overall_count_2025.iloc[0],
+            '项目数占比变化(百分点)': overall_count_shift.iloc[0],
+            '2024年业绩': overall_bands['业绩金额'][2024].iloc[0],
+            '2025年业绩': overall_bands['业绩金额'][2025].iloc[0],
+            '2024年业绩占比(%)': overall_amount_2024.iloc[0],
+            '2025年业绩占比(%)': overall_amount_2025.iloc[0],
+        }, index=band_labels)
+
+        col_band_chart, col_band_table = st.columns([1, 2])
+        with col_band_chart:
+            band_colors = ['#A8DADC', '#E9C46A', '#F4A261', '#E76F51', '#D4A5A5', '#C8B6E2', '#A3C4F3']
+            fig_bands = go.Figure()
+            for i, band in enumerate(band_labels):
+                fig_bands.add_trace(go.Bar(
+                    name=band,
+                    x=['2024年', '2025年'],
+                    y=[overall_count_2024.iloc[0][band], overall_count_2025.iloc[0][band]],
+                    marker_color=band_colors[i % len(band_colors)],
+                    text=[f'{overall_count_2024.iloc[0][band]:.1f}%', f'{overall_count_2025.iloc[0][band]:.1f}%'],
+                    textposition='inside'
+                ))
+            fig_bands.update_layout(
+                title='项目数量的档位结构',
+                barmode='stack',
+                yaxis_title='项目数占比 (%)',
+                height=400,
+                plot_bgcolor='#E3EAF3',
+                paper_bgcolor='#E3EAF3',
+                font=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=16)
+            )
+            render_chart(fig_bands)
+        with col_band_table:
+            st.dataframe(
+                band_overview.style.format({
+                    column: '{:,.0f}' if column.endswith('业绩') or column.endswith('项目数') else '{:+.1f}' if '变化' in column else '{:.1f}'
+                    for column in band_overview.columns
+                }),
+                use_container_width=True
+            )
+
+        # 各城市、各一级业态的档位结构变化：全部城市一次分组得到，热力图展示总业绩靠前的城市
+        band_tabs = st.tabs(["按城市", "按一级业态"])
+        for tab, dimension in zip(band_tabs, ('城市', '一级业态')):
+            with tab:
+                band_summary = project_bands[dimension]
+                _, _, count_shift = project_band_mix_shift(band_summary)
+                total_amount = band_summary['业绩金额'].sum(axis=1).sort_values(ascending=False)
+                heatmap_rows = count_shift.loc[total_amount.index[:RANKING_CHART_TOP_CITIES]].fillna(0)
+                fig_shift = go.Figure(go.Heatmap(
+                    z=heatmap_rows.to_numpy(),
+                    x=band_labels,
+                    y=heatmap_rows.index.astype(str),
+                    colorscale='RdBu',
+                    zmid=0,
+                    text=heatmap_rows.to_numpy(),
+                    texttemplate='%{text:+.1f}',
+                    colorbar=dict(title='百分点')
+                ))
+                fig_shift.update_layout(
+                    title=f'项目数量档位占比变化（2025年-2024年，总业绩前{len(heatmap_rows)}的{dimension}）',
+                    yaxis=dict(autorange='reversed'),
+                    height=max(400, len(heatmap_rows) * 22),
+                    plot_bgcolor='#E3EAF3',
+                    paper_bgcolor='#E3EAF3',
+                    font=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=16)
+                )
+                render_chart(fig_shift)
+
+                with st.expander(f"查看全部{dimension}的分档明细"):
+                    band_detail = band_summary.copy()
+                    band_detail.columns = [f'{year}年{band}{measure}' for measure, year, band in band_detail.columns]
+                    shift_columns = count_shift.add_suffix('项目数占比变化(百分点)')
+                    st.dataframe(
+                        pd.concat([band_detail, shift_columns], axis=1).loc[total_amount.index],
+                        use_container_width=True
+                    )
+
+        # 项目业绩分位数：由入库时生成的分位数草图估计，任意城市、一级业态、年份组合都只合并桶计数，不重新扫描明细
+        st.markdown("#### 📈 项目业绩分位数")
+        st.caption(f"平均值会被少数超大项目拉高，中位数和P90更能反映项目业绩的分布；分位数的相对误差不超过{QUANTILE_SKETCH_ALPHA:.0%}")
+
+        with profiler.stage('等待后台计算'):
+            city_value_quantiles = section_graph.result('城市项目业绩分位数')
+            quantile_city_totals = section_graph.result('城市汇总')
+
+        quantile_table = pd.DataFrame({
+            '2024年平均': quantile_city_totals[2024]['业绩金额'] / quantile_city_totals[2024]['项目数量'],
+            '2025年平均': quantile_city_totals[2025]['业绩金额'] / quantile_city_totals[2025]['项目数量'],
+            '2024年中位数': city_value_quantiles[(2024, 'P50')],
+            '2025年中位数': city_value_quantiles[(2025, 'P50')],
+            '2024年P90': city_value_quantiles[(2024, 'P90')],
+            '2025年P90': city_value_quantiles[(2025, 'P90')],
+        })
+        quantile_table['中位数变化率(%)'] = (quantile_table['2025年中位数'] / quantile_table['2024年中位数'] - 1) * 100
+        quantile_total_amount = (
+            quantile_city_totals[2024]['业绩金额'].add(quantile_city_totals[2025]['业绩金额'], fill_value=0)
+        ).sort_values(ascending=False)
+        quantile_table = quantile_table.loc[quantile_total_amount.index]
+
+        quantile_chart_rows = quantile_table.head(RANKING_CHART_TOP_CITIES)
+        fig_quantiles = go.Figure()
+        for year, color in ((2024, '#3498db'), (2025, '#e74c3c')):
+            fig_quantiles.add_trace(go.Bar(
+                name=f'{year}年中位数',
+                x=quantile_chart_rows.index.astype(str),
+                y=quantile_chart_rows[f'{year}年中位数'],
+                marker_color=color
+            ))
+            fig_quantiles.add_trace(go.Scatter(
+                name=f'{year}年P90',
+                x=quantile_chart_rows.index.astype(str),
+                y=quantile_chart_rows[f'{year}年P90'],
+                mode='markers',
+                marker=dict(color=color, symbol='diamond', size=9, line=dict(width=1, color='white'))
+            ))
+        fig_quantiles.update_layout(
+            title=f'各城市项目业绩中位数与P90（总业绩前{len(quantile_chart_rows)}的城市）',
+            barmode='group',
+            yaxis=dict(title='项目业绩（万元，对数刻度）', type='log'),
+            height=450,
+            plot_bgcolor='#E3EAF3',
+            paper_bgcolor='#E3EAF3',
+            font=dict(color='#1B4965', size=12),
+            title_font=dict(color='#1B4965', size=16)
+        )
+        render_chart(fig_quantiles)
+
+        with st.expander("查看全部城市的项目业绩分位数"):
+            st.dataframe(
+                quantile_table.style.format({
+                    column: '{:+.1f}' if '变化' in column else '{:,.1f}' for column in quantile_table.columns
+                }, na_rep='-'),
+                use_container_width=True
+            )
+
+        @st.fragment
+        def render_quantile_query():
+            # 筛选只触发本片段重跑：从两年的草图中取出选中的单元格合并后估计分位数
+            query_columns = st.columns(3)
+            with query_columns[0]:
+                sketch_cities = sorted(set(quantile_sketches[2024].index.get_level_values('城市').dropna())
+                                       | set(quantile_sketches[2025].index.get_level_values('城市').dropna()))
+                selected_cities = st.multiselect(
+                    "城市（不选为全部城市）", sketch_cities,
+                    default=[city for city in key_city_list if city in sketch_cities], key='quantile_query_cities'
+                )
+            with query_columns[1]:
+                sketch_formats = sorted(set(quantile_sketches[2024].index.get_level_values('一级业态').dropna())
+                                        | set(quantile_sketches[2025].index.get_level_values('一级业态').dropna()))
+                selected_formats = st.multiselect("一级业态（不选为全部业态）", sketch_formats, key='quantile_query_formats')
+            with query_columns[2]:
+                selected_years = st.multiselect("年份", [2024, 2025], default=[2024, 2025], key='quantile_query_years')
+
+            selected_sketches = {}
+            for year in selected_years:
+                sketch = quantile_sketches[year]
+                mask = np.ones(len(sketch), dtype=bool)
+                if selected_cities:
+                    mask &= sketch.index.get_level_values('城市').isin(selected_cities)
+                if selected_formats:
+                    mask &= sketch.index.get_level_values('一级业态').isin(selected_formats)
+                selected_sketches[f'{year}年'] = sketch[mask]
+            if len(selected_years) > 1:
+                selected_sketches['合并'] = merge_quantile_sketches(list(selected_sketches.values()))
+
+            query_rows = {}
+            for label, sketch in selected_sketches.items():
+                if sketch.sum() > 0:
+                    query_rows[label] = {'项目数': sketch.sum(), **sketch_quantiles(sketch, SKETCH_QUANTILES).iloc[0].to_dict()}
+            if not query_rows:
+                st.info("所选范围内没有项目")
+                return
+            query_result = pd.DataFrame(query_rows).T
+            st.dataframe(
+                query_result.style.format({
+                    column: '{:,.0f}' if column == '项目数' else '{:,.1f}' for column in query_result.columns
+                }),
+                use_container_width=True
+            )
+
+        render_quantile_query()
+
+    
+    
+    def render_city_performance_section():
+        """四.城市业绩分析"""
+        profiler.begin('四.城市业绩分析')
+        st.subheader("四. 城市业绩分析")
+
+        # 城市分群概览：各分群的业绩、增长和结构特征
+        if city_segments is not None:
+            st.write("#### 🧩 城市分群")
+            with profiler.stage('等待后台计算'):
+                segment_totals = section_graph.result('城市分群汇总')
+            segment_names = list(city_segments.cat.categories)
+            segment_codes = city_segments.cat.codes.to_numpy()
+            format_shares, platform_shares = city_features['占比']['一级业态占比'], city_features['占比']['业绩平台占比']
+
+            segment_rows = []
+            for code, segment in enumerate(segment_names):
+                members = segment_codes == code
+                if not members.any():
+                    continue
+                member_totals = city_features['总业绩'][members]
+                segment_2024 = segment_totals[2024]['业绩金额'].get(segment, 0)
+                segment_2025 = segment_totals[2025]['业绩金额'].get(segment, 0)
+                # 分群的主要业态和平台按成员城市的业绩加权占比取最大者
+                segment_rows.append({
+                    '分群': segment,
+                    '城市数': int(members.sum()),
+                    '2024年业绩': segment_2024,
+                    '2025年业绩': segment_2025,
+                    '增长率(%)': (segment_2025 / segment_2024 - 1) * 100 if segment_2024 > 0 else np.nan,
+                    '主要业态': (format_shares[members].T @ member_totals).idxmax() if len(format_shares.columns) > 0 else '-',
+                    '主要平台': (platform_shares[members].T @ member_totals).idxmax() if len(platform_shares.columns) > 0 else '-',
+                    '代表城市': '、'.join(city_segments.index[members][np.argsort(-member_totals, kind='stable')[:3]].astype(str)),
+                })
+            segment_overview = pd.DataFrame(segment_rows)
+
+            col_segment_chart, col_segment_table = st.columns([1, 2])
+            with col_segment_chart:
+                fig_segments = go.Figure()
+                for year, color in ((2024, '#C0C0C0'), (2025, '#825D48')):
+                    fig_segments.add_trace(go.Bar(
+                        name=f'{year}年业绩',
+                        x=segment_overview['分群'],
+                        y=segment_overview[f'{year}年业绩'],
+                        marker_color=color
+                    ))
+                fig_segments.update_layout(
+                    title=f"各分群业绩（{len(segment_overview)}个分群，聚类特征：{'、'.join(city_segment_settings[1])}）",
+                    title_font=dict(color='#1B4965', size=14),
+                    barmode='group',
+                    yaxis=dict(title='业绩金额', tickfont=dict(color='#1B4965', size=12)),
+                    xaxis=dict(tickfont=dict(color='#1B4965', size=12)),
+                    height=400,
+                    plot_bgcolor='#E3EAF3',
+                    paper_bgcolor='#E3EAF3'
+                )
+                render_chart(fig_segments)
+            with col_segment_table:
+                st.dataframe(
+                    segment_overview.style.format({
+                        '2024年业绩': '{:,.0f}', '2025年业绩': '{:,.0f}', '增长率(%)': '{:+.1f}',
+                    }, na_rep='-'),
+                    use_container_width=True, hide_index=True
+                )
+            if key_city_source != '固定名单':
+                st.info(f"当前重点城市名单为{key_city_source}的{len(key_city_list)}个城市，可在侧边栏“🧩 城市分群”中切换回固定名单")
+
+            with st.expander("查看各城市所属分群"):
+                st.dataframe(
+                    pd.DataFrame({
+                        '城市分群': city_segments,
+                        '总业绩': city_features['总业绩'],
+                    }, index=city_segments.index).sort_values(['城市分群', '总业绩'], ascending=[True, False]),
+                    use_container_width=True
+                )
+
+        # 定义重点城市列表
+        key_cities = key_city_list
 
+        # 基于您的数据结构计算重点城市业绩数据
+        city_performance = []
+        cities_without_data = []  # 记录没有业绩数据的城市
 
+        city_totals = section_graph.result('城市汇总')
+        city_totals_2024 = city_totals[2024]['业绩金额']
+        city_totals_2025 = city_totals[2025]['业绩金额']
 
+        for city in key_cities:
+            # 分别从2024年和2025年数据集中获取该城市的业绩
+            city_2024 = city_totals_2024.get(city, 0)
+            city_2025 = city_totals_2025.get(city, 0)
+        
+            # 检查是否有业绩数据
+            if city_2024 == 0 and city_2025 == 0:
+                cities_without_data.append(city)
+                continue  # 跳过没有数据的城市
+        
+            # 计算增长率
+            if city_2024 > 0:
+                growth_rate = ((city_2025 - city_2024) / city_2024) * 100
+            else:
+                growth_rate = 0 if city_2025 == 0 else 100  # 新兴城市设为100%
+        
+            # 计算总业绩
+            total_performance = city_2024 + city_2025
+        
+            city_performance.append({
+                '城市': city,
+                '2024年业绩': city_2024,
+                '2025年业绩': city_2025,
+                '总业绩': total_performance,
+                '增长率': growth_rate
+            })
 
-    cities_with_2024_data = df_all[df_all['年份'] == 2024]['城市'].unique()
-    filtered_cities_data = df_all[df_all['城市'].isin(cities_with_2024_data)]
-    
-    # 项目质量下降分析
-    st.markdown("---")
-    st.subheader("三.项目质量下降分析")
+        # 转换为DataFrame并按总业绩排序
+        city_df = pd.DataFrame(city_performance)
+        city_df = city_df.sort_values('总业绩', ascending=False)
 
-    # 筛选出在24年有业绩的城市
-    cities_with_2024_data = df_all[df_all['年份'] == 2024]['城市'].unique()
-    filtered_cities_data = df_all[df_all['城市'].isin(cities_with_2024_data)]
+        # 显示没有业绩数据的重点城市
+        if cities_without_data:
+            st.warning(f"以下重点城市2024年和2025年上半年均无业绩数据：{', '.join(cities_without_data)}")
 
-    # 计算每个城市每年的项目数量和总业绩
-    city_stats = filtered_cities_data.groupby(['城市', '年份']).agg({
-        '业绩金额': ['sum', 'count', 'mean']
-    }).reset_index()
+        # 检查是否有数据可以显示
+        if len(city_df) == 0:
+            st.warning("所有重点城市均无业绩数据")
+        else:
+            # 计算平均增长率
+            avg_growth_rate = city_df['增长率'].mean()
 
-    city_stats.columns = ['城市', '年份', '总业绩', '项目数量', '平均项目业绩']
+            # 创建图表
+            fig = go.Figure()
 
-    # 计算每个城市的总业绩（用于排序）
-    city_total_performance = city_stats.groupby('城市')['总业绩'].sum().reset_index()
-    city_total_performance = city_total_performance.sort_values('总业绩', ascending=False)
+            # 添加2024年业绩柱状图
+            fig.add_trace(go.Bar(
+                name='2024年业绩',
+                x=city_df['城市'],
+                y=city_df['2024年业绩'],
+                marker_color='#C0C0C0',
+                # text=city_df['2024年业绩'].apply(lambda x: f'{x:,.0f}'),
+                # textposition='outside',
+                # textfont=dict(size=10, color='white'),
+                yaxis='y'
+            ))
 
-    # 重新排序城市数据
-    city_stats['城市'] = pd.Categorical(city_stats['城市'], categories=city_total_performance['城市'], ordered=True)
-    city_stats = city_stats.sort_values(['城市', '年份'])
+            # 添加2025年业绩柱状图
+            fig.add_trace(go.Bar(
+                name='2025年业绩',
+                x=city_df['城市'],
+                y=city_df['2025年业绩'],
+                marker_color='#825D48',
+                # text=city_df['2025年业绩'].apply(lambda x: f'{x:,.0f}'),
+                # textposition='outside',
+                # textfont=dict(size=10, color='white'),
+                yaxis='y'
+            ))
 
-    # 计算平均项目业绩下降率
-    decline_rates = {}
-    for city in cities_with_2024_data:
-        city_data = city_stats[city_stats['城市'] == city]
-        avg_2024 = city_data[city_data['年份'] == 2024]['平均项目业绩'].values
-        avg_2025 = city_data[city_data['年份'] == 2025]['平均项目业绩'].values
-        
-        if len(avg_2024) > 0 and len(avg_2025) > 0:
-            decline_rate = ((avg_2025[0] - avg_2024[0]) / avg_2024[0]) * 100
-            decline_rates[city] = decline_rate
-        elif len(avg_2024) > 0:
-            decline_rates[city] = -100  # 2025年无数据，视为完全下降
-
-    # 创建两列布局
-    col_chart, col_analysis = st.columns([2, 1])
-
-    with col_chart:
-        # 创建分组柱状图加折线图
-        fig_quality = make_subplots(
-            specs=[[{"secondary_y": True}]],
-            # subplot_titles=("城市项目质量对比分析",）
-        )
-        
-        # 添加分组柱状图
-        cities_ordered = city_total_performance['城市'].tolist()
-        
-        # 2024年数据
-        data_2024 = city_stats[city_stats['年份'] == 2024].set_index('城市').reindex(cities_ordered)
-        fig_quality.add_trace(
-            go.Bar(
-                name='2024年平均项目业绩',
-                x=cities_ordered,
-                y=data_2024['平均项目业绩'].fillna(0),
-                marker_color='#4ECDC4',
-                text=[f'{val:.1f}万' for val in data_2024['平均项目业绩'].fillna(0)],
-                textposition='outside',
-                yaxis='y1'
-            ),
-            secondary_y=False
-        )
-        
-        # 2025年数据
-        data_2025 = city_stats[city_stats['年份'] == 2025].set_index('城市').reindex(cities_ordered)
-        fig_quality.add_trace(
-            go.Bar(
-                name='2025年平均项目业绩',
-                x=cities_ordered,
-                y=data_2025['平均项目业绩'].fillna(0),
-                marker_color='#FF8C94',
-                text=[f'{val:.1f}万' for val in data_2025['平均项目业绩'].fillna(0)],
-                textposition='outside',
-                yaxis='y1'
-            ),
-            secondary_y=False
-        )
-        
-        # 添加折线图（下降率）
-        decline_values = [decline_rates.get(city, 0) for city in cities_ordered]
-        fig_quality.add_trace(
-            go.Scatter(
-                name='平均项目业绩变化率',
-                x=cities_ordered,
-                y=decline_values,
-                mode='lines+markers',
-                line=dict(color='red', width=3),
-                marker=dict(size=8, color='red'),
-                text=[f'{val:.1f}%' for val in decline_values],
+            # 添加增长率折线图，误差线为自助法置信区间，空心点为不显著的增长
+            with profiler.stage('等待后台计算'):
+                city_intervals = section_graph.result('城市变化置信区间')
+            growth_intervals = city_intervals.reindex(city_df['城市'])
+            growth_significant = growth_intervals['增长率显著'].fillna(False).to_numpy(dtype=bool)
+            fig.add_trace(go.Scatter(
+                name='增长率',
+                x=city_df['城市'],
+                y=city_df['增长率'],
+                mode='lines+markers+text',
+                hovertext=np.where(growth_intervals['项目过少'].fillna(True).to_numpy(dtype=bool), '项目过少，未估计置信区间', ''),
+                marker=dict(
+                    size=8, color='rgba(0,0,0,0.6)',
+                    symbol=np.where(growth_significant, 'circle', 'circle-open'),
+                    line=dict(width=2, color='rgba(0,0,0,0.6)')
+                ),
+                error_y=dict(
+                    type='data', symmetric=False,
+                    array=np.nan_to_num(growth_intervals['增长率上限(%)'].to_numpy() - city_df['增长率'].to_numpy()),
+                    arrayminus=np.nan_to_num(city_df['增长率'].to_numpy() - growth_intervals['增长率下限(%)'].to_numpy()),
+                    color='rgba(0,0,0,0.3)', thickness=1.5
+                ),
+                line=dict(color='rgba(0,0,0,0.6)', width=3),
+                text=city_df['增长率'].apply(lambda x: f'{int(x)}%'),  # 修改为显示整数部分
                 textposition='top center',
+                textfont=dict(size=12, color='#1B4965'),
                 yaxis='y2'
+            ))
+
+            # 构建标题，包含没有数据的城市信息
+            chart_title = '重点城市业绩分析'
+            if cities_without_data:
+                chart_title += f'<br><sub>上半年无业绩数据的重点城市：{", ".join(cities_without_data)}</sub>'
+            # 更新布局 - 调整为深色主题
+            # 更新布局 - 调整为深色主题
+            fig.update_layout(
+            title=chart_title,
+            title_font=dict(color='#1B4965', size=16),  # 深色标题
+            xaxis_title='城市',
+            xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
+            yaxis=dict(
+                title='业绩金额',
+                side='left',
+                tickformat=',.',
+                title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                zerolinecolor='#F6F8FA',
+                dtick=5000  # 零轴线颜色与网格线一致
+            ),
+            yaxis2=dict(
+                title='增长率 (%)',
+                side='right',
+                overlaying='y',
+                tickformat='.1f',
+                title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
+            ),
+            xaxis=dict(
+                title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                showgrid=False,  # 隐藏x轴网格线
+                zerolinecolor='#F6F8FA'
             ),
-            secondary_y=True
-        )
-        
-        # 更新图表布局
-        fig_quality.update_layout(
-            
-            xaxis_title='城市（按总业绩排序）',
             barmode='group',
-            height=680,
-            template='plotly_white',
+            height=600,
+            showlegend=True,
             legend=dict(
                 orientation="h",
                 yanchor="bottom",
                 y=1.02,
                 xanchor="right",
-                x=1
-            )
+                x=1,
+                font=dict(color='#1B4965', size=12)  # 深色图例文字
+            ),
+            font=dict(size=12, color='#1B4965'),  # 深色字体
+            plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
+            paper_bgcolor='#E3EAF3'  # 与PPT背景完全一致
         )
+
+       
+        
+        
+       
+        
         
-        # 设置Y轴标签
-        fig_quality.update_yaxes(title_text="平均项目业绩 (万元)", secondary_y=False)
-        fig_quality.update_yaxes(title_text="变化率 (%)", secondary_y=True)
-        
-        st.plotly_chart(fig_quality, use_container_width=True)
-
-    with col_analysis:
-        st.markdown("#### 📊 项目质量分析")
-        
-        # 计算总体平均项目业绩
-        total_avg_2024 = city_stats[city_stats['年份'] == 2024]['平均项目业绩'].mean()
-        total_avg_2025 = city_stats[city_stats['年份'] == 2025]['平均项目业绩'].mean()
-        overall_avg = city_stats['平均项目业绩'].mean()
-        overall_decline = ((total_avg_2025 - total_avg_2024) / total_avg_2024) * 100 if total_avg_2024 > 0 else 0
-        
-        # st.markdown("**总体平均项目业绩对比：**")
-        # st.info(f"""
-        # - 总体平均: {overall_avg:.1f}万元
-        # - 2024年平均: {total_avg_2024:.1f}万元  
-        # - 2025年平均: {total_avg_2025:.1f}万元
-        # - 总体变化率: {overall_decline:.1f}%
-        # """)
-        
-        # 找出下降率最大的三个城市（排除-100%的城市）
-        filtered_decline_rates = {city: rate for city, rate in decline_rates.items() if rate != -100 and rate < 0}
-        decline_sorted = sorted(filtered_decline_rates.items(), key=lambda x: x[1])[:3]
-        
-        st.markdown("**平均项目业绩下降率最大的城市：**")
-        for i, (city, decline_rate) in enumerate(decline_sorted, 1):
-            city_2024_avg = city_stats[(city_stats['城市'] == city) & (city_stats['年份'] == 2024)]['平均项目业绩'].values
-            city_2025_avg = city_stats[(city_stats['城市'] == city) & (city_stats['年份'] == 2025)]['平均项目业绩'].values
-            
-            avg_2024_str = f"{city_2024_avg[0]:.1f}万" if len(city_2024_avg) > 0 else "无数据"
-            avg_2025_str = f"{city_2025_avg[0]:.1f}万" if len(city_2025_avg) > 0 else "无数据"
-            
-            st.markdown(f"""
-            **{i}. {city}**
-            - 下降率: {decline_rate:.1f}%
-            - 2024年: {avg_2024_str}
-            - 2025年: {avg_2025_str}
-            """)
 
-    
-    
-    st.subheader("四. 城市业绩分析")
+            # 显示图表
+            render_chart(fig)
 
-    # 定义重点城市列表
-    key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+            not_significant = city_df.loc[~growth_significant & growth_intervals['增长率下限(%)'].notna().to_numpy(), '城市']
+            too_few_cities = city_df.loc[growth_intervals['项目过少'].fillna(True).to_numpy(dtype=bool), '城市']
+            st.caption(
+                f"误差线为增长率的{BOOTSTRAP_CONFIDENCE:.0%}自助法置信区间（{BOOTSTRAP_RESAMPLES}次重抽样），空心点表示置信区间包含0"
+                + (f"；{'、'.join(not_significant)}的增长率不显著" if len(not_significant) > 0 else "")
+                + (f"；{'、'.join(too_few_cities)}项目过少（任一年少于{BOOTSTRAP_MIN_PROJECTS}个），未估计置信区间，不宜与其他城市直接比较"
+                   if len(too_few_cities) > 0 else "")
+            )
 
-    # 基于您的数据结构计算重点城市业绩数据
-    city_performance = []
-    cities_without_data = []  # 记录没有业绩数据的城市
+            with st.expander("查看全部城市增长率和平均项目业绩变化率的置信区间"):
+                interval_table = city_intervals.loc[
+                    city_totals_2024.add(city_totals_2025, fill_value=0).sort_values(ascending=False).index.intersection(
+                        city_intervals.index, sort=False
+                    )
+                ]
+                st.dataframe(
+                    interval_table.style.format({
+                        column: '{:+.1f}' for column in interval_table.columns if column.endswith('(%)')
+                    }, na_rep='-'),
+                    use_container_width=True
+                )
 
-    for city in key_cities:
-        # 分别从2024年和2025年数据集中获取该城市的业绩
-        city_2024 = df_2024[df_2024['城市'] == city]['业绩金额'].sum()
-        city_2025 = df_2025[df_2025['城市'] == city]['业绩金额'].sum()
-        
-        # 检查是否有业绩数据
-        if city_2024 == 0 and city_2025 == 0:
-            cities_without_data.append(city)
-            continue  # 跳过没有数据的城市
-        
-        # 计算增长率
-        if city_2024 > 0:
-            growth_rate = ((city_2025 - city_2024) / city_2024) * 100
-        else:
-            growth_rate = 0 if city_2025 == 0 else 100  # 新兴城市设为100%
-        
-        # 计算总业绩
-        total_performance = city_2024 + city_2025
         
-        city_performance.append({
-            '城市': city,
-            '2024年业绩': city_2024,
-            '2025年业绩': city_2025,
-            '总业绩': total_performance,
-            '增长率': growth_rate
-        })
+            # 添加关键洞察
+            st.write("### 🔍 关键洞察")
 
-    # 转换为DataFrame并按总业绩排序
-    city_df = pd.DataFrame(city_performance)
-    city_df = city_df.sort_values('总业绩', ascending=False)
+        col1, col2, col3, col4 = st.columns(4)
 
-    # 显示没有业绩数据的重点城市
-    if cities_without_data:
-        st.warning(f"以下重点城市2024年和2025年上半年均无业绩数据：{', '.join(cities_without_data)}")
+        with col1:
+            top_city = city_df.iloc[0]
+            st.metric("业绩最高城市", top_city['城市'], f"{top_city['总业绩']:,.0f}")
 
-    # 检查是否有数据可以显示
-    if len(city_df) == 0:
-        st.warning("所有重点城市均无业绩数据")
-    else:
-        # 计算平均增长率
-        avg_growth_rate = city_df['增长率'].mean()
+        with col2:
+            max_growth_city = city_df.loc[city_df['增长率'].idxmax()]
+            st.metric("增长率最高城市", max_growth_city['城市'], f"{max_growth_city['增长率']:.1f}%")
 
-        # 创建图表
-        fig = go.Figure()
+        with col3:
+            positive_growth_cities = len(city_df[city_df['增长率'] > 0])
+            st.metric("增长城市数量", f"{positive_growth_cities}/{len(city_df)}")
 
-        # 添加2024年业绩柱状图
-        fig.add_trace(go.Bar(
-            name='2024年业绩',
-            x=city_df['城市'],
-            y=city_df['2024年业绩'],
-            marker_color='#C0C0C0',
-            # text=city_df['2024年业绩'].apply(lambda x: f'{x:,.0f}'),
-            # textposition='outside',
-            # textfont=dict(size=10, color='white'),
-            yaxis='y'
-        ))
+        with col4:
+            st.metric("平均增长率", f"{avg_growth_rate:.1f}%")
 
-        # 添加2025年业绩柱状图
-        fig.add_trace(go.Bar(
-            name='2025年业绩',
-            x=city_df['城市'],
-            y=city_df['2025年业绩'],
-            marker_color='#825D48',
-            # text=city_df['2025年业绩'].apply(lambda x: f'{x:,.0f}'),
-            # textposition='outside',
-            # textfont=dict(size=10, color='white'),
-            yaxis='y'
-        ))
+        # 分析不同增长表现的城市
+        st.write("### 📈 城市增长表现分析")
 
-        # 添加增长率折线图
-        fig.add_trace(go.Scatter(
-            name='增长率',
-            x=city_df['城市'],
-            y=city_df['增长率'],
-            mode='lines+markers+text',
-            
-            marker=dict(size=8, color='rgba(0,0,0,0.6)'),
-            line=dict(color='rgba(0,0,0,0.6)', width=3),
-            text=city_df['增长率'].apply(lambda x: f'{int(x)}%'),  # 修改为显示整数部分
-            textposition='top center',
-            textfont=dict(size=12, color='#1B4965'),
-            yaxis='y2'
-        ))
+        high_growth_cities = city_df[city_df['增长率'] > avg_growth_rate]
+        low_growth_cities = city_df[city_df['增长率'] <= avg_growth_rate]
 
-        # 构建标题，包含没有数据的城市信息
-        chart_title = '重点城市业绩分析'
-        if cities_without_data:
-            chart_title += f'<br><sub>上半年无业绩数据的重点城市：{", ".join(cities_without_data)}</sub>'
-        # 更新布局 - 调整为深色主题
-        # 更新布局 - 调整为深色主题
-        fig.update_layout(
-        title=chart_title,
-        title_font=dict(color='#1B4965', size=16),  # 深色标题
-        xaxis_title='城市',
-        xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
-        yaxis=dict(
-            title='业绩金额',
-            side='left',
-            tickformat=',.',
-            title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-            tickfont=dict(color='#1B4965', size=12),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            zerolinecolor='#F6F8FA',
-            dtick=5000  # 零轴线颜色与网格线一致
-        ),
-        yaxis2=dict(
-            title='增长率 (%)',
-            side='right',
-            overlaying='y',
-            tickformat='.1f',
-            title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-            tickfont=dict(color='#1B4965', size=12),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
-        ),
-        xaxis=dict(
-            title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-            tickfont=dict(color='#1B4965', size=12),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            showgrid=False,  # 隐藏x轴网格线
-            zerolinecolor='#F6F8FA'
-        ),
-        barmode='group',
-        height=600,
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1,
-            font=dict(color='#1B4965', size=12)  # 深色图例文字
-        ),
-        font=dict(size=12, color='#1B4965'),  # 深色字体
-        plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
-        paper_bgcolor='#E3EAF3'  # 与PPT背景完全一致
-    )
+        col1, col2 = st.columns(2)
 
-       
-        
-        
-       
-        
-        
+        with col1:
+            st.write("**🚀 高于平均增长率的城市:**")
+            if len(high_growth_cities) > 0:
+                for _, row in high_growth_cities.iterrows():
+                    st.write(f"• **{row['城市']}**: {row['增长率']:.1f}% (总业绩: {row['总业绩']:,.0f})")
+            else:
+                st.write("暂无城市高于平均增长率")
 
-        # 显示图表
-        st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            st.write("**📊 低于平均增长率的城市:**")
+            st.write("其余城市")
+            # if len(low_growth_cities) > 0:
+            #     for _, row in low_growth_cities.iterrows():
+            #         st.write(f"• **{row['城市']}**: {row['增长率']:.1f}% (总业绩: {row['总业绩']:,.0f})")
+            # else:
+            #     st.write("所有城市均高于平均增长率")
+    
 
-        
-        # 添加关键洞察
-        st.write("### 🔍 关键洞察")
 
-    col1, col2, col3, col4 = st.columns(4)
+    def render_city_ranking_section():
+        """城市业绩排名变化分析"""
+        profiler.begin('城市业绩排名变化分析')
+        # 城市业绩排名变化分析：排名和等级按当年全部城市的业绩计算
+        st.subheader("🎯 城市业绩排名变化分析")
 
-    with col1:
-        top_city = city_df.iloc[0]
-        st.metric("业绩最高城市", top_city['城市'], f"{top_city['总业绩']:,.0f}")
+        # 等级分区线和说明按2025年（当前等级）的排名上限
+        ranking_df, grade_thresholds = section_graph.result('城市业绩排名变化')
+        s_threshold, a_threshold, b_threshold = grade_thresholds[2025]
+        cities_with_change = ranking_df[ranking_df['排名变化'].notna()]
 
-    with col2:
-        max_growth_city = city_df.loc[city_df['增长率'].idxmax()]
-        st.metric("增长率最高城市", max_growth_city['城市'], f"{max_growth_city['增长率']:.1f}%")
+        chart_cities = ranking_df.nlargest(RANKING_CHART_TOP_CITIES, '总业绩')
+        render_chart(build_ranking_dumbbell(
+            chart_cities, (s_threshold, a_threshold, b_threshold),
+            f'城市业绩排名变化分析（哑铃图，总业绩前{len(chart_cities)}名城市）'
+        ))
 
-    with col3:
-        positive_growth_cities = len(city_df[city_df['增长率'] > 0])
-        st.metric("增长城市数量", f"{positive_growth_cities}/{len(city_df)}")
+        # 分析城市等级变化
+        st.write("### 🏆 城市等级分析")
 
-    with col4:
-        st.metric("平均增长率", f"{avg_growth_rate:.1f}%")
+        # 显示等级分布
+        col1, col2, col3, col4 = st.columns(4)
 
-    # 分析不同增长表现的城市
-    st.write("### 📈 城市增长表现分析")
+        grade_counts = ranking_df['等级'].value_counts()
+        with col1:
+            st.metric("S级城市", grade_counts.get('S', 0), help=f"2025年业绩排名前{s_threshold}名（前25%）")
+        with col2:
+            st.metric("A级城市", grade_counts.get('A', 0), help=f"2025年业绩排名前{a_threshold}名（前50%）")
+        with col3:
+            st.metric("B级城市", grade_counts.get('B', 0), help=f"2025年业绩排名前{b_threshold}名（前75%）")
+        with col4:
+            st.metric("C级城市", grade_counts.get('C', 0), help=f"2025年业绩排名{b_threshold}名之后")
+
+        # 等级迁移矩阵：行为2024年等级，列为2025年等级，N/A表示当年无业绩
+        grade_order = ['S', 'A', 'B', 'C', 'N/A']
+        grade_migration = pd.crosstab(ranking_df['2024年等级'], ranking_df['2025年等级']).reindex(
+            index=grade_order, columns=grade_order, fill_value=0
+        )
+        grade_migration.index.name = '2024年等级'
+        grade_migration.columns.name = '2025年等级'
+        st.write("**🔀 等级迁移（城市数）**")
+        st.dataframe(grade_migration, use_container_width=True)
 
-    high_growth_cities = city_df[city_df['增长率'] > avg_growth_rate]
-    low_growth_cities = city_df[city_df['增长率'] <= avg_growth_rate]
+        # 分析排名变化最大的城市（排名表已按排名变化降序排列）
+        st.write("### 📈 排名变化分析")
 
-    col1, col2 = st.columns(2)
+        top_risers = cities_with_change[cities_with_change['排名变化'] > 0].head(3)
+        top_fallers = cities_with_change[cities_with_change['排名变化'] < 0].iloc[::-1].head(3)
 
-    with col1:
-        st.write("**🚀 高于平均增长率的城市:**")
-        if len(high_growth_cities) > 0:
-            for _, row in high_growth_cities.iterrows():
-                st.write(f"• **{row['城市']}**: {row['增长率']:.1f}% (总业绩: {row['总业绩']:,.0f})")
-        else:
-            st.write("暂无城市高于平均增长率")
+        col1, col2 = st.columns(2)
 
-    with col2:
-        st.write("**📊 低于平均增长率的城市:**")
-        st.write("其余城市")
-        # if len(low_growth_cities) > 0:
-        #     for _, row in low_growth_cities.iterrows():
-        #         st.write(f"• **{row['城市']}**: {row['增长率']:.1f}% (总业绩: {row['总业绩']:,.0f})")
-        # else:
-        #     st.write("所有城市均高于平均增长率")
-    
+        with col1:
+            st.write("**🚀 排名上升最多的城市:**")
+            if len(top_risers) > 0:
+                for _, row in top_risers.iterrows():
+                    st.write(f"• **{row['城市']}** ({row['等级']}级): 上升 {row['排名变化']} 位")
+                    st.write(f"  📊 {row['2024年排名']}名 → {row['2025年排名']}名")
+            else:
+                st.write("暂无排名上升的城市")
 
+        with col2:
+            st.write("**📉 排名下降最多的城市:**")
+            if len(top_fallers) > 0:
+                for _, row in top_fallers.iterrows():
+                    st.write(f"• **{row['城市']}** ({row['等级']}级): 下降 {abs(row['排名变化'])} 位")
+                    st.write(f"  📊 {row['2024年排名']}名 → {row['2025年排名']}名")
+            else:
+                st.write("暂无排名下降的城市")
 
-    # 城市业绩排名变化分析
-    # st.subheader("🎯 城市业绩排名变化分析")
-
-    # import plotly.graph_objects as go
-    # import numpy as np
-
-    # # 计算2024年和2025年的排名
-    # city_ranking_2024 = df_2024.groupby('城市')['业绩金额'].sum().sort_values(ascending=False)
-    # city_ranking_2025 = df_2025.groupby('城市')['业绩金额'].sum().sort_values(ascending=False)
-
-    # # 创建排名数据
-    # ranking_data = []
-    # for city in city_df['城市']:
-    #     # 获取2024年排名
-    #     if city in city_ranking_2024.index:
-    #         rank_2024 = list(city_ranking_2024.index).index(city) + 1
-    #         performance_2024 = city_ranking_2024[city]
-    #     else:
-    #         rank_2024 = len(city_ranking_2024) + 1  # 新城市排在最后
-    #         performance_2024 = 0
-        
-    #     # 获取2025年排名
-    #     if city in city_ranking_2025.index:
-    #         rank_2025 = list(city_ranking_2025.index).index(city) + 1
-    #         performance_2025 = city_ranking_2025[city]
-    #     else:
-    #         rank_2025 = len(city_ranking_2025) + 1
-    #         performance_2025 = 0
-        
-    #     # 获取总业绩
-    #     total_performance = city_df[city_df['城市'] == city]['总业绩'].iloc[0]
-        
-    #     ranking_data.append({
-    #         '城市': city,
-    #         '2024年排名': rank_2024,
-    #         '2025年排名': rank_2025,
-    #         '2024年业绩': performance_2024,
-    #         '2025年业绩': performance_2025,
-    #         '总业绩': total_performance,
-    #         '排名变化': rank_2024 - rank_2025  # 正数表示排名上升
-    #     })
-
-    # # 转换为DataFrame并按总业绩排序
-    # ranking_df = pd.DataFrame(ranking_data)
-    # ranking_df = ranking_df.sort_values('总业绩', ascending=True)  # 从下到上排序
-
-    # # 定义等级分区
-    # total_cities = len(ranking_df)
-    # s_threshold = max(1, total_cities // 4)  # S级：前25%
-    # a_threshold = max(2, total_cities // 2)  # A级：前50%
-    # b_threshold = max(3, total_cities * 3 // 4)  # B级：前75%
-    # # C级：剩余的城市
-
-    # # 为每个城市分配等级
-    # def get_city_grade(rank, total):
-    #     if rank <= s_threshold:
-    #         return 'S'
-    #     elif rank <= a_threshold:
-    #         return 'A'
-    #     elif rank <= b_threshold:
-    #         return 'B'
-    #     else:
-    #         return 'C'
-
-    # # 计算基于总业绩的等级
-    # ranking_df_sorted = ranking_df.sort_values('总业绩', ascending=False)
-    # for i, (idx, row) in enumerate(ranking_df_sorted.iterrows()):
-    #     grade = get_city_grade(i + 1, total_cities)
-    #     ranking_df.loc[idx, '等级'] = grade
-
-    # # 创建哑铃图
-    # fig = go.Figure()
-
-    # # 为每个城市添加连接线
-    # for i, row in ranking_df.iterrows():
-    #     fig.add_trace(go.Scatter(
-    #         x=[row['2024年排名'], row['2025年排名']],
-    #         y=[row['城市'], row['城市']],
-    #         mode='lines',
-    #         line=dict(color='rgba(128, 128, 128, 0.5)', width=2),
-    #         showlegend=False,
-    #         hoverinfo='skip'
-    #     ))
-
-    # # 添加2024年数据点
-    # fig.add_trace(go.Scatter(
-    #     x=ranking_df['2024年排名'],
-    #     y=ranking_df['城市'],
-    #     mode='markers',
-    #     marker=dict(
-    #         color='#3498db',
-    #         size=12,
-    #         symbol='circle',
-    #         line=dict(width=2, color='white')
-    #     ),
-    #     name='2024年排名',
-    #     text=ranking_df.apply(lambda row: f"{row['城市']}<br>2024年排名: {row['2024年排名']}<br>业绩: {row['2024年业绩']:,.0f}", axis=1),
-    #     hovertemplate='%{text}<extra></extra>'
-    # ))
-
-    # # 添加2025年数据点
-    # fig.add_trace(go.Scatter(
-    #     x=ranking_df['2025年排名'],
-    #     y=ranking_df['城市'],
-    #     mode='markers',
-    #     marker=dict(
-    #         color='#e74c3c',
-    #         size=12,
-    #         symbol='circle',
-    #         line=dict(width=2, color='white')
-    #     ),
-    #     name='2025年排名',
-    #     text=ranking_df.apply(lambda row: f"{row['城市']}<br>2025年排名: {row['2025年排名']}<br>业绩: {row['2025年业绩']:,.0f}", axis=1),
-    #     hovertemplate='%{text}<extra></extra>'
-    # ))
-
-    # # 添加等级分区线
-    # max_rank = max(ranking_df['2024年排名'].max(), ranking_df['2025年排名'].max())
-
-    # # S/A分界线
-    # fig.add_vline(x=s_threshold + 0.5, line_dash="dash", line_color="gold", line_width=2, 
-    #             annotation_text="S级", annotation_position="top")
-
-    # # A/B分界线
-    # fig.add_vline(x=a_threshold + 0.5, line_dash="dash", line_color="silver", line_width=2,
-    #             annotation_text="A级", annotation_position="top")
-
-    # # B/C分界线
-    # fig.add_vline(x=b_threshold + 0.5, line_dash="dash", line_color="#cd7f32", line_width=2,
-    #             annotation_text="B级", annotation_position="top")
-
-    # # 更新布局
-    # fig.update_layout(
-    #     title='城市业绩排名变化分析（哑铃图）',
-    #     title_font=dict(color='white', size=16),
-    #     xaxis_title='排名（数字越小排名越高）',
-    #     yaxis_title='城市',
-    #     xaxis=dict(
-    #         title_font=dict(color='white'),
-    #         tickfont=dict(color='white'),
-    #         autorange='reversed',  # 反转x轴，使排名1在右侧
-    #         showgrid=True,
-    #         gridcolor='rgba(255,255,255,0.2)',
-    #         dtick=1
-    #     ),
-    #     yaxis=dict(
-    #         title_font=dict(color='white'),
-    #         tickfont=dict(color='white'),
-    #         showgrid=True,
-    #         gridcolor='rgba(255,255,255,0.2)'
-    #     ),
-    #     height=max(400, len(ranking_df) * 30),  # 根据城市数量调整高度
-    #     showlegend=True,
-    #     legend=dict(
-    #         orientation="h",
-    #         yanchor="bottom",
-    #         y=1.02,
-    #         xanchor="right",
-    #         x=1,
-    #         font=dict(color='white')
-    #     ),
-    #     font=dict(size=12, color='white'),
-    #     plot_bgcolor='rgba(0,0,0,0)',
-    #     paper_bgcolor='rgba(0,0,0,0)'
-    # )
+        # 关键洞察总结
+        st.write("### 💡 关键洞察")
 
-    # st.plotly_chart(fig, use_container_width=True)
-
-    # # 分析城市等级变化
-    # st.write("### 🏆 城市等级分析")
-
-    # # 显示等级分布
-    # col1, col2, col3, col4 = st.columns(4)
-
-    # grade_counts = ranking_df['等级'].value_counts()
-    # with col1:
-    #     st.metric("S级城市", grade_counts.get('S', 0), help="业绩排名前25%")
-    # with col2:
-    #     st.metric("A级城市", grade_counts.get('A', 0), help="业绩排名前50%")
-    # with col3:
-    #     st.metric("B级城市", grade_counts.get('B', 0), help="业绩排名前75%")
-    # with col4:
-    #     st.metric("C级城市", grade_counts.get('C', 0), help="业绩排名后25%")
-
-    # # 分析排名变化最大的城市
-    # st.write("### 📈 排名变化分析")
-
-    # # 排名上升最多的城市
-    # top_risers = ranking_df.nlargest(3, '排名变化')
-    # # 排名下降最多的城市
-    # top_fallers = ranking_df.nsmallest(3, '排名变化')
-
-    # col1, col2 = st.columns(2)
-
-    # with col1:
-    #     st.write("**🚀 排名上升最多的城市:**")
-    #     for _, row in top_risers.iterrows():
-    #         if row['排名变化'] > 0:
-    #             st.write(f"• **{row['城市']}** ({row['等级']}级): 上升 {row['排名变化']} 位")
-    #             st.write(f"  📊 {row['2024年排名']}名 → {row['2025年排名']}名")
-    #         else:
-    #             st.write("暂无排名上升的城市")
-
-    # with col2:
-    #     st.write("**📉 排名下降最多的城市:**")
-    #     for _, row in top_fallers.iterrows():
-    #         if row['排名变化'] < 0:
-    #             st.write(f"• **{row['城市']}** ({row['等级']}级): 下降 {abs(row['排名变化'])} 位")
-    #             st.write(f"  📊 {row['2024年排名']}名 → {row['2025年排名']}名")
-    #         else:
-    #             st.write("暂无排名下降的城市")
+        # 计算一些关键指标
+        stable_cities = int((cities_with_change['排名变化'] == 0).sum())
+        rising_cities = int((cities_with_change['排名变化'] > 0).sum())
+        falling_cities = int((cities_with_change['排名变化'] < 0).sum())
+        single_year_count = len(ranking_df) - len(cities_with_change)
 
-    
-    # # 关键洞察总结
-    # st.write("### 💡 关键洞察")
-
-    # # 计算一些关键指标
-    # stable_cities = len(ranking_df[ranking_df['排名变化'] == 0])
-    # rising_cities = len(ranking_df[ranking_df['排名变化'] > 0])
-    # falling_cities = len(ranking_df[ranking_df['排名变化'] < 0])
-
-    # avg_rank_change = ranking_df['排名变化'].mean()
-
-    # st.write(f"""
-    # - **排名稳定城市**: {stable_cities} 个城市排名保持不变
-    # - **排名上升城市**: {rising_cities} 个城市排名上升
-    # - **排名下降城市**: {falling_cities} 个城市排名下降
-    # - **平均排名变化**: {avg_rank_change:.1f} 位
-    # """)
-
-    # if len(top_risers) > 0 and top_risers.iloc[0]['排名变化'] > 0:
-    #     best_performer = top_risers.iloc[0]
-    #     st.success(f"🏆 **最佳进步奖**: {best_performer['城市']} 排名上升 {best_performer['排名变化']} 位，"
-    #             f"从第{best_performer['2024年排名']}名跃升至第{best_performer['2025年排名']}名！")
-
-    # if len(top_fallers) > 0 and top_fallers.iloc[0]['排名变化'] < 0:
-    #     needs_attention = top_fallers.iloc[0]
-    #     st.warning(f"⚠️ **需要关注**: {needs_attention['城市']} 排名下降 {abs(needs_attention['排名变化'])} 位，"
-    #             f"从第{needs_attention['2024年排名']}名降至第{needs_attention['2025年排名']}名，需要重点关注。")
-    
+        avg_rank_change = cities_with_change['排名变化'].mean() if len(cities_with_change) > 0 else 0
 
+        st.write(f"""
+        - **排名稳定城市**: {stable_cities} 个城市排名保持不变
+        - **排名上升城市**: {rising_cities} 个城市排名上升
+        - **排名下降城市**: {falling_cities} 个城市排名下降
+        - **仅单年有业绩城市**: {single_year_count} 个
+        - **平均排名变化**: {avg_rank_change:.1f} 位
+        """)
 
+        if len(top_risers) > 0:
+            best_performer = top_risers.iloc[0]
+            st.success(f"🏆 **最佳进步奖**: {best_performer['城市']} 排名上升 {best_performer['排名变化']} 位，"
+                    f"从第{best_performer['2024年排名']}名跃升至第{best_performer['2025年排名']}名！")
 
-    
+        if len(top_fallers) > 0:
+            needs_attention = top_fallers.iloc[0]
+            st.warning(f"⚠️ **需要关注**: {needs_attention['城市']} 排名下降 {abs(needs_attention['排名变化'])} 位，"
+                    f"从第{needs_attention['2024年排名']}名降至第{needs_attention['2025年排名']}名，需要重点关注。")
 
-        # 分析城市等级变化
-        # 城市业绩排名变化分析
-    # st.subheader("🎯 重点城市业绩排名变化分析")
-
-    # import plotly.graph_objects as go
-    # import numpy as np
-
-    # # 定义重点城市列表
-    # key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
-
-    # # 计算2024年和2025年的排名（基于所有城市）
-    # city_ranking_2024 = df_2024.groupby('城市')['业绩金额'].sum().sort_values(ascending=False)
-    # city_ranking_2025 = df_2025.groupby('城市')['业绩金额'].sum().sort_values(ascending=False)
-
-    # # 创建排名数据
-    # ranking_data = []
-    # missing_cities = []  # 记录没有业绩的城市
-
-    # for city in key_cities:
-    #     # 获取2024年排名
-    #     if city in city_ranking_2024.index:
-    #         rank_2024 = list(city_ranking_2024.index).index(city) + 1
-    #         performance_2024 = city_ranking_2024[city]
-    #     else:
-    #         rank_2024 = None
-    #         performance_2024 = 0
-        
-    #     # 获取2025年排名
-    #     if city in city_ranking_2025.index:
-    #         rank_2025 = list(city_ranking_2025.index).index(city) + 1
-    #         performance_2025 = city_ranking_2025[city]
-    #     else:
-    #         rank_2025 = None
-    #         performance_2025 = 0
-        
-    #     # 如果该城市在任一年有业绩，则计算总业绩
-    #     if rank_2024 is not None or rank_2025 is not None:
-    #         total_performance = performance_2024 + performance_2025
-            
-    #         # 计算排名变化
-    #         if rank_2024 is not None and rank_2025 is not None:
-    #             rank_change = rank_2024 - rank_2025  # 正数表示排名上升
-    #         else:
-    #             rank_change = None
-            
-    #         ranking_data.append({
-    #             '城市': city,
-    #             '2024年排名': rank_2024,
-    #             '2025年排名': rank_2025,
-    #             '2024年业绩': performance_2024,
-    #             '2025年业绩': performance_2025,
-    #             '总业绩': total_performance,
-    #             '排名变化': rank_change
-    #         })
-    #     else:
-    #         # 记录没有业绩的城市
-    #         missing_cities.append(city)
-
-    # # 转换为DataFrame并按总业绩排序
-    # ranking_df = pd.DataFrame(ranking_data)
-    # ranking_df = ranking_df.sort_values('总业绩', ascending=True)  # 从下到上排序
-
-    # # 定义等级分区（基于所有城市的总数）
-    # total_cities = len(df_all['城市'].unique())
-    # s_threshold = max(1, total_cities // 4)  # S级：前25%
-    # a_threshold = max(2, total_cities // 2)  # A级：前50%
-    # b_threshold = max(3, total_cities * 3 // 4)  # B级：前75%
-
-    # # 为每个城市分配等级
-    # def get_city_grade(rank, total):
-    #     if rank is None:
-    #         return 'N/A'
-    #     elif rank <= s_threshold:
-    #         return 'S'
-    #     elif rank <= a_threshold:
-    #         return 'A'
-    #     elif rank <= b_threshold:
-    #         return 'B'
-    #     else:
-    #         return 'C'
-
-    # # 计算基于当前排名的等级
-    # for i, row in ranking_df.iterrows():
-    #     # 使用2025年排名来确定等级，如果没有2025年数据则使用2024年
-    #     current_rank = row['2025年排名'] if row['2025年排名'] is not None else row['2024年排名']
-    #     grade = get_city_grade(current_rank, total_cities)
-    #     ranking_df.loc[i, '等级'] = grade
-
-    # # 只显示有业绩数据的城市的哑铃图
-    # if len(ranking_df) > 0:
-    #     # 创建哑铃图
-    #     fig = go.Figure()
-
-    #     # 为每个城市添加连接线和数据点
-    #     for i, row in ranking_df.iterrows():
-    #         city_name = row['城市']
-            
-    #         # 检查是否有重叠（排名相同）
-    #         rank_2024 = row['2024年排名']
-    #         rank_2025 = row['2025年排名']
-    #         is_overlap = (rank_2024 is not None and rank_2025 is not None and rank_2024 == rank_2025)
-            
-    #         if rank_2024 is not None and rank_2025 is not None:
-    #             # 添加连接线
-    #             fig.add_trace(go.Scatter(
-    #                 x=[rank_2024, rank_2025],
-    #                 y=[city_name, city_name],
-    #                 mode='lines',
-    #                 line=dict(
-    #                     color='rgba(128, 128, 128, 0.5)' if not is_overlap else 'rgba(255, 215, 0, 0.8)',
-    #                     width=3 if is_overlap else 2
-    #                 ),
-    #                 showlegend=False,
-    #                 hoverinfo='skip'
-    #             ))
-                
-    #             if is_overlap:
-    #                 # 处理重叠情况：创建一个特殊的重叠标记
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2024],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='rgba(255, 215, 0, 0.3)',  # 半透明金色背景
-    #                         size=24,
-    #                         symbol='circle',
-    #                         line=dict(width=3, color='gold')
-    #                     ),
-    #                     name='排名未变' if i == 0 else '',  # 只在第一个重叠点显示图例
-    #                     showlegend=True if i == 0 and is_overlap else False,
-    #                     text=f"{city_name}<br>排名未变: {rank_2024}<br>2024年业绩: {row['2024年业绩']:,.0f}<br>2025年业绩: {row['2025年业绩']:,.0f}",
-    #                     hovertemplate='%{text}<extra></extra>'
-    #                 ))
-                    
-    #                 # 在重叠点上添加双色标记
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2024 - 0.1],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#3498db',
-    #                         size=12,
-    #                         symbol='circle',
-    #                         line=dict(width=1, color='white')
-    #                     ),
-    #                     showlegend=False,
-    #                     hoverinfo='skip'
-    #                 ))
-                    
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2024 + 0.1],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#e74c3c',
-    #                         size=12,
-    #                         symbol='circle',
-    #                         line=dict(width=1, color='white')
-    #                     ),
-    #                     showlegend=False,
-    #                     hoverinfo='skip'
-    #                 ))
-    #             else:
-    #                 # 添加2024年数据点
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2024],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#3498db',
-    #                         size=14,
-    #                         symbol='circle',
-    #                         line=dict(width=2, color='white')
-    #                     ),
-    #                     name='2024年排名' if i == 0 else '',
-    #                     showlegend=True if i == 0 and not is_overlap else False,
-    #                     text=f"{city_name}<br>2024年排名: {rank_2024}<br>业绩: {row['2024年业绩']:,.0f}",
-    #                     hovertemplate='%{text}<extra></extra>'
-    #                 ))
-                    
-    #                 # 添加2025年数据点
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2025],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#e74c3c',
-    #                         size=14,
-    #                         symbol='circle',
-    #                         line=dict(width=2, color='white')
-    #                     ),
-    #                     name='2025年排名' if i == 0 else '',
-    #                     showlegend=True if i == 0 and not is_overlap else False,
-    #                     text=f"{city_name}<br>2025年排名: {rank_2025}<br>业绩: {row['2025年业绩']:,.0f}",
-    #                     hovertemplate='%{text}<extra></extra>'
-    #                 ))
-    #         else:
-    #             # 处理只有一年数据的情况
-    #             if rank_2024 is not None:
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2024],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#3498db',
-    #                         size=14,
-    #                         symbol='circle',
-    #                         line=dict(width=2, color='white')
-    #                     ),
-    #                     name='2024年排名' if i == 0 else '',
-    #                     showlegend=True if i == 0 else False,
-    #                     text=f"{city_name}<br>2024年排名: {rank_2024}<br>业绩: {row['2024年业绩']:,.0f}",
-    #                     hovertemplate='%{text}<extra></extra>'
-    #                 ))
-                
-    #             if rank_2025 is not None:
-    #                 fig.add_trace(go.Scatter(
-    #                     x=[rank_2025],
-    #                     y=[city_name],
-    #                     mode='markers',
-    #                     marker=dict(
-    #                         color='#e74c3c',
-    #                         size=14,
-    #                         symbol='circle',
-    #                         line=dict(width=2, color='white')
-    #                     ),
-    #                     name='2025年排名' if i == 0 else '',
-    #                     showlegend=True if i == 0 else False,
-    #                     text=f"{city_name}<br>2025年排名: {rank_2025}<br>业绩: {row['2025年业绩']:,.0f}",
-    #                     hovertemplate='%{text}<extra></extra>'
-    #                 ))
-
-    #     # 添加等级分区线
-    #     max_rank = max(
-    #         ranking_df['2024年排名'].max() if ranking_df['2024年排名'].notna().any() else 0,
-    #         ranking_df['2025年排名'].max() if ranking_df['2025年排名'].notna().any() else 0
-    #     )
+        with st.expander("查看全部城市排名"):
+            st.dataframe(
+                ranking_df.style.format({'2024年业绩': '{:,.0f}', '2025年业绩': '{:,.0f}', '总业绩': '{:,.0f}'}),
+                use_container_width=True, hide_index=True
+            )
 
-    #     # S/A分界线
-    #     fig.add_vline(x=s_threshold + 0.5, line_dash="dash", line_color="gold", line_width=2, 
-    #                 annotation_text="S级", annotation_position="top")
+        # 重点城市业绩排名变化分析：排名和等级仍基于全部城市
+        st.subheader("🎯 重点城市业绩排名变化分析")
+        key_cities = key_city_list
 
-    #     # A/B分界线
-    #     fig.add_vline(x=a_threshold + 0.5, line_dash="dash", line_color="silver", line_width=2,
-    #                 annotation_text="A级", annotation_position="top")
+        key_ranking_df = ranking_df[ranking_df['城市'].isin(key_cities)]
+        missing_cities = [city for city in key_cities if city not in set(key_ranking_df['城市'])]
 
-    #     # B/C分界线
-    #     fig.add_vline(x=b_threshold + 0.5, line_dash="dash", line_color="#cd7f32", line_width=2,
-    #                 annotation_text="B级", annotation_position="top")
+        # 只显示有业绩数据的城市
+        if len(key_ranking_df) > 0:
+            render_chart(build_ranking_dumbbell(
+                key_ranking_df, (s_threshold, a_threshold, b_threshold), '重点城市业绩排名变化分析（哑铃图）'
+            ))
 
-    #     # 更新布局
-    #     fig.update_layout(
-    #         title='重点城市业绩排名变化分析（哑铃图）',
-    #         title_font=dict(color='white', size=16),
-    #         xaxis_title='排名（数字越小排名越高）',
-    #         yaxis_title='城市',
-    #         xaxis=dict(
-    #             title_font=dict(color='white'),
-    #             tickfont=dict(color='white'),
-    #             autorange='reversed',  # 反转x轴，使排名1在右侧
-    #             showgrid=True,
-    #             gridcolor='rgba(255,255,255,0.2)',
-    #             dtick=1
-    #         ),
-    #         yaxis=dict(
-    #             title_font=dict(color='white'),
-    #             tickfont=dict(color='white'),
-    #             showgrid=True,
-    #             gridcolor='rgba(255,255,255,0.2)'
-    #         ),
-    #         height=max(400, len(ranking_df) * 40),  # 根据城市数量调整高度
-    #         showlegend=True,
-    #         legend=dict(
-    #             orientation="h",
-    #             yanchor="bottom",
-    #             y=1.02,
-    #             xanchor="right",
-    #             x=1,
-    #             font=dict(color='white')
-    #         ),
-    #         font=dict(size=12, color='white'),
-    #         plot_bgcolor='rgba(0,0,0,0)',
-    #         paper_bgcolor='rgba(0,0,0,0)'
-    #     )
+            st.write("### 🏆 重点城市等级分析")
 
-    #     st.plotly_chart(fig, use_container_width=True)
-    
-        
-        
-        
+            # 显示等级分布
+            col1, col2, col3, col4 = st.columns(4)
 
-    # # 显示没有业绩的城市
-    # if missing_cities:
-    #     st.warning(f"以下城市在两年内均无业绩数据：{', '.join(missing_cities)}")
-    #     st.write("### 🏆 重点城市等级分析")
-
-    #     # 显示等级分布
-    #     col1, col2, col3, col4 = st.columns(4)
-
-    #     grade_counts = ranking_df['等级'].value_counts()
-    #     with col1:
-    #         st.metric("S级城市", grade_counts.get('S', 0), help=f"业绩排名前{s_threshold}名")
-    #     with col2:
-    #         st.metric("A级城市", grade_counts.get('A', 0), help=f"业绩排名前{a_threshold}名")
-    #     with col3:
-    #         st.metric("B级城市", grade_counts.get('B', 0), help=f"业绩排名前{b_threshold}名")
-    #     with col4:
-    #         st.metric("C级城市", grade_counts.get('C', 0), help=f"业绩排名{b_threshold}名之后")
-
-    #     # 分析排名变化
-    #     st.write("### 📈 排名变化分析")
-
-    #     # 有排名变化数据的城市
-    #     cities_with_change = ranking_df[ranking_df['排名变化'].notna()]
-        
-    #     if len(cities_with_change) > 0:
-    #         # 排名上升的城市
-    #         rising_cities = cities_with_change[cities_with_change['排名变化'] > 0].sort_values('排名变化', ascending=False)
-    #         # 排名下降的城市
-    #         falling_cities = cities_with_change[cities_with_change['排名变化'] < 0].sort_values('排名变化', ascending=True)
-    #         # 排名不变的城市
-    #         stable_cities = cities_with_change[cities_with_change['排名变化'] == 0]
-
-    #         col1, col2 = st.columns(2)
-
-    #         with col1:
-    #             st.write("**🚀 排名上升的城市:**")
-    #             if len(rising_cities) > 0:
-    #                 for _, row in rising_cities.iterrows():
-    #                     st.write(f"• **{row['城市']}** ({row['等级']}级): 上升 {row['排名变化']} 位")
-    #                     st.write(f"  📊 第{row['2024年排名']}名 → 第{row['2025年排名']}名")
-    #             else:
-    #                 st.write("暂无排名上升的城市")
-
-    #         with col2:
-    #             st.write("**📉 排名下降的城市:**")
-    #             if len(falling_cities) > 0:
-    #                 for _, row in falling_cities.iterrows():
-    #                     st.write(f"• **{row['城市']}** ({row['等级']}级): 下降 {abs(row['排名变化'])} 位")
-    #                     st.write(f"  📊 第{row['2024年排名']}名 → 第{row['2025年排名']}名")
-    #             else:
-    #                 st.write("暂无排名下降的城市")
-
-    #         if len(stable_cities) > 0:
-    #             st.write("**➡️ 排名稳定的城市:**")
-    #             for _, row in stable_cities.iterrows():
-    #                 st.write(f"• **{row['城市']}** ({row['等级']}级): 排名保持第{row['2024年排名']}名")
-
-    #     # 只有单年数据的城市
-    #     single_year_cities = ranking_df[ranking_df['排名变化'].isna()]
-    #     if len(single_year_cities) > 0:
-    #         st.write("**📊 单年数据城市:**")
-    #         for _, row in single_year_cities.iterrows():
-    #             if row['2024年排名'] is not None and row['2025年排名'] is None:
-    #                 st.write(f"• **{row['城市']}**: 仅2024年有业绩，排名第{row['2024年排名']}名")
-    #             elif row['2024年排名'] is None and row['2025年排名'] is not None:
-    #                 st.write(f"• **{row['城市']}**: 仅2025年有业绩，排名第{row['2025年排名']}名")
-
-    # else:
-    #     st.write("### ⚠️ 暂无重点城市业绩数据")
-
-    # # 显示没有业绩的城市
-    # if len(missing_cities) > 0:
-    #     st.write("### 📝 无业绩记录的重点城市")
-    #     st.info(f"以下重点城市在2024年和2025年均无业绩记录：**{', '.join(missing_cities)}**")
-    
+            key_grade_counts = key_ranking_df['等级'].value_counts()
+            with col1:
+                st.metric("S级城市", key_grade_counts.get('S', 0), help=f"2025年业绩排名前{s_threshold}名")
+            with col2:
+                st.metric("A级城市", key_grade_counts.get('A', 0), help=f"2025年业绩排名前{a_threshold}名")
+            with col3:
+                st.metric("B级城市", key_grade_counts.get('B', 0), help=f"2025年业绩排名前{b_threshold}名")
+            with col4:
+                st.metric("C级城市", key_grade_counts.get('C', 0), help=f"2025年业绩排名{b_threshold}名之后")
 
+            # 分析排名变化
+            st.write("### 📈 排名变化分析")
 
-    # 重点城市一级业态结构变化分析
-    # 重点城市一级业态结构变化分析
-    # st.subheader("重点城市一级业态结构变化")
+            key_cities_with_change = key_ranking_df[key_ranking_df['排名变化'].notna()]
 
-    # # 重点城市列表（与上面保持一致）
-    # key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+            if len(key_cities_with_change) > 0:
+                # 排名上升、下降、不变的城市（沿用排名表的降序）
+                key_rising_cities = key_cities_with_change[key_cities_with_change['排名变化'] > 0]
+                key_falling_cities = key_cities_with_change[key_cities_with_change['排名变化'] < 0].iloc[::-1]
+                key_stable_cities = key_cities_with_change[key_cities_with_change['排名变化'] == 0]
 
-    # # 筛选重点城市且有业绩数据的记录
-    # df_key_cities = df_all[
-    #     (df_all['城市'].isin(key_cities)) & 
-    #     (df_all['业绩金额'] > 0)
-    # ].copy()
+                col1, col2 = st.columns(2)
 
-    # # 提取年份信息（假设从df_2024和df_2025可以区分年份）
-    # df_key_cities['年份'] = df_key_cities.apply(lambda x: 2024 if x.name < len(df_2024) else 2025, axis=1)
+                with col1:
+                    st.write("**🚀 排名上升的城市:**")
+                    if len(key_rising_cities) > 0:
+                        for _, row in key_rising_cities.iterrows():
+                            st.write(f"• **{row['城市']}** ({row['等级']}级): 上升 {row['排名变化']} 位")
+                            st.write(f"  📊 第{row['2024年排名']}名 → 第{row['2025年排名']}名")
+                    else:
+                        st.write("暂无排名上升的城市")
 
-    # # 筛选有2024年业绩数据的城市
-    # cities_with_2024 = df_key_cities[df_key_cities['年份'] == 2024]['城市'].unique()
+                with col2:
+                    st.write("**📉 排名下降的城市:**")
+                    if len(key_falling_cities) > 0:
+                        for _, row in key_falling_cities.iterrows():
+                            st.write(f"• **{row['城市']}** ({row['等级']}级): 下降 {abs(row['排名变化'])} 位")
+                            st.write(f"  📊 第{row['2024年排名']}名 → 第{row['2025年排名']}名")
+                    else:
+                        st.write("暂无排名下降的城市")
+
+                if len(key_stable_cities) > 0:
+                    st.write("**➡️ 排名稳定的城市:**")
+                    for _, row in key_stable_cities.iterrows():
+                        st.write(f"• **{row['城市']}** ({row['等级']}级): 排名保持第{row['2024年排名']}名")
+
+            # 只有单年数据的城市
+            single_year_cities = key_ranking_df[key_ranking_df['排名变化'].isna()]
+            if len(single_year_cities) > 0:
+                st.write("**📊 单年数据城市:**")
+                for _, row in single_year_cities.iterrows():
+                    if pd.isna(row['2025年排名']):
+                        st.write(f"• **{row['城市']}**: 仅2024年有业绩，排名第{row['2024年排名']}名")
+                    else:
+                        st.write(f"• **{row['城市']}**: 仅2025年有业绩，排名第{row['2025年排名']}名")
 
-    # if len(cities_with_2024) > 0:
-    #     st.write(f"**有2024年业绩数据的重点城市:** {', '.join(cities_with_2024)}")
-        
-    #     # 按城市、年份、一级业态分组，计算业绩金额总和
-    #     city_year_business = df_key_cities.groupby(['城市', '年份', '一级业态'])['业绩金额'].sum().reset_index()
-        
-    #     # 获取所有出现的业态类型
-    #     all_business_types = city_year_business['一级业态'].unique()
-        
-    #     # 定义商业业态（放在底部，使用鲜艳颜色）
-    #     commercial_types = ['产业园物业', '写字楼物业', '商业物业']
-        
-    #     # 重新排序业态，商业业态在前
-    #     business_types_ordered = []
-    #     other_types = []
-        
-    #     for business_type in all_business_types:
-    #         if business_type in commercial_types:
-    #             business_types_ordered.append(business_type)
-    #         else:
-    #             other_types.append(business_type)
-        
-    #     # 按照指定顺序排列商业业态
-    #     commercial_ordered = [bt for bt in commercial_types if bt in business_types_ordered]
-    #     business_types_ordered = commercial_ordered + other_types
-        
-    #     # 创建堆叠柱状图
-    #     fig = go.Figure()
-        
-    #     # 定义颜色方案
-    #     # 商业业态使用鲜艳颜色
-    #     commercial_colors = {
-    #         '产业园物业': '#E74C3C',    # 鲜艳红色
-    #         '写字楼物业': '#3498DB',    # 鲜艳蓝色
-    #         '商业物业': '#2ECC71'       # 鲜艳绿色
-    #     }
-        
-    #     # 其他业态使用淡色但能明显区分
-    #     other_colors = [
-    #         '#BDC3C7',  # 淡灰色
-    #         '#F39C12',  # 淡橙色
-    #         '#9B59B6',  # 淡紫色
-    #         "#383AA7",  # 淡青色
-    #         "#F7D9E0",  # 淡橘色
-    #         '#FAD5A5'
+        else:
+            st.write("### ⚠️ 暂无重点城市业绩数据")
+
+        # 显示没有业绩的城市
+        if len(missing_cities) > 0:
+            st.write("### 📝 无业绩记录的重点城市")
+            st.info(f"以下重点城市在2024年和2025年均无业绩记录：**{', '.join(missing_cities)}**")
+
+
+        # 重点城市一级业态结构变化分析
+        # 重点城市一级业态结构变化分析
+        # st.subheader("重点城市一级业态结构变化")
+
+        # # 重点城市列表（与上面保持一致）
+        # key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+
+        # # 筛选重点城市且有业绩数据的记录
+        # df_key_cities = df_all[
+        #     (df_all['城市'].isin(key_cities)) & 
+        #     (df_all['业绩金额'] > 0)
+        # ].copy()
+
+        # # 提取年份信息（假设从df_2024和df_2025可以区分年份）
+        # df_key_cities['年份'] = df_key_cities.apply(lambda x: 2024 if x.name < len(df_2024) else 2025, axis=1)
+
+        # # 筛选有2024年业绩数据的城市
+        # cities_with_2024 = df_key_cities[df_key_cities['年份'] == 2024]['城市'].unique()
+
+        # if len(cities_with_2024) > 0:
+        #     st.write(f"**有2024年业绩数据的重点城市:** {', '.join(cities_with_2024)}")
+        
+        #     # 按城市、年份、一级业态分组，计算业绩金额总和
+        #     city_year_business = df_key_cities.groupby(['城市', '年份', '一级业态'])['业绩金额'].sum().reset_index()
+        
+        #     # 获取所有出现的业态类型
+        #     all_business_types = city_year_business['一级业态'].unique()
+        
+        #     # 定义商业业态（放在底部，使用鲜艳颜色）
+        #     commercial_types = ['产业园物业', '写字楼物业', '商业物业']
+        
+        #     # 重新排序业态，商业业态在前
+        #     business_types_ordered = []
+        #     other_types = []
+        
+        #     for business_type in all_business_types:
+        #         if business_type in commercial_types:
+        #             business_types_ordered.append(business_type)
+        #         else:
+        #             other_types.append(business_type)
+        
+        #     # 按照指定顺序排列商业业态
+        #     commercial_ordered = [bt for bt in commercial_types if bt in business_types_ordered]
+        #     business_types_ordered = commercial_ordered + other_types
+        
+        #     # 创建堆叠柱状图
+        #     fig = go.Figure()
+        
+        #     # 定义颜色方案
+        #     # 商业业态使用鲜艳颜色
+        #     commercial_colors = {
+        #         '产业园物业': '#E74C3C',    # 鲜艳红色
+        #         '写字楼物业': '#3498DB',    # 鲜艳蓝色
+        #         '商业物业': '#2ECC71'       # 鲜艳绿色
+        #     }
+        
+        #     # 其他业态使用淡色但能明显区分
+        #     other_colors = [
+        #         '#BDC3C7',  # 淡灰色
+        #         '#F39C12',  # 淡橙色
+        #         '#9B59B6',  # 淡紫色
+        #         "#383AA7",  # 淡青色
+        #         "#F7D9E0",  # 淡橘色
+        #         '#FAD5A5'
             
             
-    #     ]
-        
-    #     # 为每个业态创建堆叠柱
-    #     other_color_index = 0
-    #     for business_type in business_types_ordered:
-    #         # 选择颜色
-    #         if business_type in commercial_colors:
-    #             color = commercial_colors[business_type]
-    #         else:
-    #             color = other_colors[other_color_index % len(other_colors)]
-    #             other_color_index += 1
+        #     ]
+        
+        #     # 为每个业态创建堆叠柱
+        #     other_color_index = 0
+        #     for business_type in business_types_ordered:
+        #         # 选择颜色
+        #         if business_type in commercial_colors:
+        #             color = commercial_colors[business_type]
+        #         else:
+        #             color = other_colors[other_color_index % len(other_colors)]
+        #             other_color_index += 1
             
-    #         # 2024年数据
-    #         data_2024 = []
-    #         # 2025年数据
-    #         data_2025 = []
+        #         # 2024年数据
+        #         data_2024 = []
+        #         # 2025年数据
+        #         data_2025 = []
             
-    #         for city in cities_with_2024:
-    #             # 获取该城市该业态的2024年数据
-    #             city_business_2024 = city_year_business[
-    #                 (city_year_business['城市'] == city) & 
-    #                 (city_year_business['年份'] == 2024) & 
-    #                 (city_year_business['一级业态'] == business_type)
-    #             ]
-    #             value_2024 = city_business_2024['业绩金额'].sum() if len(city_business_2024) > 0 else 0
-    #             data_2024.append(value_2024)
+        #         for city in cities_with_2024:
+        #             # 获取该城市该业态的2024年数据
+        #             city_business_2024 = city_year_business[
+        #                 (city_year_business['城市'] == city) & 
+        #                 (city_year_business['年份'] == 2024) & 
+        #                 (city_year_business['一级业态'] == business_type)
+        #             ]
+        #             value_2024 = city_business_2024['业绩金额'].sum() if len(city_business_2024) > 0 else 0
+        #             data_2024.append(value_2024)
                 
-    #             # 获取该城市该业态的2025年数据
-    #             city_business_2025 = city_year_business[
-    #                 (city_year_business['城市'] == city) & 
-    #                 (city_year_business['年份'] == 2025) & 
-    #                 (city_year_business['一级业态'] == business_type)
-    #             ]
-    #             value_2025 = city_business_2025['业绩金额'].sum() if len(city_business_2025) > 0 else 0
-    #             data_2025.append(value_2025)
+        #             # 获取该城市该业态的2025年数据
+        #             city_business_2025 = city_year_business[
+        #                 (city_year_business['城市'] == city) & 
+        #                 (city_year_business['年份'] == 2025) & 
+        #                 (city_year_business['一级业态'] == business_type)
+        #             ]
+        #             value_2025 = city_business_2025['业绩金额'].sum() if len(city_business_2025) > 0 else 0
+        #             data_2025.append(value_2025)
             
-    #         # 创建x轴标签（城市-年份组合）
-    #         x_labels_2024 = [f"{city}-2024" for city in cities_with_2024]
-    #         x_labels_2025 = [f"{city}-2025" for city in cities_with_2024]
+        #         # 创建x轴标签（城市-年份组合）
+        #         x_labels_2024 = [f"{city}-2024" for city in cities_with_2024]
+        #         x_labels_2025 = [f"{city}-2025" for city in cities_with_2024]
             
-    #         # 添加2024年的堆叠柱
-    #         fig.add_trace(go.Bar(
-    #             name=business_type,
-    #             x=x_labels_2024,
-    #             y=data_2024,
-    #             marker_color=color,
-    #             legendgroup=business_type,
-    #             hovertemplate=f'<b>{business_type}</b><br>' +
-    #                         '城市: %{x}<br>' +
-    #                         '业绩金额: %{y:,.0f}<br>' +
-    #                         '<extra></extra>'
-    #         ))
+        #         # 添加2024年的堆叠柱
+        #         fig.add_trace(go.Bar(
+        #             name=business_type,
+        #             x=x_labels_2024,
+        #             y=data_2024,
+        #             marker_color=color,
+        #             legendgroup=business_type,
+        #             hovertemplate=f'<b>{business_type}</b><br>' +
+        #                         '城市: %{x}<br>' +
+        #                         '业绩金额: %{y:,.0f}<br>' +
+        #                         '<extra></extra>'
+        #         ))
             
-    #         # 添加2025年的堆叠柱（不使用透明度）
-    #         fig.add_trace(go.Bar(
-    #             name=business_type,
-    #             x=x_labels_2025,
-    #             y=data_2025,
-    #             marker_color=color,
-    #             legendgroup=business_type,
-    #             showlegend=False,
-    #             hovertemplate=f'<b>{business_type}</b><br>' +
-    #                         '城市: %{x}<br>' +
-    #                         '业绩金额: %{y:,.0f}<br>' +
-    #                         '<extra></extra>'
-    #         ))
-        
-    #     # 创建完整的x轴标签列表
-    #     all_x_labels = []
-    #     for city in cities_with_2024:
-    #         all_x_labels.extend([f"{city}-2024", f"{city}-2025"])
-        
-    #     # 更新布局
-    #     fig.update_layout(
-    #     title={
-    #         'text': '重点城市一级业态结构对比分析',
-    #         'x': 0.5,
-    #         'xanchor': 'center',
-    #         'font': {'size': 20, 'color': '#1B4965'}  # 深色标题
-    #     },
-    #     xaxis={
-    #         'title': {
-    #             'text': '城市-年份',
-    #             'font': {'size': 14, 'color': '#1B4965'}  # 深色x轴标题
-    #         },
-    #         'tickangle': -45,
-    #         'tickfont': {'size': 12, 'color': '#1B4965'},  # 深色字体
-    #         'categoryorder': 'array',
-    #         'categoryarray': all_x_labels,
-    #         'gridcolor': '#F6F8FA',  # 浅白色网格线
-    #         'zerolinecolor': '#F6F8FA',  # 零轴线颜色与网格线一致
-    #         'showgrid': False  # 隐藏x轴网格线
-    #     },
-    #     yaxis={
-    #         'title': {
-    #             'text': '业绩金额',
-    #             'font': {'size': 14, 'color': '#1B4965'}  # 深色字体
-    #         },
-    #         'tickformat': ',.0f',
-    #         'tickfont': {'size': 12, 'color': '#1B4965'},  # 深色字体
-    #         'gridcolor': '#F6F8FA',  # 浅白色网格线
-    #         'zerolinecolor': '#F6F8FA'  # 零轴线颜色与网格线一致
-    #     },
-    #     barmode='stack',
-    #     height=600,
-    #     legend={
-    #         'orientation': 'h',
-    #         'yanchor': 'bottom',
-    #         'y': 1.02,
-    #         'xanchor': 'right',
-    #         'x': 1,
-    #         'font': {'size': 12, 'color': '#1B4965'}  # 深色图例文字
-    #     },
-    #     font=dict(size=12, color='#1B4965'),  # 深色字体
-    #     plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
-    #     paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
-    #     margin=dict(l=50, r=50, t=80, b=100),
-    #     # 调整柱子间距，增加城市组之间的间隙
-    #     bargap=0.6,  # 增加柱子组之间的间隙
-    #     bargroupgap=0.04  # 保持同组内柱子的紧密间距
-    # )
+        #         # 添加2025年的堆叠柱（不使用透明度）
+        #         fig.add_trace(go.Bar(
+        #             name=business_type,
+        #             x=x_labels_2025,
+        #             y=data_2025,
+        #             marker_color=color,
+        #             legendgroup=business_type,
+        #             showlegend=False,
+        #             hovertemplate=f'<b>{business_type}</b><br>' +
+        #                         '城市: %{x}<br>' +
+        #                         '业绩金额: %{y:,.0f}<br>' +
+        #                         '<extra></extra>'
+        #         ))
+        
+        #     # 创建完整的x轴标签列表
+        #     all_x_labels = []
+        #     for city in cities_with_2024:
+        #         all_x_labels.extend([f"{city}-2024", f"{city}-2025"])
+        
+        #     # 更新布局
+        #     fig.update_layout(
+        #     title={
+        #         'text': '重点城市一级业态结构对比分析',
+        #         'x': 0.5,
+        #         'xanchor': 'center',
+        #         'font': {'size': 20, 'color': '#1B4965'}  # 深色标题
+        #     },
+        #     xaxis={
+        #         'title': {
+        #             'text': '城市-年份',
+        #             'font': {'size': 14, 'color': '#1B4965'}  # 深色x轴标题
+        #         },
+        #         'tickangle': -45,
+        #         'tickfont': {'size': 12, 'color': '#1B4965'},  # 深色字体
+        #         'categoryorder': 'array',
+        #         'categoryarray': all_x_labels,
+        #         'gridcolor': '#F6F8FA',  # 浅白色网格线
+        #         'zerolinecolor': '#F6F8FA',  # 零轴线颜色与网格线一致
+        #         'showgrid': False  # 隐藏x轴网格线
+        #     },
+        #     yaxis={
+        #         'title': {
+        #             'text': '业绩金额',
+        #             'font': {'size': 14, 'color': '#1B4965'}  # 深色字体
+        #         },
+        #         'tickformat': ',.0f',
+        #         'tickfont': {'size': 12, 'color': '#1B4965'},  # 深色字体
+        #         'gridcolor': '#F6F8FA',  # 浅白色网格线
+        #         'zerolinecolor': '#F6F8FA'  # 零轴线颜色与网格线一致
+        #     },
+        #     barmode='stack',
+        #     height=600,
+        #     legend={
+        #         'orientation': 'h',
+        #         'yanchor': 'bottom',
+        #         'y': 1.02,
+        #         'xanchor': 'right',
+        #         'x': 1,
+        #         'font': {'size': 12, 'color': '#1B4965'}  # 深色图例文字
+        #     },
+        #     font=dict(size=12, color='#1B4965'),  # 深色字体
+        #     plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
+        #     paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
+        #     margin=dict(l=50, r=50, t=80, b=100),
+        #     # 调整柱子间距，增加城市组之间的间隙
+        #     bargap=0.6,  # 增加柱子组之间的间隙
+        #     bargroupgap=0.04  # 保持同组内柱子的紧密间距
+        # )
     
         
-    #     # 添加网格线
-    #     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
-    #     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
-        
-    #     # 添加城市分组的分割线（调整位置以适应新的间距）
-    #     for i in range(1, len(cities_with_2024)):
-    #         fig.add_vline(
-    #             x=i * 2 - 0.5,
-    #             line_dash="dash",
-    #             line_color="rgba(128,128,128,0.4)",
-    #             line_width=1
-    #         )
-        
-    #     st.plotly_chart(fig, use_container_width=True)
-        
-    #     # 添加数据摘要表格
-    #     st.write("#### 📊 数据摘要")
-        
-    #     # 计算各城市总业绩和主要业态
-    #     summary_data = []
-    #     for city in cities_with_2024:
-    #         # 2024年数据
-    #         city_2024 = city_year_business[
-    #             (city_year_business['城市'] == city) & 
-    #             (city_year_business['年份'] == 2024)
-    #         ]
-    #         total_2024 = city_2024['业绩金额'].sum()
-    #         main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
+        #     # 添加网格线
+        #     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+        #     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+        
+        #     # 添加城市分组的分割线（调整位置以适应新的间距）
+        #     for i in range(1, len(cities_with_2024)):
+        #         fig.add_vline(
+        #             x=i * 2 - 0.5,
+        #             line_dash="dash",
+        #             line_color="rgba(128,128,128,0.4)",
+        #             line_width=1
+        #         )
+        
+        #     st.plotly_chart(fig, use_container_width=True)
+        
+        #     # 添加数据摘要表格
+        #     st.write("#### 📊 数据摘要")
+        
+        #     # 计算各城市总业绩和主要业态
+        #     summary_data = []
+        #     for city in cities_with_2024:
+        #         # 2024年数据
+        #         city_2024 = city_year_business[
+        #             (city_year_business['城市'] == city) & 
+        #             (city_year_business['年份'] == 2024)
+        #         ]
+        #         total_2024 = city_2024['业绩金额'].sum()
+        #         main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
             
-    #         # 2025年数据
-    #         city_2025 = city_year_business[
-    #             (city_year_business['城市'] == city) & 
-    #             (city_year_business['年份'] == 2025)
-    #         ]
-    #         total_2025 = city_2025['业绩金额'].sum()
-    #         main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
+        #         # 2025年数据
+        #         city_2025 = city_year_business[
+        #             (city_year_business['城市'] == city) & 
+        #             (city_year_business['年份'] == 2025)
+        #         ]
+        #         total_2025 = city_2025['业绩金额'].sum()
+        #         main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
             
-    #         # 计算增长率
-    #         growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
+        #         # 计算增长率
+        #         growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
             
-    #         summary_data.append({
-    #             '城市': city,
-    #             '2024年总业绩': f"{total_2024:,.0f}",
-    #             '2024年主要业态': main_business_2024,
-    #             '2025年总业绩': f"{total_2025:,.0f}",
-    #             '2025年主要业态': main_business_2025,
-    #             '增长率': f"{growth_rate:+.1f}%"
-    #         })
-        
-    #     summary_df = pd.DataFrame(summary_data)
-    #     st.dataframe(summary_df, use_container_width=True, hide_index=True)
-        
-    #     # 添加关键洞察
-    #     st.write("#### 💡 关键洞察")
-        
-    #     col1, col2 = st.columns(2)
-        
-    #     with col1:
-    #         st.write("**🏆 业绩增长最快的城市:**")
-    #         growth_analysis = []
-    #         for city in cities_with_2024:
-    #             city_2024_total = city_year_business[
-    #                 (city_year_business['城市'] == city) & 
-    #                 (city_year_business['年份'] == 2024)
-    #             ]['业绩金额'].sum()
+        #         summary_data.append({
+        #             '城市': city,
+        #             '2024年总业绩': f"{total_2024:,.0f}",
+        #             '2024年主要业态': main_business_2024,
+        #             '2025年总业绩': f"{total_2025:,.0f}",
+        #             '2025年主要业态': main_business_2025,
+        #             '增长率': f"{growth_rate:+.1f}%"
+        #         })
+        
+        #     summary_df = pd.DataFrame(summary_data)
+        #     st.dataframe(summary_df, use_container_width=True, hide_index=True)
+        
+        #     # 添加关键洞察
+        #     st.write("#### 💡 关键洞察")
+        
+        #     col1, col2 = st.columns(2)
+        
+        #     with col1:
+        #         st.write("**🏆 业绩增长最快的城市:**")
+        #         growth_analysis = []
+        #         for city in cities_with_2024:
+        #             city_2024_total = city_year_business[
+        #                 (city_year_business['城市'] == city) & 
+        #                 (city_year_business['年份'] == 2024)
+        #             ]['业绩金额'].sum()
                 
-    #             city_2025_total = city_year_business[
-    #                 (city_year_business['城市'] == city) & 
-    #                 (city_year_business['年份'] == 2025)
-    #             ]['业绩金额'].sum()
+        #             city_2025_total = city_year_business[
+        #                 (city_year_business['城市'] == city) & 
+        #                 (city_year_business['年份'] == 2025)
+        #             ]['业绩金额'].sum()
                 
-    #             if city_2024_total > 0:
-    #                 growth = city_2025_total - city_2024_total
-    #                 growth_analysis.append((city, growth))
+        #             if city_2024_total > 0:
+        #                 growth = city_2025_total - city_2024_total
+        #                 growth_analysis.append((city, growth))
             
-    #         if growth_analysis:
-    #             top_growth_city = max(growth_analysis, key=lambda x: x[1])
-    #             st.write(f"- **{top_growth_city[0]}**: 增长 {top_growth_city[1]:,.0f}")
+        #         if growth_analysis:
+        #             top_growth_city = max(growth_analysis, key=lambda x: x[1])
+        #             st.write(f"- **{top_growth_city[0]}**: 增长 {top_growth_city[1]:,.0f}")
         
-    #     with col2:
-    #         st.write("**📈 主要业态分布:**")
-    #         business_count = city_year_business['一级业态'].value_counts()
-    #         for business, count in business_count.head(3).items():
-    #             st.write(f"- **{business}**: {count} 个城市年份")
+        #     with col2:
+        #         st.write("**📈 主要业态分布:**")
+        #         business_count = city_year_business['一级业态'].value_counts()
+        #         for business, count in business_count.head(3).items():
+        #             st.write(f"- **{business}**: {count} 个城市年份")
 
-    # else:
-    #     st.write("重点城市均无2024年业绩数据，无法进行业态结构对比分析")
+        # else:
+        #     st.write("重点城市均无2024年业绩数据，无法进行业态结构对比分析")
 
 
 
 
 
-    # 定义重点城市列表
-    key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
+    def render_key_city_share_section():
+        """重点城市业绩占比"""
+        profiler.begin('重点城市业绩占比')
+        # 定义重点城市列表
+        key_cities = key_city_list
 
-    # 分别获取2024年和2025年的数据
-    df_2024_city = df_2024.groupby('城市')['业绩金额'].sum().reset_index()
-    df_2025_city = df_2025.groupby('城市')['业绩金额'].sum().reset_index()
+        # 分别获取2024年和2025年的数据
+        city_totals = section_graph.result('城市汇总')
+        df_2024_city = city_totals[2024]['业绩金额'].reset_index()
+        df_2025_city = city_totals[2025]['业绩金额'].reset_index()
 
-    # 计算2024年各城市业绩
-    cities_2024 = set(df_2024_city['城市'].tolist())
-    cities_2025 = set(df_2025_city['城市'].tolist())
+        # 计算2024年各城市业绩
+        cities_2024 = set(df_2024_city['城市'].tolist())
+        cities_2025 = set(df_2025_city['城市'].tolist())
 
-    # 2024年重点城市业绩
-    key_cities_2024 = [city for city in key_cities if city in cities_2024]
-    key_cities_2024_amount = df_2024_city[df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
-    other_cities_2024_amount = df_2024_city[~df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
-    total_2024 = key_cities_2024_amount + other_cities_2024_amount
+        # 2024年重点城市业绩
+        key_cities_2024 = [city for city in key_cities if city in cities_2024]
+        key_cities_2024_amount = df_2024_city[df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
+        other_cities_2024_amount = df_2024_city[~df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
+        total_2024 = key_cities_2024_amount + other_cities_2024_amount
 
-    # 2025年重点城市业绩
-    key_cities_2025 = [city for city in key_cities if city in cities_2025]
-    # 24年已有业绩的重点城市在25年的业绩
-    existing_key_cities_2025 = [city for city in key_cities_2024 if city in cities_2025]
-    existing_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(existing_key_cities_2025)]['业绩金额'].sum()
-    # 新增重点城市在25年的业绩
-    new_key_cities_2025 = [city for city in key_cities_2025 if city not in key_cities_2024]
-    new_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(new_key_cities_2025)]['业绩金额'].sum()
-    # 其他城市在25年的业绩
-    other_cities_2025_amount = df_2025_city[~df_2025_city['城市'].isin(key_cities_2025)]['业绩金额'].sum()
-    total_2025 = existing_key_cities_2025_amount + new_key_cities_2025_amount + other_cities_2025_amount
+        # 2025年重点城市业绩
+        key_cities_2025 = [city for city in key_cities if city in cities_2025]
+        # 24年已有业绩的重点城市在25年的业绩
+        existing_key_cities_2025 = [city for city in key_cities_2024 if city in cities_2025]
+        existing_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(existing_key_cities_2025)]['业绩金额'].sum()
+        # 新增重点城市在25年的业绩
+        new_key_cities_2025 = [city for city in key_cities_2025 if city not in key_cities_2024]
+        new_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(new_key_cities_2025)]['业绩金额'].sum()
+        # 其他城市在25年的业绩
+        other_cities_2025_amount = df_2025_city[~df_2025_city['城市'].isin(key_cities_2025)]['业绩金额'].sum()
+        total_2025 = existing_key_cities_2025_amount + new_key_cities_2025_amount + other_cities_2025_amount
 
-    # 找出24、25年都没有业绩的重点城市
-    no_performance_cities = [city for city in key_cities if city not in cities_2024 and city not in cities_2025]
+        # 找出24、25年都没有业绩的重点城市
+        no_performance_cities = [city for city in key_cities if city not in cities_2024 and city not in cities_2025]
 
-    # 创建子图
-    fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=('2024年上半年重点城市业绩占比图', '2025年上半年重点城市业绩占比图'),
-        specs=[[{"type": "pie"}, {"type": "pie"}]]
-    )
+        # 创建子图
+        fig = make_subplots(
+            rows=1, cols=2,
+            subplot_titles=('2024年上半年重点城市业绩占比图', '2025年上半年重点城市业绩占比图'),
+            specs=[[{"type": "pie"}, {"type": "pie"}]]
+        )
 
-    # 2024年饼图
-    fig.add_trace(
-        go.Pie(
-            labels=[f'重点城市<br>({", ".join(key_cities_2024)})', '其他城市'],
-            values=[key_cities_2024_amount, other_cities_2024_amount],
-            name="2024年",
-            marker=dict(colors=['#e47158', '#3d5c6f']),
-            textinfo='label+percent',
-            textposition='inside',
-            textfont=dict(color="black", size=15),
-            hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
-        ),
-        row=1, col=1
-    )
+        # 2024年饼图
+        fig.add_trace(
+            go.Pie(
+                labels=[f'重点城市<br>({", ".join(key_cities_2024)})', '其他城市'],
+                values=[key_cities_2024_amount, other_cities_2024_amount],
+                name="2024年",
+                marker=dict(colors=['#e47158', '#3d5c6f']),
+                textinfo='label+percent',
+                textposition='inside',
+                textfont=dict(color="black", size=15),
+                hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
+            ),
+            row=1, col=1
+        )
 
-    # 2025年饼图
-    labels_2025 = []
-    values_2025 = []
-    colors_2025 = []
-
-    if existing_key_cities_2025_amount > 0:
-        labels_2025.append(f'重点城市<br>({", ".join(existing_key_cities_2025)})')
-        values_2025.append(existing_key_cities_2025_amount)
-        colors_2025.append('#e47158')
-
-    if new_key_cities_2025_amount > 0:
-        labels_2025.append(f'新增重点城市<br>({", ".join(new_key_cities_2025)})')
-        values_2025.append(new_key_cities_2025_amount)
-        colors_2025.append('#f9ae79')
-
-    if other_cities_2025_amount > 0:
-        labels_2025.append('其他城市')
-        values_2025.append(other_cities_2025_amount)
-        colors_2025.append('#3d5c6f')
-
-    fig.add_trace(
-        go.Pie(
-            labels=labels_2025,
-            values=values_2025,
-            name="2025年",
-            marker=dict(colors=colors_2025),
-            textinfo='label+percent',
-            textposition='inside',
-            textfont=dict(color='black', size=15),
-            hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
-        ),
-        row=1, col=2
-    )
+        # 2025年饼图
+        labels_2025 = []
+        values_2025 = []
+        colors_2025 = []
 
-    # 更新布局
-    fig.update_layout(
-        title_text="重点城市业绩金额占比变化对比",
-        title_x=0.4,
-        title_font=dict(color='#1B4965', size=16),
-        showlegend=False,
-        height=600,
-        width=1200,
-        font=dict(color='#1B4965', size=12),
-        plot_bgcolor='#E3EAF3',
-        paper_bgcolor='#E3EAF3'
-    )
+        if existing_key_cities_2025_amount > 0:
+            labels_2025.append(f'重点城市<br>({", ".join(existing_key_cities_2025)})')
+            values_2025.append(existing_key_cities_2025_amount)
+            colors_2025.append('#e47158')
 
-    # 显示图表
-    st.plotly_chart(fig, use_container_width=True)
+        if new_key_cities_2025_amount > 0:
+            labels_2025.append(f'新增重点城市<br>({", ".join(new_key_cities_2025)})')
+            values_2025.append(new_key_cities_2025_amount)
+            colors_2025.append('#f9ae79')
 
-    # 输出没有业绩的重点城市
-    if no_performance_cities:
-        st.write(f"**注意：** 以下重点城市在2024年和2025年上半年都没有业绩记录：{', '.join(no_performance_cities)}")
+        if other_cities_2025_amount > 0:
+            labels_2025.append('其他城市')
+            values_2025.append(other_cities_2025_amount)
+            colors_2025.append('#3d5c6f')
 
-    
+        fig.add_trace(
+            go.Pie(
+                labels=labels_2025,
+                values=values_2025,
+                name="2025年",
+                marker=dict(colors=colors_2025),
+                textinfo='label+percent',
+                textposition='inside',
+                textfont=dict(color='black', size=15),
+                hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
+            ),
+            row=1, col=2
+        )
+
+        # 更新布局
+        fig.update_layout(
+            title_text="重点城市业绩金额占比变化对比",
+            title_x=0.4,
+            title_font=dict(color='#1B4965', size=16),
+            showlegend=False,
+            height=600,
+            width=1200,
+            font=dict(color='#1B4965', size=12),
+            plot_bgcolor='#E3EAF3',
+            paper_bgcolor='#E3EAF3'
+        )
 
+        # 显示图表
+        render_chart(fig)
 
+        # 输出没有业绩的重点城市
+        if no_performance_cities:
+            st.write(f"**注意：** 以下重点城市在2024年和2025年上半年都没有业绩记录：{', '.join(no_performance_cities)}")
 
-    st.subheader("重点城市一级业态结构变化")
+    
 
-    # 重点城市列表（与上面保持一致）
-    key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
 
-    # 筛选重点城市且有业绩数据的记录
-    df_key_cities = df_all[
-        (df_all['城市'].isin(key_cities)) & 
-        (df_all['业绩金额'] > 0)
-    ].copy()
 
-    # 提取年份信息（假设从df_2024和df_2025可以区分年份）
-    df_key_cities['年份'] = df_key_cities.apply(lambda x: 2024 if x.name < len(df_2024) else 2025, axis=1)
+    def render_key_city_format_section():
+        """重点城市一级业态结构变化"""
+        profiler.begin('重点城市一级业态结构变化')
+        st.subheader("重点城市一级业态结构变化")
 
-    # 筛选有2024年业绩数据的城市
-    cities_with_2024 = df_key_cities[df_key_cities['年份'] == 2024]['城市'].unique()
+        # 重点城市列表
+        key_cities = key_city_list
 
-    if len(cities_with_2024) > 0:
-        st.write(f"**有2024年业绩数据的重点城市:** {', '.join(cities_with_2024)}")
-        
-        # 按城市、年份、一级业态分组，计算业绩金额总和
-        city_year_business = df_key_cities.groupby(['城市', '年份', '一级业态'])['业绩金额'].sum().reset_index()
-        
-        # 获取所有出现的业态类型
-        all_business_types = city_year_business['一级业态'].unique()
-        
-        # 定义商业业态（放在底部，使用鲜艳颜色）
-        commercial_types = ['产业园物业', '写字楼物业', '商业物业']
+        # 重点城市的业态汇总已提交后台计算
+        with profiler.stage('等待后台计算'):
+            cities_with_2024, city_year_business = section_graph.result('重点城市一级业态结构变化')
+
+        if len(cities_with_2024) > 0:
+            st.write(f"**有2024年业绩数据的重点城市:** {', '.join(cities_with_2024)}")
         
-        # 重新排序业态，商业业态在前
-        business_types_ordered = []
-        other_types = []
+            # 获取所有出现的业态类型
+            all_business_types = city_year_business['一级业态'].unique()
         
-        for business_type in all_business_types:
-            if business_type in commercial_types:
-                business_types_ordered.append(business_type)
-            else:
-                other_types.append(business_type)
-        
-        # 按照指定顺序排列商业业态
-        commercial_ordered = [bt for bt in commercial_types if bt in business_types_ordered]
-        business_types_ordered = commercial_ordered + other_types
-        
-        # 定义与背景色协调的配色方案
-        # 商业业态使用深色调，与浅蓝背景形成对比
-        commercial_colors = {
-            '产业园物业': '#8B2635',    # 深红色
-            '写字楼物业': '#2E5984',    # 深蓝色
-            '商业物业': '#1E7E34'       # 深绿色
-        }
+            # 定义商业业态（放在底部，使用鲜艳颜色）
+            commercial_types = ['产业园物业', '写字楼物业', '商业物业']
         
-        # 其他业态使用中等饱和度的颜色，与背景协调且区分明显
-        other_colors = [
-            '#6C757D',  # 中灰色
-            '#D4A843',  # 金黄色
-            '#7B68A6',  # 深紫色
-            '#A0522D',  # 深棕色
-            '#CD853F',  # 秘鲁色
-            '#5F9EA0'   # 青灰色
-        ]
+            # 重新排序业态，商业业态在前
+            business_types_ordered = []
+            other_types = []
         
-        # 创建绘图函数
-        def create_business_chart(target_cities, chart_title, chart_height=600):
-            # 创建堆叠柱状图
-            fig = go.Figure()
-            
-            # 为每个业态创建堆叠柱
-            other_color_index = 0
-            for business_type in business_types_ordered:
-                # 选择颜色
-                if business_type in commercial_colors:
-                    color = commercial_colors[business_type]
+            for business_type in all_business_types:
+                if business_type in commercial_types:
+                    business_types_ordered.append(business_type)
                 else:
-                    color = other_colors[other_color_index % len(other_colors)]
-                    other_color_index += 1
+                    other_types.append(business_type)
+        
+            # 按照指定顺序排列商业业态
+            commercial_ordered = [bt for bt in commercial_types if bt in business_types_ordered]
+            business_types_ordered = commercial_ordered + other_types
+        
+            # 定义与背景色协调的配色方案
+            # 商业业态使用深色调，与浅蓝背景形成对比
+            commercial_colors = {
+                '产业园物业': '#8B2635',    # 深红色
+                '写字楼物业': '#2E5984',    # 深蓝色
+                '商业物业': '#1E7E34'       # 深绿色
+            }
+        
+            # 其他业态使用中等饱和度的颜色，与背景协调且区分明显
+            other_colors = [
+                '#6C757D',  # 中灰色
+                '#D4A843',  # 金黄色
+                '#7B68A6',  # 深紫色
+                '#A0522D',  # 深棕色
+                '#CD853F',  # 秘鲁色
+                '#5F9EA0'   # 青灰色
+            ]
+        
+            # 创建绘图函数
+            def create_business_chart(target_cities, chart_title, chart_height=600):
+                # 创建堆叠柱状图
+                fig = go.Figure()
+            
+                # 为每个业态创建堆叠柱
+                other_color_index = 0
+                for business_type in business_types_ordered:
+                    # 选择颜色
+                    if business_type in commercial_colors:
+                        color = commercial_colors[business_type]
+                    else:
+                        color = other_colors[other_color_index % len(other_colors)]
+                        other_color_index += 1
                 
-                # 2024年数据
-                data_2024 = []
-                # 2025年数据
-                data_2025 = []
+                    # 2024年数据
+                    data_2024 = []
+                    # 2025年数据
+                    data_2025 = []
                 
-                for city in target_cities:
-                    # 获取该城市该业态的2024年数据
-                    city_business_2024 = city_year_business[
-                        (city_year_business['城市'] == city) & 
-                        (city_year_business['年份'] == 2024) & 
-                        (city_year_business['一级业态'] == business_type)
-                    ]
-                    value_2024 = city_business_2024['业绩金额'].sum() if len(city_business_2024) > 0 else 0
-                    data_2024.append(value_2024)
+                    for city in target_cities:
+                        # 获取该城市该业态的2024年数据
+                        city_business_2024 = city_year_business[
+                            (city_year_business['城市'] == city) & 
+                            (city_year_business['年份'] == 2024) & 
+                            (city_year_business['一级业态'] == business_type)
+                        ]
+                        value_2024 = city_business_2024['业绩金额'].sum() if len(city_business_2024) > 0 else 0
+                        data_2024.append(value_2024)
                     
-                    # 获取该城市该业态的2025年数据
-                    city_business_2025 = city_year_business[
-                        (city_year_business['城市'] == city) & 
-                        (city_year_business['年份'] == 2025) & 
-                        (city_year_business['一级业态'] == business_type)
-                    ]
-                    value_2025 = city_business_2025['业绩金额'].sum() if len(city_business_2025) > 0 else 0
-                    data_2025.append(value_2025)
+                        # 获取该城市该业态的2025年数据
+                        city_business_2025 = city_year_business[
+                            (city_year_business['城市'] == city) & 
+                            (city_year_business['年份'] == 2025) & 
+                            (city_year_business['一级业态'] == business_type)
+                        ]
+                        value_2025 = city_business_2025['业绩金额'].sum() if len(city_business_2025) > 0 else 0
+                        data_2025.append(value_2025)
                 
-                # 创建x轴标签（城市-年份组合）
-                x_labels_2024 = [f"{city}-2024" for city in target_cities]
-                x_labels_2025 = [f"{city}-2025" for city in target_cities]
+                    # 创建x轴标签（城市-年份组合）
+                    x_labels_2024 = [f"{city}-2024" for city in target_cities]
+                    x_labels_2025 = [f"{city}-2025" for city in target_cities]
                 
-                # 添加2024年的堆叠柱
-                fig.add_trace(go.Bar(
-                    name=business_type,
-                    x=x_labels_2024,
-                    y=data_2024,
-                    marker_color=color,
-                    legendgroup=business_type,
-                    hovertemplate=f'<b>{business_type}</b><br>' +
-                                '城市: %{x}<br>' +
-                                '业绩金额: %{y:,.0f}<br>' +
-                                '<extra></extra>'
-                ))
+                    # 添加2024年的堆叠柱
+                    fig.add_trace(go.Bar(
+                        name=business_type,
+                        x=x_labels_2024,
+                        y=data_2024,
+                        marker_color=color,
+                        legendgroup=business_type,
+                        hovertemplate=f'<b>{business_type}</b><br>' +
+                                    '城市: %{x}<br>' +
+                                    '业绩金额: %{y:,.0f}<br>' +
+                                    '<extra></extra>'
+                    ))
                 
-                # 添加2025年的堆叠柱
-                fig.add_trace(go.Bar(
-                    name=business_type,
-                    x=x_labels_2025,
-                    y=data_2025,
-                    marker_color=color,
-                    legendgroup=business_type,
-                    showlegend=False,
-                    hovertemplate=f'<b>{business_type}</b><br>' +
-                                '城市: %{x}<br>' +
-                                '业绩金额: %{y:,.0f}<br>' +
-                                '<extra></extra>'
-                ))
+                    # 添加2025年的堆叠柱
+                    fig.add_trace(go.Bar(
+                        name=business_type,
+                        x=x_labels_2025,
+                        y=data_2025,
+                        marker_color=color,
+                        legendgroup=business_type,
+                        showlegend=False,
+                        hovertemplate=f'<b>{business_type}</b><br>' +
+                                    '城市: %{x}<br>' +
+                                    '业绩金额: %{y:,.0f}<br>' +
+                                    '<extra></extra>'
+                    ))
             
-            # 创建完整的x轴标签列表
-            all_x_labels = []
-            for city in target_cities:
-                all_x_labels.extend([f"{city}-2024", f"{city}-2025"])
+                # 创建完整的x轴标签列表
+                all_x_labels = []
+                for city in target_cities:
+                    all_x_labels.extend([f"{city}-2024", f"{city}-2025"])
             
-            # 更新布局
-            fig.update_layout(
-                title={
-                    'text': chart_title,
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 20, 'color': '#1B4965'}
-                },
-                xaxis={
-                    'title': {
-                        'text': '城市-年份',
-                        'font': {'size': 14, 'color': '#1B4965'}
+                # 更新布局
+                fig.update_layout(
+                    title={
+                        'text': chart_title,
+                        'x': 0.5,
+                        'xanchor': 'center',
+                        'font': {'size': 20, 'color': '#1B4965'}
                     },
-                    'tickangle': -45,
-                    'tickfont': {'size': 12, 'color': '#1B4965'},
-                    'categoryorder': 'array',
-                    'categoryarray': all_x_labels,
-                    'gridcolor': '#F6F8FA',
-                    'zerolinecolor': '#F6F8FA',
-                    'showgrid': False
-                },
-                yaxis={
-                    'title': {
-                        'text': '业绩金额',
-                        'font': {'size': 14, 'color': '#1B4965'}
+                    xaxis={
+                        'title': {
+                            'text': '城市-年份',
+                            'font': {'size': 14, 'color': '#1B4965'}
+                        },
+                        'tickangle': -45,
+                        'tickfont': {'size': 12, 'color': '#1B4965'},
+                        'categoryorder': 'array',
+                        'categoryarray': all_x_labels,
+                        'gridcolor': '#F6F8FA',
+                        'zerolinecolor': '#F6F8FA',
+                        'showgrid': False
                     },
-                    'tickformat': ',.0f',
-                    'tickfont': {'size': 12, 'color': '#1B4965'},
-                    'gridcolor': '#F6F8FA',
-                    'zerolinecolor': '#F6F8FA'
-                },
-                barmode='stack',
-                height=chart_height,
-                legend={
-                    'orientation': 'h',
-                    'yanchor': 'bottom',
-                    'y': 1.02,
-                    'xanchor': 'right',
-                    'x': 1,
-                    'font': {'size': 12, 'color': '#1B4965'}
-                },
-                font=dict(size=12, color='#1B4965'),
-                plot_bgcolor='#E3EAF3',
-                paper_bgcolor='#E3EAF3',
-                margin=dict(l=50, r=50, t=80, b=100),
-                bargap=0.6,
-                bargroupgap=0.3
-            )
+                    yaxis={
+                        'title': {
+                            'text': '业绩金额',
+                            'font': {'size': 14, 'color': '#1B4965'}
+                        },
+                        'tickformat': ',.0f',
+                        'tickfont': {'size': 12, 'color': '#1B4965'},
+                        'gridcolor': '#F6F8FA',
+                        'zerolinecolor': '#F6F8FA'
+                    },
+                    barmode='stack',
+                    height=chart_height,
+                    legend={
+                        'orientation': 'h',
+                        'yanchor': 'bottom',
+                        'y': 1.02,
+                        'xanchor': 'right',
+                        'x': 1,
+                        'font': {'size': 12, 'color': '#1B4965'}
+                    },
+                    font=dict(size=12, color='#1B4965'),
+                    plot_bgcolor='#E3EAF3',
+                    paper_bgcolor='#E3EAF3',
+                    margin=dict(l=50, r=50, t=80, b=100),
+                    bargap=0.6,
+                    bargroupgap=0.3
+                )
             
-            # 添加网格线
-            fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
-            fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+                # 添加网格线
+                fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+                fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
             
-            # 添加城市分组的分割线
-            for i in range(1, len(target_cities)):
-                fig.add_vline(
-                    x=i * 2 - 0.5,
-                    line_dash="dash",
-                    line_color="rgba(0,0,0,0.6)",
-                    line_width=1
-                )
-            # rgba(128,128,128,0.4)
-            return fig
-        
-        # 分离北京和其他城市
-        beijing_cities = [city for city in cities_with_2024 if city == '北京']
-        other_cities = [city for city in cities_with_2024 if city != '北京']
-        
-        # 生成北京图表
-        if beijing_cities:
-            st.write("### 📊 北京业态结构分析")
-            beijing_fig = create_business_chart(beijing_cities, '北京一级业态结构对比分析', 500)
-            st.plotly_chart(beijing_fig, use_container_width=True)
+                # 添加城市分组的分割线
+                for i in range(1, len(target_cities)):
+                    fig.add_vline(
+                        x=i * 2 - 0.5,
+                        line_dash="dash",
+                        line_color="rgba(0,0,0,0.6)",
+                        line_width=1
+                    )
+                # rgba(128,128,128,0.4)
+                return fig
+        
+            # 分离北京和其他城市
+            beijing_cities = [city for city in cities_with_2024 if city == '北京']
+            other_cities = [city for city in cities_with_2024 if city != '北京']
+        
+            # 生成北京图表
+            if beijing_cities:
+                st.write("### 📊 北京业态结构分析")
+                beijing_fig = create_business_chart(beijing_cities, '北京一级业态结构对比分析', 500)
+                render_chart(beijing_fig)
             
-            # 北京数据摘要
-            st.write("#### 📋 北京数据摘要")
-            beijing_summary = []
-            for city in beijing_cities:
-                # 2024年数据
-                city_2024 = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2024)
-                ]
-                total_2024 = city_2024['业绩金额'].sum()
-                main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
+                # 北京数据摘要
+                st.write("#### 📋 北京数据摘要")
+                beijing_summary = []
+                for city in beijing_cities:
+                    # 2024年数据
+                    city_2024 = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2024)
+                    ]
+                    total_2024 = city_2024['业绩金额'].sum()
+                    main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
                 
-                # 2025年数据
-                city_2025 = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2025)
-                ]
-                total_2025 = city_2025['业绩金额'].sum()
-                main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
+                    # 2025年数据
+                    city_2025 = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2025)
+                    ]
+                    total_2025 = city_2025['业绩金额'].sum()
+                    main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
                 
-                # 计算增长率
-                growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
+                    # 计算增长率
+                    growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
                 
-                beijing_summary.append({
-                    '城市': city,
-                    '2024年总业绩': f"{total_2024:,.0f}",
-                    '2024年主要业态': main_business_2024,
-                    '2025年总业绩': f"{total_2025:,.0f}",
-                    '2025年主要业态': main_business_2025,
-                    '增长率': f"{growth_rate:+.1f}%"
-                })
+                    beijing_summary.append({
+                        '城市': city,
+                        '2024年总业绩': f"{total_2024:,.0f}",
+                        '2024年主要业态': main_business_2024,
+                        '2025年总业绩': f"{total_2025:,.0f}",
+                        '2025年主要业态': main_business_2025,
+                        '增长率': f"{growth_rate:+.1f}%"
+                    })
             
-            beijing_summary_df = pd.DataFrame(beijing_summary)
-            st.dataframe(beijing_summary_df, use_container_width=True, hide_index=True)
-        
-        # 生成其他城市图表
-        if other_cities:
-            st.write("### 📊 其他重点城市业态结构分析")
-            other_fig = create_business_chart(other_cities, '其他重点城市一级业态结构对比分析', 600)
-            st.plotly_chart(other_fig, use_container_width=True)
+                beijing_summary_df = pd.DataFrame(beijing_summary)
+                st.dataframe(beijing_summary_df, use_container_width=True, hide_index=True)
+        
+            # 生成其他城市图表
+            if other_cities:
+                st.write("### 📊 其他重点城市业态结构分析")
+                other_fig = create_business_chart(other_cities, '其他重点城市一级业态结构对比分析', 600)
+                render_chart(other_fig)
             
-            # 其他城市数据摘要
-            st.write("#### 📋 其他城市数据摘要")
-            other_summary = []
-            for city in other_cities:
-                # 2024年数据
-                city_2024 = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2024)
-                ]
-                total_2024 = city_2024['业绩金额'].sum()
-                main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
+                # 其他城市数据摘要
+                st.write("#### 📋 其他城市数据摘要")
+                other_summary = []
+                for city in other_cities:
+                    # 2024年数据
+                    city_2024 = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2024)
+                    ]
+                    total_2024 = city_2024['业绩金额'].sum()
+                    main_business_2024 = city_2024.loc[city_2024['业绩金额'].idxmax(), '一级业态'] if len(city_2024) > 0 else "无"
                 
-                # 2025年数据
-                city_2025 = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2025)
-                ]
-                total_2025 = city_2025['业绩金额'].sum()
-                main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
+                    # 2025年数据
+                    city_2025 = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2025)
+                    ]
+                    total_2025 = city_2025['业绩金额'].sum()
+                    main_business_2025 = city_2025.loc[city_2025['业绩金额'].idxmax(), '一级业态'] if len(city_2025) > 0 else "无"
                 
-                # 计算增长率
-                growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
+                    # 计算增长率
+                    growth_rate = ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0
                 
-                other_summary.append({
-                    '城市': city,
-                    '2024年总业绩': f"{total_2024:,.0f}",
-                    '2024年主要业态': main_business_2024,
-                    '2025年总业绩': f"{total_2025:,.0f}",
-                    '2025年主要业态': main_business_2025,
-                    '增长率': f"{growth_rate:+.1f}%"
-                })
+                    other_summary.append({
+                        '城市': city,
+                        '2024年总业绩': f"{total_2024:,.0f}",
+                        '2024年主要业态': main_business_2024,
+                        '2025年总业绩': f"{total_2025:,.0f}",
+                        '2025年主要业态': main_business_2025,
+                        '增长率': f"{growth_rate:+.1f}%"
+                    })
             
-            other_summary_df = pd.DataFrame(other_summary)
-            st.dataframe(other_summary_df, use_container_width=True, hide_index=True)
+                other_summary_df = pd.DataFrame(other_summary)
+                st.dataframe(other_summary_df, use_container_width=True, hide_index=True)
         
-        # 整体关键洞察
-        st.write("#### 💡 整体关键洞察")
+            # 整体关键洞察
+            st.write("#### 💡 整体关键洞察")
         
-        col1, col2 = st.columns(2)
+            col1, col2 = st.columns(2)
         
-        with col1:
-            st.write("**🏆 业绩增长最快的城市:**")
-            growth_analysis = []
-            for city in cities_with_2024:
-                city_2024_total = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2024)
-                ]['业绩金额'].sum()
+            with col1:
+                st.write("**🏆 业绩增长最快的城市:**")
+                growth_analysis = []
+                for city in cities_with_2024:
+                    city_2024_total = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2024)
+                    ]['业绩金额'].sum()
                 
-                city_2025_total = city_year_business[
-                    (city_year_business['城市'] == city) & 
-                    (city_year_business['年份'] == 2025)
-                ]['业绩金额'].sum()
+                    city_2025_total = city_year_business[
+                        (city_year_business['城市'] == city) & 
+                        (city_year_business['年份'] == 2025)
+                    ]['业绩金额'].sum()
                 
-                if city_2024_total > 0:
-                    growth = city_2025_total - city_2024_total
-                    growth_analysis.append((city, growth))
+                    if city_2024_total > 0:
+                        growth = city_2025_total - city_2024_total
+                        growth_analysis.append((city, growth))
             
-            if growth_analysis:
-                top_growth_city = max(growth_analysis, key=lambda x: x[1])
-                st.write(f"- **{top_growth_city[0]}**: 增长 {top_growth_city[1]:,.0f}")
+                if growth_analysis:
+                    top_growth_city = max(growth_analysis, key=lambda x: x[1])
+                    st.write(f"- **{top_growth_city[0]}**: 增长 {top_growth_city[1]:,.0f}")
         
-        with col2:
-            st.write("**📈 主要业态分布:**")
-            business_count = city_year_business['一级业态'].value_counts()
-            for business, count in business_count.head(3).items():
-                st.write(f"- **{business}**: {count} 个城市年份")
+            with col2:
+                st.write("**📈 主要业态分布:**")
+                business_count = city_year_business['一级业态'].value_counts()
+                for business, count in business_count.head(3).items():
+                    st.write(f"- **{business}**: {count} 个城市年份")
 
-    else:
-        st.write("重点城市均无2024年业绩数据，无法进行业态结构对比分析")
+        else:
+            st.write("重点城市均无2024年业绩数据，无法进行业态结构对比分析")
+
+        # 业态结构相似城市：各城市的一级业态占比向量组成矩阵，选中城市后一次矩阵乘求出与全部城市的余弦相似度
+        st.write("#### 🧭 业态结构相似城市")
+        with profiler.stage('等待后台计算'):
+            format_share_matrices = section_graph.result('城市业态结构矩阵')
+            similarity_city_totals = section_graph.result('城市汇总')
+            similarity_intervals = section_graph.result('城市变化置信区间')
+
+        @st.fragment
+        def render_similar_cities():
+            # 选择城市只触发本片段重跑，不重新汇总
+            similarity_columns = st.columns([2, 2, 3])
+            with similarity_columns[1]:
+                share_basis = st.radio("业态占比口径", list(format_share_matrices), index=2, horizontal=True, key='similar_city_basis')
+            share_matrix = format_share_matrices[share_basis]
+            candidate_cities = list(share_matrix['shares'].index)
+            if not candidate_cities:
+                st.info("没有可比较的城市")
+                return
+            with similarity_columns[0]:
+                default_city = next((city for city in key_city_list if city in candidate_cities), candidate_cities[0])
+                if st.session_state.get('similar_city_target') not in candidate_cities:
+                    st.session_state['similar_city_target'] = default_city
+                target_city = st.selectbox("城市", candidate_cities, key='similar_city_target')
+            with similarity_columns[2]:
+                neighbour_count = st.slider("相似城市数", min_value=1, max_value=20, value=5, key='similar_city_count')
+
+            neighbours = similar_cities(share_matrix, target_city, neighbour_count)
+            if neighbours.empty:
+                st.info("没有其他城市可比较")
+                return
+
+            shares = share_matrix['shares']
+            city_2024 = similarity_city_totals[2024]['业绩金额'].reindex(neighbours.index, fill_value=0)
+            city_2025 = similarity_city_totals[2025]['业绩金额'].reindex(neighbours.index, fill_value=0)
+            neighbour_table = pd.DataFrame({
+                '相似度': neighbours,
+                '主要业态': shares.loc[neighbours.index].idxmax(axis=1),
+                '2024年业绩': city_2024,
+                '2025年业绩': city_2025,
+                '增长率(%)': similarity_intervals['增长率(%)'].reindex(neighbours.index),
+                '增长显著': np.select(
+                    [similarity_intervals['项目过少'].reindex(neighbours.index, fill_value=True).to_numpy(dtype=bool),
+                     similarity_intervals['增长率显著'].reindex(neighbours.index, fill_value=False).to_numpy(dtype=bool)],
+                    ['项目过少', '显著'], default='不显著'
+                ),
+            })
+            st.dataframe(
+                neighbour_table.style.format({
+                    '相似度': '{:.3f}', '2024年业绩': '{:,.0f}', '2025年业绩': '{:,.0f}', '增长率(%)': '{:+.1f}',
+                }, na_rep='-'),
+                use_container_width=True
+            )
 
-    # 业绩前三城市占比分析
-    
-# 提取年份信息（假设你有年份列或者需要从其他地方获取）
-# 如果没有年份列，需要先添加年份信息
-    df_2024['年份'] = 2024
-    df_2025['年份'] = 2025
-    df_all = pd.concat([df_2024, df_2025], ignore_index=True)
-    st.write("### 集中度分析")
+            # 选中城市与相似城市的业态占比对比，只展示这些城市中出现过的业态
+            compared = shares.loc[[target_city, *neighbours.index]]
+            compared = compared.loc[:, compared.sum(axis=0) > 0] * 100
+            fig_similar = go.Figure(go.Heatmap(
+                z=compared.to_numpy(),
+                x=compared.columns.astype(str),
+                y=compared.index.astype(str),
+                colorscale='Blues',
+                text=compared.to_numpy(),
+                texttemplate='%{text:.0f}%',
+                colorbar=dict(title='占比(%)')
+            ))
+            fig_similar.update_layout(
+                title=f'{target_city}与业态结构最相似的{len(neighbours)}个城市（{share_basis}业绩占比）',
+                title_font=dict(color='#1B4965', size=16),
+                xaxis=dict(tickfont=dict(color='#1B4965', size=12)),
+                yaxis=dict(autorange='reversed', tickfont=dict(color='#1B4965', size=12)),
+                height=max(300, len(compared) * 40 + 120),
+                plot_bgcolor='#E3EAF3',
+                paper_bgcolor='#E3EAF3'
+            )
+            render_chart(fig_similar)
 
-    # 计算每年每个城市的业绩总和
-    city_performance = df_all.groupby(['年份', '城市'])['业绩金额'].sum().reset_index()
+        render_similar_cities()
 
-    # 计算每年的总业绩
-    yearly_total = df_all.groupby('年份')['业绩金额'].sum().reset_index()
-    yearly_total.columns = ['年份', '年度总业绩']
+        # 业绩前三城市占比分析
+    
+    def render_concentration_section():
+        """集中度分析"""
+        profiler.begin('集中度分析')
+        st.write("### 集中度分析")
+
+        # 计算每年每个城市的业绩总和
+        city_totals = section_graph.result('城市汇总')
+        city_performance = pd.concat(
+            {2024: city_totals[2024]['业绩金额'], 2025: city_totals[2025]['业绩金额']},
+            names=['年份', '城市']
+        ).reset_index()
+
+        # 计算每年的总业绩
+        yearly_total = pd.DataFrame({
+            '年份': [2024, 2025],
+            '年度总业绩': [amount_in_wan(cube_2024['业绩金额'].sum()), amount_in_wan(cube_2025['业绩金额'].sum())],
+        })
 
-    # 计算每年前三城市的集中度
-    concentration_data = []
+        # 计算每年前三城市的集中度
+        concentration_data = []
 
-    for year in [2024, 2025]:
-        # 获取该年份的城市业绩数据
-        year_data = city_performance[city_performance['年份'] == year]
+        for year in [2024, 2025]:
+            # 获取该年份的城市业绩数据
+            year_data = city_performance[city_performance['年份'] == year]
         
-        # 按业绩金额排序，取前三
-        top3_cities = year_data.nlargest(3, '业绩金额')
+            # 按业绩金额排序，取前三
+            top3_cities = year_data.nlargest(3, '业绩金额')
         
-        # 计算前三城市业绩总和
-        top3_sum = top3_cities['业绩金额'].sum()
+            # 计算前三城市业绩总和
+            top3_sum = top3_cities['业绩金额'].sum()
         
-        # 获取该年份总业绩
-        year_total = yearly_total[yearly_total['年份'] == year]['年度总业绩'].iloc[0]
+            # 获取该年份总业绩
+            year_total = yearly_total[yearly_total['年份'] == year]['年度总业绩'].iloc[0]
         
-        # 计算集中度百分比
-        concentration_pct = (top3_sum / year_total) * 100
+            # 计算集中度百分比
+            concentration_pct = (top3_sum / year_total) * 100
         
-        concentration_data.append({
-            '年份': year,
-            '前三城市集中度': concentration_pct,
-            '前三城市': ', '.join(top3_cities['城市'].tolist())
-        })
+            concentration_data.append({
+                '年份': year,
+                '前三城市集中度': concentration_pct,
+                '前三城市': ', '.join(top3_cities['城市'].tolist())
+            })
 
-    # 转换为DataFrame
-    concentration_df = pd.DataFrame(concentration_data)
+        # 转换为DataFrame
+        concentration_df = pd.DataFrame(concentration_data)
 
-    # 使用go.Figure创建柱状图（仿照参考代码）
-    fig = go.Figure()
+        # 使用go.Figure创建柱状图（仿照参考代码）
+        fig = go.Figure()
 
-    # 添加柱状图
-    fig.add_trace(go.Bar(
-        x=['2024年', '2025年'],  # 修改x轴标签
-        y=concentration_df['前三城市集中度'],
-        marker_color=['#C0C0C0', '#825D48'],  # 设置指定颜色
-        text=concentration_df['前三城市集中度'].apply(lambda x: f'{x:.1f}%'),
-        textposition='outside',
-        textfont=dict(size=12, color='#1B4965'),
-        width=0.3
-    ))
+        # 添加柱状图
+        fig.add_trace(go.Bar(
+            x=['2024年', '2025年'],  # 修改x轴标签
+            y=concentration_df['前三城市集中度'],
+            marker_color=['#C0C0C0', '#825D48'],  # 设置指定颜色
+            text=concentration_df['前三城市集中度'].apply(lambda x: f'{x:.1f}%'),
+            textposition='outside',
+            textfont=dict(size=12, color='#1B4965'),
+            width=0.3
+        ))
 
-    # 添加80%参考线
-    fig.add_hline(y=80, line_dash="dash", line_color="red", 
-                annotation_text="80%集中度线", annotation_position="bottom right")
+        # 添加80%参考线
+        fig.add_hline(y=80, line_dash="dash", line_color="red", 
+                    annotation_text="80%集中度线", annotation_position="bottom right")
 
-    # 更新布局 - 仿照参考代码样式
-    fig.update_layout(
-        title='城市维度集中度分析 - 前三城市业绩占比',
-        title_font=dict(color='#1B4965', size=16),  # 深色标题
-        xaxis_title='年份',
-        xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
-        yaxis=dict(
-            title='集中度 (%)',
-            range=[0, 100],
-            title_font=dict(color='#1B4965', size=14),  # 深色字体
-            tickfont=dict(color='#1B4965', size=12),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            zerolinecolor='#F6F8FA'
-        ),
-        xaxis=dict(
-            title_font=dict(color='#1B4965', size=14),  # 深色字体
-            tickfont=dict(color='#1B4965', size=12),
-            gridcolor='#F6F8FA',  # 浅白色网格线
-            showgrid=False,  # 隐藏x轴网格线
-            zerolinecolor='#F6F8FA'
-        ),
-        showlegend=False,
-        height=500,
-        font=dict(size=12, color='#1B4965'),  # 深色字体
-        plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
-        paper_bgcolor='#E3EAF3'  # 与PPT背景完全一致
-    )
+        # 更新布局 - 仿照参考代码样式
+        fig.update_layout(
+            title='城市维度集中度分析 - 前三城市业绩占比',
+            title_font=dict(color='#1B4965', size=16),  # 深色标题
+            xaxis_title='年份',
+            xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
+            yaxis=dict(
+                title='集中度 (%)',
+                range=[0, 100],
+                title_font=dict(color='#1B4965', size=14),  # 深色字体
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                zerolinecolor='#F6F8FA'
+            ),
+            xaxis=dict(
+                title_font=dict(color='#1B4965', size=14),  # 深色字体
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                showgrid=False,  # 隐藏x轴网格线
+                zerolinecolor='#F6F8FA'
+            ),
+            showlegend=False,
+            height=500,
+            font=dict(size=12, color='#1B4965'),  # 深色字体
+            plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
+            paper_bgcolor='#E3EAF3'  # 与PPT背景完全一致
+        )
 
-    # 在Streamlit中显示
-    st.plotly_chart(fig, use_container_width=True)
+        # 在Streamlit中显示
+        render_chart(fig)
 
-    # 显示前三城市详情
-    st.write("**前三城市详情:**")
-    for _, row in concentration_df.iterrows():
-        st.write(f"• {int(row['年份'])}年: {row['前三城市']} (集中度: {row['前三城市集中度']:.1f}%)")
+        # 显示前三城市详情
+        st.write("**前三城市详情:**")
+        for _, row in concentration_df.iterrows():
+            st.write(f"• {int(row['年份'])}年: {row['前三城市']} (集中度: {row['前三城市集中度']:.1f}%)")
 
 
 
     
 
-    # 数据准备
-    df_2024['年份'] = 2024
-    df_2025['年份'] = 2025
-    df_all = pd.concat([df_2024, df_2025], ignore_index=True)
-    st.subheader("五.行业业绩分析")
+    def render_industry_section():
+        """五.行业业绩分析"""
+        profiler.begin('五.行业业绩分析')
+        st.subheader("五.行业业绩分析")
 
-    # 计算每年每个行业的业绩总和
-    industry_performance = df_all.groupby(['年份', '行业'])['业绩金额'].sum().reset_index()
+        # 启用城市分群时可改为按分群对比两年业绩；切换后本次重跑按所选维度重新提交透视计算
+        if city_segments is not None:
+            st.selectbox("分析维度", ['行业', '城市分群'], key='industry_dimension')
 
-    # 透视表，便于计算
-    industry_pivot = industry_performance.pivot(index='行业', columns='年份', values='业绩金额').fillna(0)
+        # 各行业两年业绩透视表（按总业绩排序）已提交后台计算
+        industry_pivot_full = section_graph.result('五.行业业绩分析')
 
-    # 计算总业绩并排序
-    industry_pivot['总业绩'] = industry_pivot[2024] + industry_pivot[2025]
-    industry_pivot_sorted = industry_pivot.sort_values('总业绩', ascending=False)
-
-    # 计算增长率
-    industry_pivot_sorted['增长率'] = ((industry_pivot_sorted[2025] - industry_pivot_sorted[2024]) / industry_pivot_sorted[2024] * 100).replace([float('inf'), -float('inf')], 0)
-
-    # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    # 添加2024年柱状图
-    fig.add_trace(
-        go.Bar(
-            name='2024年',
-            x=industry_pivot_sorted.index,
-            y=industry_pivot_sorted[2024],
-            marker_color='#C0C0C0',
-            # text=industry_pivot_sorted[2024],
-            # texttemplate='%{text:.0f}',
-            # textposition='outside',
-            # textfont=dict(color='#000000')
-        ),
-        secondary_y=False,
-    )
+        # 行业过多时只绘制总业绩前N的行业，其余合并为“其他（N项）”
+        industry_pivot_sorted = fold_long_tail(industry_pivot_full, chart_top_n['industry'], sort_by='总业绩')
 
-    # 添加2025年柱状图
-    fig.add_trace(
-        go.Bar(
-            name='2025年',
-            x=industry_pivot_sorted.index,
-            y=industry_pivot_sorted[2025],
-            marker_color='#825D48',
-            # text=industry_pivot_sorted[2025],
-            # texttemplate='%{text:.0f}',
-            # textposition='outside',
-            # textfont=dict(color='#000000')
-        ),
-        secondary_y=False,
-    )
+        # 计算增长率
+        for industry_frame in (industry_pivot_full, industry_pivot_sorted):
+            industry_frame['增长率'] = ((industry_frame[2025] - industry_frame[2024]) / industry_frame[2024] * 100).replace([float('inf'), -float('inf')], 0)
 
-    # 分离增长率为0和非0的数据点
-    zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] == 0]
-    non_zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] != 0]
+        # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
+        fig = make_subplots(specs=[[{"secondary_y": True}]])
 
-    # 添加增长率折线图（非0的点）
-    if not non_zero_growth_data.empty:
+        # 添加2024年柱状图
         fig.add_trace(
-            go.Scatter(
-                name='增长率(%)',
-                x=non_zero_growth_data.index,
-                y=non_zero_growth_data['增长率'],
-                mode='lines+markers+text',
-                line=dict(color='rgba(0,0,0,0.6)', width=3),
-                marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
-                text=[f'{int(rate)}%' for rate in non_zero_growth_data['增长率']],  # 显示整数部分
-                textposition='top center',
-                textfont=dict(size=12, color='#1B4965'),
-                connectgaps=True  # 连接间隙
+            go.Bar(
+                name='2024年',
+                x=industry_pivot_sorted.index,
+                y=industry_pivot_sorted[2024],
+                marker_color='#C0C0C0',
+                # text=industry_pivot_sorted[2024],
+                # texttemplate='%{text:.0f}',
+                # textposition='outside',
+                # textfont=dict(color='#000000')
             ),
-            secondary_y=True,
+            secondary_y=False,
         )
 
-    # 添加新增行业的特殊标记（增长率为0的点）- 放在-100%位置
-    if not zero_growth_data.empty:
+        # 添加2025年柱状图
         fig.add_trace(
-            go.Scatter(
-                name='新增行业',
-                x=zero_growth_data.index,
-                y=[-100] * len(zero_growth_data),  # 固定在-100%位置
-                mode='markers',
-                marker=dict(
-                    size=12,
-                    color='rgba(0,0,0,0.6)',
-                    symbol='triangle-up',  # 小三角形
-                    line=dict(width=2, color='rgba(0,0,0,0.6)')
-                ),
-                showlegend=True
+            go.Bar(
+                name='2025年',
+                x=industry_pivot_sorted.index,
+                y=industry_pivot_sorted[2025],
+                marker_color='#825D48',
+                # text=industry_pivot_sorted[2025],
+                # texttemplate='%{text:.0f}',
+                # textposition='outside',
+                # textfont=dict(color='#000000')
             ),
-            secondary_y=True,
+            secondary_y=False,
         )
 
-    # 更新左侧y轴标题
-    fig.update_yaxes(
-        title_text="业绩金额",
-        secondary_y=False,
-        title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-        tickfont=dict(color='#1B4965', size=12),
-        gridcolor='#F6F8FA',  # 浅白色网格线
-        zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
-        dtick=4700,  # 固定刻度间隔为50000
-        nticks=6,  # 限制刻度数量，只保留重要的
-    )
+        # 分离增长率为0和非0的数据点
+        zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] == 0]
+        non_zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] != 0]
+
+        # 添加增长率折线图（非0的点）
+        if not non_zero_growth_data.empty:
+            fig.add_trace(
+                go.Scatter(
+                    name='增长率(%)',
+                    x=non_zero_growth_data.index,
+                    y=non_zero_growth_data['增长率'],
+                    mode='lines+markers+text',
+                    line=dict(color='rgba(0,0,0,0.6)', width=3),
+                    marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
+                    text=[f'{int(rate)}%' for rate in non_zero_growth_data['增长率']],  # 显示整数部分
+                    textposition='top center',
+                    textfont=dict(size=12, color='#1B4965'),
+                    connectgaps=True  # 连接间隙
+                ),
+                secondary_y=True,
+            )
 
-    # 更新右侧y轴标题 - 确保包含-100%的范围
-    fig.update_yaxes(
-        title_text="增长率 (%)",
-        secondary_y=True,
-        title_font=dict(color='#1B4965', size=14),
-        tickfont=dict(color='#1B4965', size=12),
-        gridcolor='#F6F8FA',
-        zerolinecolor='#F6F8FA',
-        range=[-100, industry_pivot_sorted['增长率'].max() * 1.1],  # 确保包含-100%到最大增长率
-        dtick=1000,
-        nticks=6,
-    )
+        # 添加新增行业的特殊标记（增长率为0的点）- 放在-100%位置
+        if not zero_growth_data.empty:
+            fig.add_trace(
+                go.Scatter(
+                    name=f'新增{industry_dimension}',
+                    x=zero_growth_data.index,
+                    y=[-100] * len(zero_growth_data),  # 固定在-100%位置
+                    mode='markers',
+                    marker=dict(
+                        size=12,
+                        color='rgba(0,0,0,0.6)',
+                        symbol='triangle-up',  # 小三角形
+                        line=dict(width=2, color='rgba(0,0,0,0.6)')
+                    ),
+                    showlegend=True
+                ),
+                secondary_y=True,
+            )
 
-    # 更新布局
-    fig.update_layout(
-        title='行业业绩分析',
-        title_font=dict(color='#1B4965', size=16),  # 深色标题
-        xaxis_title='行业',
-        xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
-        height=600,
-        showlegend=True,
-        plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
-        paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1,
-            font=dict(color='#1B4965', size=12)  # 深色图例文字
-        ),
-        # 更新x轴刻度标签颜色
-        xaxis=dict(
+        # 更新左侧y轴标题
+        fig.update_yaxes(
+            title_text="业绩金额",
+            secondary_y=False,
+            title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
             tickfont=dict(color='#1B4965', size=12),
             gridcolor='#F6F8FA',  # 浅白色网格线
-            showgrid=False,
-            zerolinecolor='#F6F8FA'  # 隐藏x轴网格线，因为通常不需要
+            zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
+            dtick=4700,  # 固定刻度间隔为50000
+            nticks=6,  # 限制刻度数量，只保留重要的
         )
-    )
 
-    # 在Streamlit中显示
-    st.plotly_chart(fig, use_container_width=True)
+        # 更新右侧y轴标题 - 确保包含-100%的范围
+        fig.update_yaxes(
+            title_text="增长率 (%)",
+            secondary_y=True,
+            title_font=dict(color='#1B4965', size=14),
+            tickfont=dict(color='#1B4965', size=12),
+            gridcolor='#F6F8FA',
+            zerolinecolor='#F6F8FA',
+            range=[-100, industry_pivot_sorted['增长率'].max() * 1.1],  # 确保包含-100%到最大增长率
+            dtick=1000,
+            nticks=6,
+        )
+
+        # 更新布局
+        fig.update_layout(
+            title=f'{industry_dimension}业绩分析',
+            title_font=dict(color='#1B4965', size=16),  # 深色标题
+            xaxis_title=industry_dimension,
+            xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
+            height=600,
+            showlegend=True,
+            plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
+            paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1,
+                font=dict(color='#1B4965', size=12)  # 深色图例文字
+            ),
+            # 更新x轴刻度标签颜色
+            xaxis=dict(
+                tickfont=dict(color='#1B4965', size=12),
+                gridcolor='#F6F8FA',  # 浅白色网格线
+                showgrid=False,
+                zerolinecolor='#F6F8FA'  # 隐藏x轴网格线，因为通常不需要
+            )
+        )
+
+        # 在Streamlit中显示
+        render_chart(fig)
+
+        # 完整行业列表按需加载
+        if st.checkbox(f"显示全部{industry_dimension}明细", key='show_full_industry'):
+            st.dataframe(
+                industry_pivot_full.rename(columns={2024: '2024年', 2025: '2025年'}).reset_index(),
+                use_container_width=True,
+                hide_index=True
+            )
 
-    # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
+        # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
     
-#     # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
-#     fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-#     # 添加2024年柱状图
-#     fig.add_trace(
-#         go.Bar(
-#             name='2024年',
-#             x=industry_pivot_sorted.index,
-#             y=industry_pivot_sorted[2024],
-#             marker_color='#C0C0C0',
-#             # text=industry_pivot_sorted[2024],
-#             # texttemplate='%{text:.0f}',
-#             # textposition='outside',
-#             # textfont=dict(color='#000000')
-#         ),
-#         secondary_y=False,
-#     )
-
-#     # 添加2025年柱状图
-#     fig.add_trace(
-#         go.Bar(
-#             name='2025年',
-#             x=industry_pivot_sorted.index,
-#             y=industry_pivot_sorted[2025],
-#             marker_color='#825D48',
-#             # text=industry_pivot_sorted[2025],
-#             # texttemplate='%{text:.0f}',
-#             # textposition='outside',
-#             # textfont=dict(color='#000000')
-#         ),
-#         secondary_y=False,
-#     )
-
-#     # 分离增长率为0和非0的数据点
-#     zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] == 0]
-#     non_zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] != 0]
-
-#     # 添加增长率折线图（非0的点）
-#     if not non_zero_growth_data.empty:
-#         fig.add_trace(
-#             go.Scatter(
-#                 name='增长率(%)',
-#                 x=non_zero_growth_data.index,
-#                 y=non_zero_growth_data['增长率'],
-#                 mode='lines+markers+text',
-#                 line=dict(color='rgba(0,0,0,0.6)', width=3),
-#                 marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
-#                 text=[f'{int(rate)}%' for rate in non_zero_growth_data['增长率']],  # 显示整数部分
-#                 textposition='top center',
-#                 textfont=dict(size=12, color='#1B4965'),
-#                 connectgaps=True  # 连接间隙
-#             ),
-#             secondary_y=True,
-#         )
-
-#     # 添加新增行业的特殊标记（增长率为0的点）
-#     if not zero_growth_data.empty:
-#         fig.add_trace(
-#             go.Scatter(
-#                 name='新增行业',
-#                 x=zero_growth_data.index,
-#                 y=zero_growth_data['增长率'],
-#                 mode='markers',
-#                 marker=dict(
-#                     size=10, 
-#                     color='rgba(0,0,0,0.6)', 
-#                     symbol='triangle-up',  # 小三角形
-#                     line=dict(width=1, color='rgba(0,0,0,0.6)')
-#                 ),
-#                 showlegend=True
-#             ),
-#             secondary_y=True,
-#         )
-
-#     # 更新左侧y轴标题
-#     fig.update_yaxes(
-#     title_text="业绩金额", 
-#     secondary_y=False,
-#     title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-#     tickfont=dict(color='#1B4965', size=12),
-#     gridcolor='#F6F8FA',  # 浅白色网格线
-#     zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
-#     dtick=4700,  # 固定刻度间隔为50000
-#     nticks=6,  # 限制刻度数量，只保留重要的
+    #     # 创建子图：左侧y轴为业绩金额，右侧y轴为增长率
+    #     fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    #     # 添加2024年柱状图
+    #     fig.add_trace(
+    #         go.Bar(
+    #             name='2024年',
+    #             x=industry_pivot_sorted.index,
+    #             y=industry_pivot_sorted[2024],
+    #             marker_color='#C0C0C0',
+    #             # text=industry_pivot_sorted[2024],
+    #             # texttemplate='%{text:.0f}',
+    #             # textposition='outside',
+    #             # textfont=dict(color='#000000')
+    #         ),
+    #         secondary_y=False,
+    #     )
+
+    #     # 添加2025年柱状图
+    #     fig.add_trace(
+    #         go.Bar(
+    #             name='2025年',
+    #             x=industry_pivot_sorted.index,
+    #             y=industry_pivot_sorted[2025],
+    #             marker_color='#825D48',
+    #             # text=industry_pivot_sorted[2025],
+    #             # texttemplate='%{text:.0f}',
+    #             # textposition='outside',
+    #             # textfont=dict(color='#000000')
+    #         ),
+    #         secondary_y=False,
+    #     )
+
+    #     # 分离增长率为0和非0的数据点
+    #     zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] == 0]
+    #     non_zero_growth_data = industry_pivot_sorted[industry_pivot_sorted['增长率'] != 0]
+
+    #     # 添加增长率折线图（非0的点）
+    #     if not non_zero_growth_data.empty:
+    #         fig.add_trace(
+    #             go.Scatter(
+    #                 name='增长率(%)',
+    #                 x=non_zero_growth_data.index,
+    #                 y=non_zero_growth_data['增长率'],
+    #                 mode='lines+markers+text',
+    #                 line=dict(color='rgba(0,0,0,0.6)', width=3),
+    #                 marker=dict(size=8, color='rgba(0,0,0,0.6)', symbol='circle'),
+    #                 text=[f'{int(rate)}%' for rate in non_zero_growth_data['增长率']],  # 显示整数部分
+    #                 textposition='top center',
+    #                 textfont=dict(size=12, color='#1B4965'),
+    #                 connectgaps=True  # 连接间隙
+    #             ),
+    #             secondary_y=True,
+    #         )
+
+    #     # 添加新增行业的特殊标记（增长率为0的点）
+    #     if not zero_growth_data.empty:
+    #         fig.add_trace(
+    #             go.Scatter(
+    #                 name='新增行业',
+    #                 x=zero_growth_data.index,
+    #                 y=zero_growth_data['增长率'],
+    #                 mode='markers',
+    #                 marker=dict(
+    #                     size=10, 
+    #                     color='rgba(0,0,0,0.6)', 
+    #                     symbol='triangle-up',  # 小三角形
+    #                     line=dict(width=1, color='rgba(0,0,0,0.6)')
+    #                 ),
+    #                 showlegend=True
+    #             ),
+    #             secondary_y=True,
+    #         )
+
+    #     # 更新左侧y轴标题
+    #     fig.update_yaxes(
+    #     title_text="业绩金额", 
+    #     secondary_y=False,
+    #     title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
+    #     tickfont=dict(color='#1B4965', size=12),
+    #     gridcolor='#F6F8FA',  # 浅白色网格线
+    #     zerolinecolor='#F6F8FA',  # 零轴线颜色与网格线一致
+    #     dtick=4700,  # 固定刻度间隔为50000
+    #     nticks=6,  # 限制刻度数量，只保留重要的
     
-#     )
-
-
-#     # 更新右侧y轴标题
-#     fig.update_yaxes(
-#         title_text="增长率 (%)", 
-#         secondary_y=True,
-#         title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
-#         tickfont=dict(color='#1B4965', size=12),
-#         gridcolor='#F6F8FA',
-#         zerolinecolor='#F6F8FA',
-#         dtick=100,  # 让系统自动选择合适的刻度间隔
-#         nticks=6 #
-#     )
-
-#     # 更新布局
-#     fig.update_layout(
-#     title='行业业绩分析 - 双柱状图与增长率折线图',
-#     title_font=dict(color='#1B4965', size=16),  # 深色标题
-#     xaxis_title='行业',
-#     xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
-#     height=600,
-#     showlegend=True,
-#     plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
-#     paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
-#     legend=dict(
-#         orientation="h", 
-#         yanchor="bottom", 
-#         y=1.02, 
-#         xanchor="right", 
-#         x=1,
-#         font=dict(color='#1B4965', size=12)  # 深色图例文字
-#     ),
-#     # 更新x轴刻度标签颜色
-#     xaxis=dict(
-#         tickfont=dict(color='#1B4965', size=12),
-#         gridcolor='#F6F8FA',  # 浅白色网格线
-#         showgrid=False,
-#         zerolinecolor='#F6F8FA'  # 隐藏x轴网格线，因为通常不需要
-#     )
-# )
-
-#     # 在Streamlit中显示
-#     st.plotly_chart(fig, use_container_width=True)
+    #     )
+
+
+    #     # 更新右侧y轴标题
+    #     fig.update_yaxes(
+    #         title_text="增长率 (%)", 
+    #         secondary_y=True,
+    #         title_font=dict(color='#1B4965', size=14),  # 深色字体确保清晰
+    #         tickfont=dict(color='#1B4965', size=12),
+    #         gridcolor='#F6F8FA',
+    #         zerolinecolor='#F6F8FA',
+    #         dtick=100,  # 让系统自动选择合适的刻度间隔
+    #         nticks=6 #
+    #     )
+
+    #     # 更新布局
+    #     fig.update_layout(
+    #     title='行业业绩分析 - 双柱状图与增长率折线图',
+    #     title_font=dict(color='#1B4965', size=16),  # 深色标题
+    #     xaxis_title='行业',
+    #     xaxis_title_font=dict(color='#1B4965', size=14),  # 深色x轴标题
+    #     height=600,
+    #     showlegend=True,
+    #     plot_bgcolor='#E3EAF3',  # 与PPT背景协调的浅色背景
+    #     paper_bgcolor='#E3EAF3',  # 与PPT背景完全一致
+    #     legend=dict(
+    #         orientation="h", 
+    #         yanchor="bottom", 
+    #         y=1.02, 
+    #         xanchor="right", 
+    #         x=1,
+    #         font=dict(color='#1B4965', size=12)  # 深色图例文字
+    #     ),
+    #     # 更新x轴刻度标签颜色
+    #     xaxis=dict(
+    #         tickfont=dict(color='#1B4965', size=12),
+    #         gridcolor='#F6F8FA',  # 浅白色网格线
+    #         showgrid=False,
+    #         zerolinecolor='#F6F8FA'  # 隐藏x轴网格线，因为通常不需要
+    #     )
+    # )
+
+    #     # 在Streamlit中显示
+    #     st.plotly_chart(fig, use_container_width=True)
 
 
 
 
 
     
-    st.subheader("六.重点客户分析")
+    def render_client_section():
+        """六.重点客户分析"""
+        profiler.begin('六.重点客户分析')
+        st.subheader("六.重点客户分析")
+
+        # 筛选选项
+        year_filter = st.selectbox("选择年份", [2024, 2025, "全部"], key='client_year_filter')
+
+        # 所选年份的客户汇总已提交后台计算
+        with profiler.stage('等待后台计算'):
+            client_summary = section_graph.result('六.重点客户分析')
+        client_totals = client_summary['client_totals']
+        industry_mapping = client_summary['industry_mapping']
+
+        # 只展示前N大客户，其余客户的合计会远大于单个客户，不合并展示
+        client_top_n = chart_top_n['client']
+        client_data = client_totals.head(client_top_n)
+
+        # 创建带行业前缀的客户名称
+        client_with_industry = [f"{industry_mapping.get(client, '未知行业')}-{client}" for client in client_data.index]
+
+        # 获取每个客户对应的行业
+        client_industries = [industry_mapping.get(client, '未知行业') for client in client_data.index]
+
+        # 定义颜色列表（更柔和的色调）
+        colors = [
+            '#A8DADC',  '#E9C46A', '#F4A261', '#E76F51',
+            '#D4A5A5', '#C8B6E2', '#A3C4F3', '#90DBF4', '#8FCACA',
+            '#F7D794', '#DDA0DD', '#F0B7A1', '#C9E4CA', '#FFE5D9',
+            '#B4E7CE', '#D1C4E9', '#FFECB3', '#E1F5FE', '#F8BBD9'
+        ]
 
-    # 筛选选项
-    year_filter = st.selectbox("选择年份", [2024, 2025, "全部"])
+        # 获取数据中的唯一行业并按顺序分配颜色
+        unique_industries = list(set(client_industries))
+        industry_color_map = {industry: colors[i % len(colors)] for i, industry in enumerate(unique_industries)}
+
+        # 为每个客户分配颜色
+        bar_colors = [industry_color_map[industry] for industry in client_industries]
+
+        # 绘制图表
+        fig8 = px.bar(x=client_data.values, y=client_with_industry, orientation='h',
+                    title=f"前{client_top_n}大客户业绩排名 ({year_filter}年)",
+                    text=client_data.values)  # 添加文本显示数值
+        fig8.update_traces(
+            marker_color=bar_colors,
+            texttemplate='%{text:,.0f}',  # 格式化数值显示，添加千位分隔符
+            textposition='inside',  # 文本位置在柱子内部
+            textfont=dict(color='white', size=12)  # 设置文本颜色和大小
+        )
+        fig8.update_layout(
+            yaxis={'categoryorder':'array', 'categoryarray':client_with_industry[::-1], 'tickfont':dict(color='#1B4965', size=12)},  # 按业绩从上到下排列
+            plot_bgcolor='#E3EAF3', 
+            paper_bgcolor='#E3EAF3',
+            font=dict(color='#1B4965', size=12),  # 全局字体颜色
+            title_font=dict(color='#1B4965', size=16),  # 标题单独设置
+            xaxis=dict(tickfont=dict(color='#1B4965', size=12))  # X轴刻度标签
+        )
+        render_chart(fig8)
+
+        # 完整客户排名按需加载
+        if st.checkbox("显示全部客户排名", key='show_full_client_ranking'):
+            st.dataframe(
+                client_totals.rename('业绩金额').reset_index(),
+                use_container_width=True,
+                hide_index=True
+            )
 
-    # 获取客户与行业的对应关系
-    def get_client_industry_mapping(df):
-        """获取客户与行业的映射关系"""
-        return df.groupby('客户')['行业'].first().to_dict()
+        # 客户分析结果
+        top_client = client_summary['top_client']
+        top_client_industry = client_summary['top_client_industry']
+        client_count = client_summary['client_count']
 
-    # 根据年份筛选数据并计算业绩
-    if year_filter == "全部":
-        client_data = df_all.groupby('客户')['业绩金额'].sum().sort_values(ascending=False).head(10)
-        industry_mapping = get_client_industry_mapping(df_all)
-    else:
-        if year_filter == 2024:
-            client_data = df_2024.groupby('客户')['业绩金额'].sum().sort_values(ascending=False).head(10)
-            industry_mapping = get_client_industry_mapping(df_2024)
-        else:
-            client_data = df_2025.groupby('客户')['业绩金额'].sum().sort_values(ascending=False).head(10)
-            industry_mapping = get_client_industry_mapping(df_2025)
+        st.info(f"**客户分析**：{year_filter}年最重要客户为{top_client_industry}-{top_client}，共服务{client_count}个客户")
 
-    # 创建带行业前缀的客户名称
-    client_with_industry = [f"{industry_mapping.get(client, '未知行业')}-{client}" for client in client_data.index]
+        # 客户名称归一的合并明细，便于核对模糊匹配结果
+        if client_names is not None and len(client_names[1]) > 0:
+            with st.expander(f"客户名称归一：{len(client_names[1])}个名称写法已合并到标准名称"):
+                st.dataframe(client_names[1], use_container_width=True, hide_index=True)
 
-    # 获取每个客户对应的行业
-    client_industries = [industry_mapping.get(client, '未知行业') for client in client_data.index]
+        # 客户留存与流失：2024年的客户在2025年是否仍有业绩
+        st.write("### 🔁 客户留存与流失")
+        with profiler.stage('等待后台计算'):
+            client_retention = section_graph.result('客户留存与流失')
+        retention_summary = client_retention['summary']
+        retained_count, churned_count, new_count = retention_summary['客户数']
+        retention_rate = retained_count / (retained_count + churned_count) * 100 if retained_count + churned_count > 0 else 0
 
-    # 定义颜色列表（更柔和的色调）
-    colors = [
-        '#A8DADC',  '#E9C46A', '#F4A261', '#E76F51',
-        '#D4A5A5', '#C8B6E2', '#A3C4F3', '#90DBF4', '#8FCACA',
-        '#F7D794', '#DDA0DD', '#F0B7A1', '#C9E4CA', '#FFE5D9',
-        '#B4E7CE', '#D1C4E9', '#FFECB3', '#E1F5FE', '#F8BBD9'
-    ]
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("留存客户", f"{retained_count}个", f"2025年业绩{retention_summary.loc['留存', '2025年业绩']:,.0f}万元",
+                      delta_color="off")
+        with col2:
+            st.metric("流失客户", f"{churned_count}个", f"-{retention_summary.loc['流失', '2024年业绩']:,.0f}万元",
+                      help="2024年有业绩、2025年无业绩的客户，变化值为其2024年业绩")
+        with col3:
+            st.metric("新增客户", f"{new_count}个", f"+{retention_summary.loc['新增', '2025年业绩']:,.0f}万元",
+                      help="2025年首次出现的客户，变化值为其2025年业绩")
+        with col4:
+            st.metric("客户留存率", f"{retention_rate:.1f}%", help="留存客户数 / 2024年客户数")
+
+        # 按行业、城市拆分的流失与新增业绩
+        retention_tabs = st.tabs(["按行业", "按城市"])
+        for tab, dimension in zip(retention_tabs, ('行业', '城市')):
+            with tab:
+                breakdown = client_retention['breakdowns'][dimension]
+                chart_data = breakdown.assign(
+                    变动规模=breakdown['流失业绩'] + breakdown['新增业绩']
+                ).nlargest(15, '变动规模')
+                fig = go.Figure()
+                fig.add_trace(go.Bar(name='流失业绩', x=chart_data.index.astype(str), y=-chart_data['流失业绩'], marker_color='#E76F51'))
+                fig.add_trace(go.Bar(name='新增业绩', x=chart_data.index.astype(str), y=chart_data['新增业绩'], marker_color='#2A9D8F'))
+                fig.update_layout(
+                    title=f'流失与新增客户业绩最多的{len(chart_data)}个{dimension}',
+                    barmode='relative',
+                    yaxis=dict(title='业绩金额（万元）', tickfont=dict(color='#1B4965', size=12)),
+                    xaxis=dict(tickfont=dict(color='#1B4965', size=12)),
+                    plot_bgcolor='#E3EAF3',
+                    paper_bgcolor='#E3EAF3',
+                    font=dict(color='#1B4965', size=12),
+                    title_font=dict(color='#1B4965', size=16)
+                )
+                render_chart(fig)
+                st.dataframe(
+                    breakdown.style.format({
+                        '留存客户2024年业绩': '{:,.0f}', '留存客户2025年业绩': '{:,.0f}',
+                        '流失业绩': '{:,.0f}', '新增业绩': '{:,.0f}', '客户留存率(%)': '{:.1f}'
+                    }),
+                    use_container_width=True
+                )
 
-    # 获取数据中的唯一行业并按顺序分配颜色
-    unique_industries = list(set(client_industries))
-    industry_color_map = {industry: colors[i % len(colors)] for i, industry in enumerate(unique_industries)}
-
-    # 为每个客户分配颜色
-    bar_colors = [industry_color_map[industry] for industry in client_industries]
-
-    # 绘制图表
-    fig8 = px.bar(x=client_data.values, y=client_with_industry, orientation='h',
-                title=f"前10大客户业绩排名 ({year_filter}年)",
-                text=client_data.values)  # 添加文本显示数值
-    fig8.update_traces(
-        marker_color=bar_colors,
-        texttemplate='%{text:,.0f}',  # 格式化数值显示，添加千位分隔符
-        textposition='inside',  # 文本位置在柱子内部
-        textfont=dict(color='white', size=12)  # 设置文本颜色和大小
-    )
-    fig8.update_layout(
-        yaxis={'categoryorder':'total ascending', 'tickfont':dict(color='#1B4965', size=12)},
-        plot_bgcolor='#E3EAF3', 
-        paper_bgcolor='#E3EAF3',
-        font=dict(color='#1B4965', size=12),  # 全局字体颜色
-        title_font=dict(color='#1B4965', size=16),  # 标题单独设置
-        xaxis=dict(tickfont=dict(color='#1B4965', size=12))  # X轴刻度标签
-    )
-    st.plotly_chart(fig8, use_container_width=True)
-
-    # 客户分析结果
-    if year_filter == "全部":
-        top_client = df_all.groupby('客户')['业绩金额'].sum().idxmax()
-        top_client_industry = df_all[df_all['客户'] == top_client]['行业'].iloc[0]
-        client_count = len(df_all['客户'].unique())
-    elif year_filter == 2024:
-        top_client = df_2024.groupby('客户')['业绩金额'].sum().idxmax()
-        top_client_industry = df_2024[df_2024['客户'] == top_client]['行业'].iloc[0]
-        client_count = len(df_2024['客户'].unique())
-    else:
-        top_client = df_2025.groupby('客户')['业绩金额'].sum().idxmax()
-        top_client_industry = df_2025[df_2025['客户'] == top_client]['行业'].iloc[0]
-        client_count = len(df_2025['客户'].unique())
-
-    st.info(f"**客户分析**：{year_filter}年最重要客户为{top_client_industry}-{top_client}，共服务{client_count}个客户")
-
-    # 定义重点城市列表
-    key_cities = ['广州', '北京', '成都', '上海', '杭州', '重庆', '深圳', '珠海', '天津', '苏州']
-
-    # 分别获取2024年和2025年的数据
-    df_2024_city = df_2024.groupby('城市')['业绩金额'].sum().reset_index()
-    df_2025_city = df_2025.groupby('城市')['业绩金额'].sum().reset_index()
-
-    # 计算2024年各城市业绩
-    cities_2024 = set(df_2024_city['城市'].tolist())
-    cities_2025 = set(df_2025_city['城市'].tolist())
-
-    # 2024年重点城市业绩
-    key_cities_2024 = [city for city in key_cities if city in cities_2024]
-    key_cities_2024_amount = df_2024_city[df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
-    other_cities_2024_amount = df_2024_city[~df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
-    total_2024 = key_cities_2024_amount + other_cities_2024_amount
-
-    # 2025年重点城市业绩
-    key_cities_2025 = [city for city in key_cities if city in cities_2025]
-    # 24年已有业绩的重点城市在25年的业绩
-    existing_key_cities_2025 = [city for city in key_cities_2024 if city in cities_2025]
-    existing_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(existing_key_cities_2025)]['业绩金额'].sum()
-    # 新增重点城市在25年的业绩
-    new_key_cities_2025 = [city for city in key_cities_2025 if city not in key_cities_2024]
-    new_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(new_key_cities_2025)]['业绩金额'].sum()
-    # 其他城市在25年的业绩
-    other_cities_2025_amount = df_2025_city[~df_2025_city['城市'].isin(key_cities_2025)]['业绩金额'].sum()
-    total_2025 = existing_key_cities_2025_amount + new_key_cities_2025_amount + other_cities_2025_amount
-
-    # 找出24、25年都没有业绩的重点城市
-    no_performance_cities = [city for city in key_cities if city not in cities_2024 and city not in cities_2025]
-
-    # 创建子图
-    fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=('2024年上半年重点城市业绩占比', '2025年上半年重点城市业绩占比'),
-        specs=[[{"type": "pie"}, {"type": "pie"}]]
-    )
+        # 客户集中度：头部客户的业绩依赖度和帕累托曲线
+        st.write("### 📐 客户集中度")
+        with profiler.stage('等待后台计算'):
+            client_pareto = section_graph.result('客户集中度')
+
+        # 头部1%、5%、10%客户一旦流失所影响的业绩
+        revenue_at_risk = []
+        for client_percent in (1, 5, 10):
+            row = {'头部客户': f'前{client_percent}%'}
+            for year in (2024, 2025):
+                top_count, top_amount, top_share = pareto_top_share(client_pareto[year], client_percent / 100)
+                row[f'{year}年客户数'] = top_count
+                row[f'{year}年业绩'] = top_amount
+                row[f'{year}年业绩占比(%)'] = top_share * 100
+            revenue_at_risk.append(row)
+        st.write("**⚠️ 头部客户业绩依赖度**")
+        st.dataframe(
+            pd.DataFrame(revenue_at_risk).style.format({
+                '2024年业绩': '{:,.0f}', '2025年业绩': '{:,.0f}',
+                '2024年业绩占比(%)': '{:.1f}', '2025年业绩占比(%)': '{:.1f}'
+            }),
+            use_container_width=True, hide_index=True
+        )
 
-    # 2024年饼图
-    fig.add_trace(
-        go.Pie(
-            labels=['重点城市', '其他城市'],
-            values=[key_cities_2024_amount, other_cities_2024_amount],
-            name="2024年",
-            marker=dict(colors=['#825D48', '#C0C0C0']),
-            textinfo='label+percent',
-            textposition='inside',
-            textfont=dict(color='#1B4965', size=12),
-            hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
-        ),
-        row=1, col=1
-    )
+        @st.fragment
+        def render_client_pareto():
+            # 占比滑块只触发本片段重跑：在累计业绩数组上二分查找，不重新分组
+            target_share = st.slider("业绩占比目标（%）", min_value=50, max_value=99, value=80, step=1, key='client_pareto_share')
 
-    # 2025年饼图 - 合并重点城市
-    total_key_cities_2025_amount = existing_key_cities_2025_amount + new_key_cities_2025_amount
-
-    labels_2025 = []
-    values_2025 = []
-    colors_2025 = []
-
-    if total_key_cities_2025_amount > 0:
-        labels_2025.append('重点城市')
-        values_2025.append(total_key_cities_2025_amount)
-        colors_2025.append('#825D48')
-
-    if other_cities_2025_amount > 0:
-        labels_2025.append('其他城市')
-        values_2025.append(other_cities_2025_amount)
-        colors_2025.append('#C0C0C0')
-
-    fig.add_trace(
-        go.Pie(
-            labels=labels_2025,
-            values=values_2025,
-            name="2025年",
-            marker=dict(colors=colors_2025),
-            textinfo='label+percent',
-            textposition='inside',
-            textfont=dict(color='#1B4965', size=12),
-            hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
-        ),
-        row=1, col=2
-    )
+            fig = go.Figure()
+            columns = st.columns(2)
+            for column, (year, color) in zip(columns, ((2024, '#3498db'), (2025, '#e74c3c'))):
+                cumulative = client_pareto[year]['cumulative']
+                client_total = len(cumulative)
+                needed = pareto_clients_for_share(client_pareto[year], target_share / 100)
+                with column:
+                    st.metric(
+                        f"{year}年贡献{target_share}%业绩的客户数",
+                        f"{needed}个",
+                        f"占全部{client_total}个客户的{needed / client_total * 100:.1f}%" if client_total > 0 else None,
+                        delta_color="off"
+                    )
+                if client_total == 0 or cumulative[-1] <= 0:
+                    continue
+
+                # 客户数很多时曲线按等间距抽样绘制，不影响查询精度
+                points = np.unique(np.linspace(0, client_total - 1, min(client_total, 500)).astype(int))
+                fig.add_trace(go.Scatter(
+                    x=(points + 1) / client_total * 100,
+                    y=cumulative[points] / cumulative[-1] * 100,
+                    mode='lines',
+                    name=f'{year}年',
+                    line=dict(color=color, width=3)
+                ))
+                fig.add_trace(go.Scatter(
+                    x=[needed / client_total * 100],
+                    y=[cumulative[needed - 1] / cumulative[-1] * 100],
+                    mode='markers',
+                    marker=dict(color=color, size=12, line=dict(width=2, color='white')),
+                    name=f'{year}年{needed}个客户',
+                    hovertemplate=f'{year}年前{needed}个客户<br>客户占比: %{{x:.1f}}%<br>业绩占比: %{{y:.1f}}%<extra></extra>'
+                ))
 
-    # 更新布局
-    fig.update_layout(
-        title_text="重点城市业绩金额占比变化对比",
-        title_x=0.4,
-        title_font=dict(color='#1B4965', size=16),
-        showlegend=False,
-        height=600,
-        width=1200,
-        font=dict(color='#1B4965', size=12),
-        plot_bgcolor='#E3EAF3',
-        paper_bgcolor='#E3EAF3'
-    )
+            fig.add_hline(y=target_share, line_dash="dash", line_color="#1B4965", line_width=1)
+            fig.update_layout(
+                title=f'客户帕累托曲线（业绩占比目标{target_share}%）',
+                xaxis=dict(title='客户占比（%，按业绩降序）', tickfont=dict(color='#1B4965', size=12)),
+                yaxis=dict(title='累计业绩占比（%）', tickfont=dict(color='#1B4965', size=12)),
+                height=450,
+                plot_bgcolor='#E3EAF3',
+                paper_bgcolor='#E3EAF3',
+                font=dict(color='#1B4965', size=12),
+                title_font=dict(color='#1B4965', size=16)
+            )
+            render_chart(fig)
+
+        render_client_pareto()
+
+        # 流失和新增客户名单按需加载
+        if st.checkbox("显示流失与新增客户名单", key='show_retention_clients'):
+            retention_clients = client_retention['clients']
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**📉 流失客户（按2024年业绩）**")
+                st.dataframe(
+                    retention_clients[retention_clients['状态'] == '流失'][['客户', '2024年业绩']]
+                    .sort_values('2024年业绩', ascending=False),
+                    use_container_width=True, hide_index=True
+                )
+            with col2:
+                st.write("**🆕 新增客户（按2025年业绩）**")
+                st.dataframe(
+                    retention_clients[retention_clients['状态'] == '新增'][['客户', '2025年业绩']]
+                    .sort_values('2025年业绩', ascending=False),
+                    use_container_width=True, hide_index=True
+                )
+
+    def render_key_city_summary_section():
+        """重点城市业绩汇总"""
+        profiler.begin('重点城市业绩占比')
+        # 定义重点城市列表
+        key_cities = key_city_list
+
+        # 分别获取2024年和2025年的数据
+        city_totals = section_graph.result('城市汇总')
+        df_2024_city = city_totals[2024]['业绩金额'].reset_index()
+        df_2025_city = city_totals[2025]['业绩金额'].reset_index()
+
+        # 计算2024年各城市业绩
+        cities_2024 = set(df_2024_city['城市'].tolist())
+        cities_2025 = set(df_2025_city['城市'].tolist())
+
+        # 2024年重点城市业绩
+        key_cities_2024 = [city for city in key_cities if city in cities_2024]
+        key_cities_2024_amount = df_2024_city[df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
+        other_cities_2024_amount = df_2024_city[~df_2024_city['城市'].isin(key_cities_2024)]['业绩金额'].sum()
+        total_2024 = key_cities_2024_amount + other_cities_2024_amount
+
+        # 2025年重点城市业绩
+        key_cities_2025 = [city for city in key_cities if city in cities_2025]
+        # 24年已有业绩的重点城市在25年的业绩
+        existing_key_cities_2025 = [city for city in key_cities_2024 if city in cities_2025]
+        existing_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(existing_key_cities_2025)]['业绩金额'].sum()
+        # 新增重点城市在25年的业绩
+        new_key_cities_2025 = [city for city in key_cities_2025 if city not in key_cities_2024]
+        new_key_cities_2025_amount = df_2025_city[df_2025_city['城市'].isin(new_key_cities_2025)]['业绩金额'].sum()
+        # 其他城市在25年的业绩
+        other_cities_2025_amount = df_2025_city[~df_2025_city['城市'].isin(key_cities_2025)]['业绩金额'].sum()
+        total_2025 = existing_key_cities_2025_amount + new_key_cities_2025_amount + other_cities_2025_amount
+
+        # 找出24、25年都没有业绩的重点城市
+        no_performance_cities = [city for city in key_cities if city not in cities_2024 and city not in cities_2025]
+
+        # 创建子图
+        fig = make_subplots(
+            rows=1, cols=2,
+            subplot_titles=('2024年上半年重点城市业绩占比', '2025年上半年重点城市业绩占比'),
+            specs=[[{"type": "pie"}, {"type": "pie"}]]
+        )
 
-    # 显示图表
-    st.plotly_chart(fig, use_container_width=True)
+        # 2024年饼图
+        fig.add_trace(
+            go.Pie(
+                labels=['重点城市', '其他城市'],
+                values=[key_cities_2024_amount, other_cities_2024_amount],
+                name="2024年",
+                marker=dict(colors=['#825D48', '#C0C0C0']),
+                textinfo='label+percent',
+                textposition='inside',
+                textfont=dict(color='#1B4965', size=12),
+                hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
+            ),
+            row=1, col=1
+        )
 
-    # 输出没有业绩的重点城市
-    if no_performance_cities:
-        st.write(f"**注意：** 以下重点城市在2024年和2025年都没有业绩记录：{', '.join(no_performance_cities)}")
+        # 2025年饼图 - 合并重点城市
+        total_key_cities_2025_amount = existing_key_cities_2025_amount + new_key_cities_2025_amount
 
-    # 输出统计信息
-    st.write("### 统计信息")
-    col1, col2 = st.columns(2)
+        labels_2025 = []
+        values_2025 = []
+        colors_2025 = []
 
-    with col1:
-        st.write("**2024年:**")
-        st.write(f"- 重点城市总业绩: {key_cities_2024_amount:,.0f}")
-        st.write(f"- 其他城市总业绩: {other_cities_2024_amount:,.0f}")
-        st.write(f"- 总业绩: {total_2024:,.0f}")
-        st.write(f"- 有业绩的重点城市: {', '.join(key_cities_2024) if key_cities_2024 else '无'}")
+        if total_key_cities_2025_amount > 0:
+            labels_2025.append('重点城市')
+            values_2025.append(total_key_cities_2025_amount)
+            colors_2025.append('#825D48')
 
-    with col2:
-        st.write("**2025年:**")
-        st.write(f"- 24年已有重点城市业绩: {existing_key_cities_2025_amount:,.0f}")
-        st.write(f"- 新增重点城市业绩: {new_key_cities_2025_amount:,.0f}")
-        st.write(f"- 其他城市业绩: {other_cities_2025_amount:,.0f}")
-        st.write(f"- 总业绩: {total_2025:,.0f}")
-        st.write(f"- 新增重点城市: {', '.join(new_key_cities_2025) if new_key_cities_2025 else '无'}")
+        if other_cities_2025_amount > 0:
+            labels_2025.append('其他城市')
+            values_2025.append(other_cities_2025_amount)
+            colors_2025.append('#C0C0C0')
+
+        fig.add_trace(
+            go.Pie(
+                labels=labels_2025,
+                values=values_2025,
+                name="2025年",
+                marker=dict(colors=colors_2025),
+                textinfo='label+percent',
+                textposition='inside',
+                textfont=dict(color='#1B4965', size=12),
+                hovertemplate='<b>%{label}</b><br>金额: %{value}<br>占比: %{percent}<extra></extra>'
+            ),
+            row=1, col=2
+        )
+
+        # 更新布局
+        fig.update_layout(
+            title_text="重点城市业绩金额占比变化对比",
+            title_x=0.4,
+            title_font=dict(color='#1B4965', size=16),
+            showlegend=False,
+            height=600,
+            width=1200,
+            font=dict(color='#1B4965', size=12),
+            plot_bgcolor='#E3EAF3',
+            paper_bgcolor='#E3EAF3'
+        )
+
+        # 显示图表
+        render_chart(fig)
+
+        # 输出没有业绩的重点城市
+        if no_performance_cities:
+            st.write(f"**注意：** 以下重点城市在2024年和2025年都没有业绩记录：{', '.join(no_performance_cities)}")
+
+        # 输出统计信息
+        st.write("### 统计信息")
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write("**2024年:**")
+            st.write(f"- 重点城市总业绩: {key_cities_2024_amount:,.0f}")
+            st.write(f"- 其他城市总业绩: {other_cities_2024_amount:,.0f}")
+            st.write(f"- 总业绩: {total_2024:,.0f}")
+            st.write(f"- 有业绩的重点城市: {', '.join(key_cities_2024) if key_cities_2024 else '无'}")
+
+        with col2:
+            st.write("**2025年:**")
+            st.write(f"- 24年已有重点城市业绩: {existing_key_cities_2025_amount:,.0f}")
+            st.write(f"- 新增重点城市业绩: {new_key_cities_2025_amount:,.0f}")
+            st.write(f"- 其他城市业绩: {other_cities_2025_amount:,.0f}")
+            st.write(f"- 总业绩: {total_2025:,.0f}")
+            st.write(f"- 新增重点城市: {', '.join(new_key_cities_2025) if new_key_cities_2025 else '无'}")
+
+    # 各板块先按页面顺序占位，再按所需后台任务完成的先后填充：先算完的板块先显示，不必等待前面仍在计算的板块
+    segment_tasks = ('城市分群汇总',) if city_segments is not None else ()
+    section_tasks = {
+        render_platform_section: ('业绩平台汇总',),
+        render_city_growth_section: segment_tasks,
+        render_format_section: ('一级业态汇总',),
+        render_project_quality_section: ('三.项目质量下降分析', '城市变化置信区间', '项目规模分档', '城市项目业绩分位数', '城市汇总'),
+        render_city_performance_section: ('城市汇总', '城市变化置信区间', *segment_tasks),
+        render_city_ranking_section: ('城市业绩排名变化',),
+        render_key_city_share_section: ('城市汇总',),
+        render_key_city_format_section: ('重点城市一级业态结构变化', '城市业态结构矩阵', '城市汇总', '城市变化置信区间'),
+        render_concentration_section: ('城市汇总',),
+        render_industry_section: ('五.行业业绩分析',),
+        render_client_section: ('六.重点客户分析', '客户留存与流失', '客户集中度'),
+        render_key_city_summary_section: ('城市汇总',),
+    }
+    section_slots = {render: st.empty() for render in section_tasks}
+    for render in section_graph.as_completed(section_tasks):
+        with section_slots[render].container():
+            render()
+
+profiler.end()
+if profiler.trace_memory:
+    get_memory_trace_slot().release(trace_memory_owner)
+
+# 本次运行结束后检查内存预算
+session_registry = get_session_registry()
+if session_registry.enforce_budgets(session_store):
+    st.sidebar.warning(
+        f"本会话独享数据占用{session_store.footprint_bytes() / 1024 / 1024:,.0f}MB，"
+        f"超过单会话内存预算{SESSION_BUDGET_MB}MB，已清空本会话缓存的中间结果，下次运行时重新计算"
+    )
+
+# 性能诊断面板
+if run_cprofile is not None:
+    run_cprofile.disable()
+    cprofile_text = io.StringIO()
+    pstats.Stats(run_cprofile, stream=cprofile_text).sort_stats('cumulative').print_stats(40)
+    run_cprofile.create_stats()
+    st.session_state['cprofile_report'] = {
+        'text': cprofile_text.getvalue(),
+        'raw': marshal.dumps(run_cprofile.stats),
+    }
+
+with st.expander("🔧 性能诊断", expanded=False):
+    if profiler.records:
+        st.dataframe(pd.DataFrame(profiler.records), use_container_width=True, hide_index=True)
+        st.download_button(
+            "下载阶段耗时JSON",
+            data=profiler.to_json(),
+            file_name="stage_profile.json",
+            mime="application/json",
+            key='download_stage_profile'
+        )
+    else:
+        st.write("暂无阶段记录")
+
+    st.write("**进程级共享数据集缓存:**")
+    shared_cache = get_shared_dataset_cache()
+    st.write(f"已用 {shared_cache.total_bytes / 1024 / 1024:,.1f}MB / 预算 {shared_cache.budget_bytes / 1024 / 1024:,.0f}MB")
+    shared_cache_stats = shared_cache.stats()
+    if shared_cache_stats:
+        st.dataframe(pd.DataFrame(shared_cache_stats), use_container_width=True, hide_index=True)
+
+    if ADMIN_DIAGNOSTICS:
+        st.write("**各会话内存占用:**")
+        st.write(
+            f"全部会话独享数据和中间结果合计 {session_registry.total_bytes() / 1024 / 1024:,.1f}MB / 预算 {ALL_SESSIONS_BUDGET_MB:,}MB"
+            f"（单会话预算 {SESSION_BUDGET_MB:,}MB，空闲{SESSION_IDLE_SECONDS}秒后可淘汰数据集）"
+        )
+        st.dataframe(pd.DataFrame(session_registry.stats(session_store)), use_container_width=True, hide_index=True)
+    else:
+        st.write(
+            f"**本会话内存占用:** 独享数据和中间结果 {session_store.footprint_bytes() / 1024 / 1024:,.1f}MB / "
+            f"单会话预算 {SESSION_BUDGET_MB:,}MB"
+        )
+
+    if section_graph is not None:
+        task_records, task_sum_ms, task_span_ms = section_graph.summary()
+        if task_records:
+            st.write(f"**板块后台计算任务（{SECTION_WORKERS}个工作线程）:**")
+            st.write(f"各任务耗时合计 {task_sum_ms:,.1f}ms，任务图实际跨度 {task_span_ms:,.1f}ms")
+            st.dataframe(pd.DataFrame(task_records), use_container_width=True, hide_index=True)
+
+    cprofile_report = st.session_state.get('cprofile_report')
+    if cprofile_report:
+        st.write("**cProfile（按累计耗时排序，前40项）:**")
+        st.code(cprofile_report['text'])
+        st.download_button(
+            "下载cProfile原始数据(.prof)",
+            data=cprofile_report['raw'],
+            file_name="rerun.prof",
+            mime="application/octet-stream",
+            key='download_cprofile'
+        )